@@ -1,46 +1,568 @@
+import time
+import asyncio
+import threading
+import contextvars
+import http.cookiejar
+import requests
 import ccxt
+import ccxt.async_support
 import pyotp
+from ccxt.base.metrics import serve_metrics
+from concurrent.futures import ThreadPoolExecutor
 from config import config
+from order_ledger import OrderLedger, rests_on_book
+from local_exchange import LocalExchange, AsyncLocalExchange
+from reconciler import order_side
+from helper import run_at_intervals_apart, run_at_intervals_apart_async
+from cycle_trace import count_call
 from custom_logging import get_logger
 logger = get_logger(__name__)
 
+DEPTH_LIMITS_ALLOWED = [5, 10, 20, 50, 100, 500, 1000]
+# mandala sign-in makes two requests: authentication and the token itself
+SIGN_IN_REQUESTS = 2
+# how soon a failed auth token renewal is retried, in seconds
+TOKEN_RETRY_INTERVAL = 30
+
 
 class APIError(Exception):
     def __init__(self, message):
         self.message = message
 
 
+def exchange_config() -> dict:
+    return {
+        'apiKey': config.get('Exchange', 'APIKey'),
+        'secret': config.get('Exchange', 'APISecret'),
+        'login': config.get('Exchange', 'Login'),
+        'password': config.get('Exchange', 'Password'),
+        # markets and currencies are read from this directory on start and reloaded in the background
+        'marketsCacheDir': config.get('Exchange', 'MarketsCacheDir', fallback='') or None,
+        'marketsCacheTTL': config.getint('Exchange', 'MarketsCacheTTL', fallback=86400),
+        # the API client starts the reload itself, within the rate limit, see revalidate_markets()
+        'revalidateMarkets': False,
+        # every response is appended to the record file, or served from the replay file instead of the network
+        'httpRecordFile': config.get('Exchange', 'HttpRecordFile', fallback='') or None,
+        'httpReplayFile': config.get('Exchange', 'HttpReplayFile', fallback='') or None,
+        'httpReplayTiming': config.get('Exchange', 'HttpReplayTiming', fallback='fast'),
+        # latency phases, errors and response sizes of the requests per endpoint, see endpoint_stats()
+        'enableMetrics': config.get('Exchange', 'EndpointMetrics', fallback='no') == 'yes',
+        # the exchange instance is shared by concurrent requests, the last response of each one is not needed
+        'enableLastHttpResponse': False,
+        'enableLastJsonResponse': False,
+        'enableLastResponseHeaders': False
+    }
+
+
+def offline() -> bool:
+    """
+    :return: whether the bot runs against the in-process stand-in exchange instead of mandala
+    """
+    return config.get('Exchange', 'Offline', fallback='no') == 'yes'
+
+
+def local_exchange_config() -> dict:
+    return {
+        'rateLimit': config.getint('Exchange', 'OfflineRateLimit', fallback=1500),
+        'latency': config.getfloat('Exchange', 'OfflineLatency', fallback=0.05),
+        'errorRate': config.getfloat('Exchange', 'OfflineErrorRate', fallback=0),
+    }
+
+
+def token_expires_in(api) -> float:
+    """
+    :return: number of seconds till the auth token of the exchange expires
+    """
+    expires = api.options.get('expires')
+    if expires is None:
+        return 0
+    return (expires - api.milliseconds()) / 1000
+
+
+def sign_in_params(otp) -> dict:
+    # the stand-in exchange takes no one-time password
+    return {'password': otp.now()} if otp is not None else {}
+
+
+def serve_endpoint_metrics(api):
+    """
+    Serves the endpoint metrics of the exchange in the Prometheus text format on the local <MetricsPort>
+    :return: the server or None if it is disabled
+    """
+    port = config.getint('Exchange', 'MetricsPort', fallback=0)
+    if port == 0 or api.metrics is None:
+        return None
+    server = serve_metrics(port, api.metrics)
+    logger.info('Endpoint metrics are served at http://127.0.0.1:{}/metrics', port)
+    return server
+
+
+def in_caller_context(func):
+    """
+    :return: func running in a copy of the caller's context variables (e.g. the cycle trace) in any thread
+    """
+    context = contextvars.copy_context()
+
+    def call(*args):
+        # a context can only be entered by one thread at a time, every call gets its own copy
+        return context.copy().run(func, *args)
+    return call
+
+
+def allowed_depth_limit(limit):
+    if limit not in DEPTH_LIMITS_ALLOWED:
+        # finding nearest allowed value
+        limit = min(DEPTH_LIMITS_ALLOWED, key=lambda x: abs(x - limit))
+    return limit
+
+
+class PooledSession(requests.Session):
+    """
+    Keep-alive session to share between threads: up to <pool_size> connections are kept open and reused,
+    and no more than that are opened at once.
+    Cookies are never stored, ccxt clears them before every request and mandala authenticates with a token
+    """
+    def __init__(self, pool_size):
+        super().__init__()
+        self.pool_size = pool_size
+        self.cookies = requests.cookies.RequestsCookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        self.adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size, pool_block=True)
+        self.mount('https://', self.adapter)
+        self.mount('http://', self.adapter)
+
+    def stats(self) -> dict:
+        """
+        :return: dict with the number of 'requests' made, 'new_connections' opened for them,
+                 'reuse_ratio' - share of the requests made over an open connection, and 'pool_size'
+        """
+        pools = self.adapter.poolmanager.pools
+        connection_pools = [pools[key] for key in pools.keys()]
+        requests_made = sum(pool.num_requests for pool in connection_pools)
+        new_connections = sum(pool.num_connections for pool in connection_pools)
+        return {
+            'requests': requests_made,
+            'new_connections': new_connections,
+            'reuse_ratio': 1 - new_connections / requests_made if requests_made > 0 else 0.0,
+            'pool_size': self.pool_size
+        }
+
+
+class RequestSlots:
+    """
+    Hands out request start times spaced by the exchange rate limit,
+    safe to use from many threads and coroutines at once: every caller gets its own slot
+    """
+    def __init__(self, interval):
+        """
+        :param interval: min number of seconds between request starts
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_time = 0
+
+    def reserve(self) -> float:
+        """
+        :return: number of seconds to wait before the request may start
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_time)
+            self._next_time = slot + self.interval
+        return slot - now
+
+
 class APIClient:
+    """
+    Safe to call from many threads at once: requests share a pool of keep-alive connections
+    and only the auth token updates are serialized
+    """
     def __init__(self):
-        self.api = ccxt.mandala({
-            'apiKey': config.get('Exchange', 'APIKey'),
-            'secret': config.get('Exchange', 'APISecret'),
-            'login': config.get('Exchange', 'Login'),
-            'password': config.get('Exchange', 'Password')
-        })
-        self.otp = pyotp.TOTP(config.get('Exchange', 'TwoFASecret'))
-        self.api.sign_in({'password': self.otp.now()})
+        # concurrent requests are allowed, but all of them are started not more often than the exchange rate limit
+        self.max_workers = config.getint('Exchange', 'MaxConcurrentRequests', fallback=4)
+        self.session = PooledSession(self.max_workers)
+        if offline():
+            self.api = LocalExchange(local_exchange_config())
+        else:
+            self.api = ccxt.mandala(dict(exchange_config(), session=self.session))
+        self.request_slots = RequestSlots(self.api.rateLimit / 1000)
+        self.otp = None if offline() else pyotp.TOTP(config.get('Exchange', 'TwoFASecret'))
+        self.auth_lock = threading.Lock()
+        self.token_refresh_margin = config.getint('Exchange', 'TokenRefreshMargin', fallback=600)
+        self.token_refreshes = 0
+        self.token_refresh_latency = 0.0
+        # our open orders as our own requests changed them, loaded from the exchange at least that often
+        self.ledger = OrderLedger()
+        self.ledger_sync_interval = config.getint('Exchange', 'OrderLedgerSyncInterval', fallback=60)
+        self.metrics_server = serve_endpoint_metrics(self.api)
+        self.sign_in()
         self.api.load_markets()
+        self.revalidate_markets()
+        # the token is renewed in a thread of its own before it expires, the requests and the bot jobs never wait for it
+        self.stop_event_token = run_at_intervals_apart(self.renew_token, self.next_token_renewal, 'Token-Refresh')
+
+    def sign_in(self):
+        """
+        Gets a new auth token, requests signed meanwhile keep using the previous one
+        """
+        with self.auth_lock:
+            for i in range(SIGN_IN_REQUESTS):
+                self.wait_for_request_slot()
+            self.api.sign_in(sign_in_params(self.otp))
+
+    def renew_token(self):
+        """
+        Signs in again if the auth token expires within <TokenRefreshMargin> seconds
+        """
+        if token_expires_in(self.api) > self.token_refresh_margin:
+            return
+        started = time.monotonic()
+        self.sign_in()
+        self.token_refresh_latency = time.monotonic() - started
+        self.token_refreshes += 1
+        logger.info('Auth token renewed in {:.2f}s', self.token_refresh_latency)
+
+    def next_token_renewal(self) -> float:
+        """
+        :return: number of seconds till the auth token is to be renewed
+        """
+        return max(token_expires_in(self.api) - self.token_refresh_margin, TOKEN_RETRY_INTERVAL)
+
+    def token_stats(self) -> dict:
+        """
+        :return: dict with the number of token 'refreshes', 'last_latency' of a refresh in seconds
+                 and the number of seconds the current token 'expires_in'
+        """
+        return {
+            'refreshes': self.token_refreshes,
+            'last_latency': self.token_refresh_latency,
+            'expires_in': token_expires_in(self.api)
+        }
+
+    def pool_stats(self) -> dict:
+        """
+        :return: HTTP connection pool statistics, see PooledSession.stats()
+        """
+        return self.session.stats()
+
+    def ledger_stats(self) -> dict:
+        """
+        :return: open orders ledger statistics, see OrderLedger.stats()
+        """
+        return self.ledger.stats()
+
+    def endpoint_stats(self) -> dict:
+        """
+        :return: request metrics per exchange endpoint, see ExchangeMetrics.snapshot(), empty if they are disabled
+        """
+        return self.api.metrics.snapshot() if self.api.metrics is not None else {}
+
+    @property
+    def request_interval(self) -> float:
+        """
+        :return: number of seconds between request starts
+        """
+        return self.request_slots.interval
 
     def ticker(self, currency_pair):
+        self.wait_for_request_slot()
         return self.api.fetch_ticker(currency_pair)
 
     def depth(self, currency_pair, limit=100):
-        limits_allowed = [5, 10, 20, 50, 100, 500, 1000]
-        if limit not in limits_allowed:
-            # finding nearest allowed value
-            limit = min(limits_allowed, key=lambda x: abs(x - limit))
-        return self.api.fetch_order_book(currency_pair, limit=limit)
+        self.wait_for_request_slot()
+        return self.api.fetch_order_book(currency_pair, limit=allowed_depth_limit(limit))
 
     def order_create(self, currency_pair, order_type, side, amount, price=None, params=None):
+        self.wait_for_request_slot()
         try:
-            return self.api.create_order(currency_pair, order_type, side, amount, price, params)
+            result = self.api.create_order(currency_pair, order_type, side, amount, price, params)
         except ccxt.errors.ExchangeError as e:
             logger.error('Failed to create order: {}', e)
             return None
+        if rests_on_book(order_type, params):
+            self.ledger.add(result)
+        else:
+            # our trade may have filled some of our own orders on the other side
+            self.ledger.invalidate(currency_pair, side, None if order_type == 'market' else price)
+        return result
+
+    def revalidate_markets(self):
+        """
+        Reloads the markets taken from the cache in a background thread, its requests take their rate limit slots
+        like all the others, so the reload never bursts past the sign-in and the first pass
+        """
+        if self.api.markets_stale:
+            self.api.revalidate_markets(throttle=self.wait_for_request_slot)
+
+    def wait_for_request_slot(self):
+        """
+        Blocks until the next request is allowed by the rate limit
+        """
+        count_call()
+        delay = self.request_slots.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def order_create_batch(self, currency_pair, orders, order_type='limit'):
+        """
+        Submits many orders concurrently, each request waits for its rate limit slot
+        :param currency_pair: pair to place the orders at
+        :param orders: list of dicts with 'side', 'amount', 'price' and optional 'params'
+        :param order_type: order type for all orders in the batch
+        :return: list of dicts {'order': <planned order>, 'result': <created order or None>, 'error': <exception or None>}
+                 in the same order as the orders passed
+        """
+        def submit(order):
+            self.wait_for_request_slot()
+            try:
+                result = self.api.create_order(
+                    currency_pair, order_type, order['side'], order['amount'], order['price'], order.get('params')
+                )
+                if rests_on_book(order_type, order.get('params')):
+                    self.ledger.add(result)
+                else:
+                    self.ledger.invalidate(
+                        currency_pair, order['side'], None if order_type == 'market' else order['price']
+                    )
+                return {'order': order, 'result': result, 'error': None}
+            except ccxt.errors.BaseError as e:
+                logger.error('Failed to create order: {}', e)
+                return {'order': order, 'result': None, 'error': e}
+
+        if len(orders) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(orders))) as executor:
+            return list(executor.map(in_caller_context(submit), orders))
 
     def order_remove(self, currency_pair, order_id, side):
-        return self.api.cancel_order(order_id, currency_pair, params={'side': side})
+        self.wait_for_request_slot()
+        try:
+            result = self.api.cancel_order(order_id, currency_pair, params={'side': side})
+        except ccxt.errors.OrderNotFound:
+            # filled or cancelled already, it is not on the book either way
+            self.ledger.remove(order_id)
+            raise
+        self.ledger.remove(order_id)
+        return result
+
+    def order_remove_batch(self, currency_pair, orders):
+        """
+        Cancels many orders concurrently, each request waits for its rate limit slot
+        :param currency_pair: pair the orders are at
+        :param orders: list of open orders as returned by ccxt
+        :return: list of dicts {'order': <open order>, 'result': <cancel result or None>, 'error': <exception or None>}
+        """
+        def remove(order):
+            try:
+                result = self.order_remove(currency_pair, order['id'], order_side(order))
+                return {'order': order, 'result': result, 'error': None}
+            except ccxt.errors.BaseError as e:
+                logger.error('Failed to remove order {}: {}', order['id'], e)
+                return {'order': order, 'result': None, 'error': e}
+
+        if len(orders) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(orders))) as executor:
+            return list(executor.map(in_caller_context(remove), orders))
 
     def my_open_orders(self):
-        return self.api.fetch_open_orders()
+        """
+        Loads our open orders on all pairs from the exchange and syncs the ledger with them
+        """
+        self.wait_for_request_slot()
+        started = time.monotonic()
+        open_orders = self.api.fetch_open_orders()
+        self.sync_ledger(open_orders, started)
+        return open_orders
+
+    def sync_ledger(self, open_orders, started):
+        discrepancies = self.ledger.sync(open_orders, started)
+        if discrepancies > 0:
+            logger.debug('Ledger synced, {} of our open orders changed on the exchange', discrepancies)
+
+    def known_open_orders(self):
+        """
+        :return: our open orders on all pairs from the ledger, loaded from the exchange only
+                 if the last load was more than <OrderLedgerSyncInterval> seconds ago
+                 or our own trade may have filled some of them since
+        """
+        if self.ledger.age() > self.ledger_sync_interval:
+            return self.my_open_orders()
+        return self.ledger.open_orders()
+
+
+class AsyncAPIClient:
+    """
+    Same interface as APIClient, but all the calls are coroutines running on ccxt.async_support.mandala,
+    must be created inside a running event loop and started with start()
+    """
+    def __init__(self):
+        if offline():
+            self.api = AsyncLocalExchange(local_exchange_config())
+        else:
+            self.api = ccxt.async_support.mandala(exchange_config())
+        self.otp = None if offline() else pyotp.TOTP(config.get('Exchange', 'TwoFASecret'))
+        self.max_workers = config.getint('Exchange', 'MaxConcurrentRequests', fallback=4)
+        self.request_slots = RequestSlots(self.api.rateLimit / 1000)
+        self.token_refresh_margin = config.getint('Exchange', 'TokenRefreshMargin', fallback=600)
+        self.token_refreshes = 0
+        self.token_refresh_latency = 0.0
+        self.ledger = OrderLedger()
+        self.ledger_sync_interval = config.getint('Exchange', 'OrderLedgerSyncInterval', fallback=60)
+        self.stop_event_token = None
+        self.metrics_server = None
+
+    async def start(self):
+        self.metrics_server = serve_endpoint_metrics(self.api)
+        await self.sign_in()
+        await self.api.load_markets()
+        self.revalidate_markets()
+        self.stop_event_token = run_at_intervals_apart_async(
+            self.renew_token, self.next_token_renewal, 'Token-Refresh'
+        )
+
+    async def close(self):
+        if self.stop_event_token is not None:
+            self.stop_event_token.set()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        await self.api.close()
+
+    async def sign_in(self):
+        # one coroutine at a time runs on the loop, other requests go on while the sign-in requests are in flight
+        for i in range(SIGN_IN_REQUESTS):
+            await self.wait_for_request_slot()
+        await self.api.sign_in(sign_in_params(self.otp))
+
+    async def renew_token(self):
+        if token_expires_in(self.api) > self.token_refresh_margin:
+            return
+        started = time.monotonic()
+        await self.sign_in()
+        self.token_refresh_latency = time.monotonic() - started
+        self.token_refreshes += 1
+        logger.info('Auth token renewed in {:.2f}s', self.token_refresh_latency)
+
+    def next_token_renewal(self) -> float:
+        return max(token_expires_in(self.api) - self.token_refresh_margin, TOKEN_RETRY_INTERVAL)
+
+    def token_stats(self) -> dict:
+        return {
+            'refreshes': self.token_refreshes,
+            'last_latency': self.token_refresh_latency,
+            'expires_in': token_expires_in(self.api)
+        }
+
+    def ledger_stats(self) -> dict:
+        return self.ledger.stats()
+
+    def endpoint_stats(self) -> dict:
+        return self.api.metrics.snapshot() if self.api.metrics is not None else {}
+
+    @property
+    def request_interval(self) -> float:
+        return self.request_slots.interval
+
+    async def ticker(self, currency_pair):
+        await self.wait_for_request_slot()
+        return await self.api.fetch_ticker(currency_pair)
+
+    async def depth(self, currency_pair, limit=100):
+        await self.wait_for_request_slot()
+        return await self.api.fetch_order_book(currency_pair, limit=allowed_depth_limit(limit))
+
+    async def order_create(self, currency_pair, order_type, side, amount, price=None, params=None):
+        await self.wait_for_request_slot()
+        try:
+            result = await self.api.create_order(currency_pair, order_type, side, amount, price, params)
+        except ccxt.errors.ExchangeError as e:
+            logger.error('Failed to create order: {}', e)
+            return None
+        if rests_on_book(order_type, params):
+            self.ledger.add(result)
+        else:
+            # our trade may have filled some of our own orders on the other side
+            self.ledger.invalidate(currency_pair, side, None if order_type == 'market' else price)
+        return result
+
+    def revalidate_markets(self):
+        """
+        Same as APIClient.revalidate_markets(), the reload is a task on the event loop
+        """
+        if self.api.markets_stale:
+            self.api.revalidate_markets(throttle=self.wait_for_request_slot)
+
+    async def wait_for_request_slot(self):
+        count_call()
+        delay = self.request_slots.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def order_create_batch(self, currency_pair, orders, order_type='limit'):
+        """
+        Same as APIClient.order_create_batch, up to <max_workers> orders are in flight at once
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def submit(order):
+            async with semaphore:
+                await self.wait_for_request_slot()
+                try:
+                    result = await self.api.create_order(
+                        currency_pair, order_type, order['side'], order['amount'], order['price'], order.get('params')
+                    )
+                    if rests_on_book(order_type, order.get('params')):
+                        self.ledger.add(result)
+                    else:
+                        self.ledger.invalidate(
+                            currency_pair, order['side'], None if order_type == 'market' else order['price']
+                        )
+                    return {'order': order, 'result': result, 'error': None}
+                except ccxt.errors.BaseError as e:
+                    logger.error('Failed to create order: {}', e)
+                    return {'order': order, 'result': None, 'error': e}
+
+        return list(await asyncio.gather(*[submit(order) for order in orders]))
+
+    async def order_remove(self, currency_pair, order_id, side):
+        await self.wait_for_request_slot()
+        try:
+            result = await self.api.cancel_order(order_id, currency_pair, params={'side': side})
+        except ccxt.errors.OrderNotFound:
+            self.ledger.remove(order_id)
+            raise
+        self.ledger.remove(order_id)
+        return result
+
+    async def order_remove_batch(self, currency_pair, orders):
+        """
+        Same as APIClient.order_remove_batch, up to <max_workers> orders are in flight at once
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def remove(order):
+            async with semaphore:
+                try:
+                    result = await self.order_remove(currency_pair, order['id'], order_side(order))
+                    return {'order': order, 'result': result, 'error': None}
+                except ccxt.errors.BaseError as e:
+                    logger.error('Failed to remove order {}: {}', order['id'], e)
+                    return {'order': order, 'result': None, 'error': e}
+
+        return list(await asyncio.gather(*[remove(order) for order in orders]))
+
+    async def my_open_orders(self):
+        await self.wait_for_request_slot()
+        started = time.monotonic()
+        open_orders = await self.api.fetch_open_orders()
+        self.sync_ledger(open_orders, started)
+        return open_orders
+
+    def sync_ledger(self, open_orders, started):
+        discrepancies = self.ledger.sync(open_orders, started)
+        if discrepancies > 0:
+            logger.debug('Ledger synced, {} of our open orders changed on the exchange', discrepancies)
+
+    async def known_open_orders(self):
+        if self.ledger.age() > self.ledger_sync_interval:
+            return await self.my_open_orders()
+        return self.ledger.open_orders()
@@ -0,0 +1,185 @@
+"""
+CPU time of the ccxt base helpers every request goes through, on realistic inputs:
+1000-level books, 10k orders, mandala request signing.
+Results are written as JSON and can be compared against a stored baseline to prove a speedup or catch a regression.
+Usage: python benchmarks/bench_ccxt_base.py [-r REPEAT] [-k SUBSTRING] [-o RESULTS.json]
+                                            [-b BASELINE.json] [-t THRESHOLD]
+"""
+import os
+import sys
+import json
+import random
+import timeit
+import hashlib
+import argparse
+import platform
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ccxt  # noqa: E402
+from ccxt.base.exchange import Exchange  # noqa: E402
+from ccxt.base.decimal_to_precision import decimal_to_precision, ROUND, TRUNCATE, DECIMAL_PLACES, \
+    SIGNIFICANT_DIGITS, PAD_WITH_ZERO  # noqa: E402
+
+bench_args = argparse.ArgumentParser()
+bench_args.add_argument('-r', '--repeat', type=int, default=7, help='number of timed runs of each case')
+bench_args.add_argument('-k', '--keyword', default='', help='only run the cases with this substring in the name')
+bench_args.add_argument('-o', '--output', help='write the results as JSON to this file, e.g. to store a baseline')
+bench_args.add_argument('-b', '--baseline', help='JSON results of an earlier run to compare against')
+bench_args.add_argument('-t', '--threshold', type=float, default=1.15,
+                        help='a case slower than the baseline by more than this ratio is a regression')
+bench_args.add_argument('--seed', type=int, default=1, help='seed of the generated inputs')
+options = bench_args.parse_args()
+
+LEVELS = 1000
+ORDERS = 10000
+SYMBOLS = ('MDX/BTC', 'ETH/BTC', 'MDX/ETH', 'BTC/USDT')
+START = 1552825727108  # ms
+
+
+def book_side(rng, best, step, levels):
+    # mandala sends prices and amounts as strings with a trailing empty list of orders
+    return [['{:.8f}'.format(best + step * i), '{:.8f}'.format(rng.uniform(0.001, 50)), []] for i in range(levels)]
+
+
+def make_orders(rng, count):
+    orders = []
+    for i in range(count):
+        timestamp = START + i * 1000 + rng.randint(0, 999)
+        orders.append({
+            'id': str(20000000 + i),
+            'symbol': rng.choice(SYMBOLS),
+            'timestamp': timestamp,
+            'datetime': Exchange.iso8601(timestamp),
+            'side': rng.choice(('buy', 'sell')),
+            'price': round(rng.uniform(0.0001, 0.0003), 8),
+            'amount': float(rng.randint(1, 600)),
+        })
+    rng.shuffle(orders)
+    return orders
+
+
+def make_cases(rng):
+    """
+    :return: list of (name, function without arguments, number of calls per timed run)
+    """
+    exchange = Exchange()
+    mandala = ccxt.mandala({
+        'apiKey': 'a6c5f2ed-5d4b-4bcb-9b4f-43ab6d8f6bd2',
+        'secret': 'c1a3fa35-1f54-4a2c-8c6e-1d1b5a9e5f03',
+        'options': {'accessToken': 'WWRNCO--bFjX3zKAixROAjy3dbU0csNoI91PXpT1oScTrik50mVrSIbr22HrsJV5ATXgN867vy66',
+                    'tokenType': 'bearer'},
+    })
+
+    prices = [rng.uniform(0.00001, 0.001) for i in range(LEVELS)]
+    amounts = [rng.uniform(0.001, 50000) for i in range(LEVELS)]
+    book = {
+        'lastUpdate': START,
+        'bids': book_side(rng, 0.0288, -0.00000001, LEVELS),
+        'asks': book_side(rng, 0.0289, 0.00000001, LEVELS),
+    }
+    rng.shuffle(book['bids'])
+    rng.shuffle(book['asks'])
+    dict_levels = [{'Rate': float(price), 'Volume': float(amount)} for price, amount, orders in book['bids']]
+    orders = make_orders(rng, ORDERS)
+    timestamps = [START + i * 60013 for i in range(LEVELS)]
+    datetimes = [Exchange.iso8601(timestamp) for timestamp in timestamps]
+    describe = mandala.describe()
+    overrides = {'options': {'fetchCurrencies': {'expires': 1000}}, 'urls': {'api': 'https://zapi.{hostname}'},
+                 'timeout': 5000, 'enableRateLimit': True}
+    request = {'market': 'BTC', 'trade': 'MDX', 'type': 'LIMIT', 'side': 'BUY', 'timeInForce': 'GTC',
+               'rate': '0.00020000', 'volume': '300', 'stop': 0}
+    auth = exchange.encode(exchange.urlencode(exchange.keysort(exchange.extend({'timestamp': 1552825727}, request))))
+    secret = exchange.encode(mandala.secret)
+
+    return [
+        ('decimal_to_precision round', lambda: [
+            decimal_to_precision(price, ROUND, 8, DECIMAL_PLACES) for price in prices], 10),
+        ('decimal_to_precision truncate', lambda: [
+            decimal_to_precision(amount, TRUNCATE, 3, DECIMAL_PLACES) for amount in amounts], 10),
+        ('decimal_to_precision significant', lambda: [
+            decimal_to_precision(price, ROUND, 5, SIGNIFICANT_DIGITS, PAD_WITH_ZERO) for price in prices], 10),
+        ('iso8601', lambda: [Exchange.iso8601(timestamp) for timestamp in timestamps], 10),
+        ('parse8601', lambda: [Exchange.parse8601(datetime) for datetime in datetimes], 10),
+        ('extend', lambda: exchange.extend(request, {'clientOrderId': '1'}), 10000),
+        ('deep_extend describe', lambda: exchange.deep_extend(describe, overrides), 100),
+        ('parse_bids_asks lists', lambda: exchange.parse_bids_asks(book['bids']), 10),
+        ('parse_bids_asks dicts', lambda: exchange.parse_bids_asks(dict_levels, 'Rate', 'Volume'), 10),
+        ('parse_order_book', lambda: exchange.parse_order_book(book, book['lastUpdate']), 10),
+        ('sort_by orders', lambda: exchange.sort_by(orders, 'timestamp'), 10),
+        ('filter_by_value_since_limit orders', lambda: exchange.filter_by_value_since_limit(
+            orders, 'symbol', 'MDX/BTC', START + ORDERS * 500, 100), 10),
+        ('implode_params', lambda: exchange.implode_params(
+            'AuthenticateUser_Resend_EmailOTP/{tempAuthToken}', {'tempAuthToken': 'e1b0603a', 'limit': 10}), 10000),
+        ('url', lambda: exchange.url('market/get-depth/{symbol}', {'symbol': 'MDX_BTC', 'limit': 50}), 10000),
+        ('hmac sha512', lambda: exchange.hmac(auth, secret, hashlib.sha512), 10000),
+        ('mandala.sign api GET', lambda: mandala.sign('GetPendingOrders', 'api', 'GET', {
+            'side': 'ALL', 'pair': 'ALL', 'recvWindow': 3600}), 1000),
+        ('mandala.sign order POST', lambda: mandala.sign('PlaceOrder', 'order', 'POST', request), 1000),
+        ('mandala.sign market GET', lambda: mandala.sign('get-depth', 'market', 'GET', {
+            'symbol': 'MDX_BTC', 'limit': 50}), 1000),
+    ]
+
+
+def measure(function, number):
+    """
+    :return: dict with the 'min' and 'median' microseconds per call over the timed runs and the calls per run
+    """
+    runs = timeit.Timer(function).repeat(repeat=options.repeat, number=number)
+    per_call = [elapsed / number * 1e6 for elapsed in runs]
+    return {'min': round(min(per_call), 3), 'median': round(statistics.median(per_call), 3), 'number': number}
+
+
+def compare(results, baseline):
+    """
+    Prints the ratio of each case to the baseline, min to min which is the least noisy
+    :return: names of the cases slower than the baseline by more than the threshold
+    """
+    regressions = []
+    print('\ncompared to {} (ratio > {} is a regression)'.format(options.baseline, options.threshold))
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print('{:<36} {:>12}'.format(name, 'new'))
+            continue
+        ratio = result['min'] / before['min']
+        regressed = ratio > options.threshold
+        if regressed:
+            regressions.append(name)
+        print('{:<36} {:>12.3f} {:>12.3f} {:>7.2f}x{}'.format(
+            name, before['min'], result['min'], ratio, '  REGRESSION' if regressed else ''
+        ))
+    return regressions
+
+
+def run():
+    cases = [case for case in make_cases(random.Random(options.seed)) if options.keyword in case[0]]
+    results = {}
+    print('{:<36} {:>12} {:>12}'.format('case', 'min, us', 'median, us'))
+    for name, function, number in cases:
+        function()  # warm up
+        results[name] = measure(function, number)
+        print('{:<36} {:>12.3f} {:>12.3f}'.format(name, results[name]['min'], results[name]['median']))
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'ccxt': ccxt.__version__,
+        'seed': options.seed,
+        'repeat': options.repeat,
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as baseline:
+            regressions = compare(results, json.load(baseline))
+        if regressions:
+            sys.exit('{} regression(s): {}'.format(len(regressions), ', '.join(regressions)))
+
+
+if __name__ == '__main__':
+    run()
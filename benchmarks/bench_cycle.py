@@ -0,0 +1,88 @@
+"""
+CPU time of one orderbook maintenance cycle without the network:
+building the market snapshot and planning the orders on a synthetic book.
+Usage: python benchmarks/bench_cycle.py [-l LEVELS] [-n CYCLES]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+bench_args = argparse.ArgumentParser()
+bench_args.add_argument('-l', '--levels', type=int, default=1000, help='orderbook levels on each side')
+bench_args.add_argument('-n', '--cycles', type=int, default=200, help='number of cycles to measure')
+bench_args.add_argument('-o', '--own-orders', type=int, default=100, help='our open orders on each side')
+options = bench_args.parse_args()
+
+# main parses the command line on import
+sys.argv = [sys.argv[0], '-c', os.path.join(ROOT, 'config.sample.ini')]
+from main import MarketMakerBot, MarketSnapshot, config  # noqa: E402
+
+PAIR = 'MDX/BTC'
+REF_PRICE = Decimal('0.0002')
+PRICE_STEP = Decimal('0.00000001')
+
+
+def synthetic_market(levels, own_orders):
+    """
+    :return: (depth, ticker, open orders) shaped as ccxt returns them, prices and amounts are floats
+    """
+    bids = [[float(REF_PRICE - PRICE_STEP * (i + 50)), float(random.randint(1, 5))] for i in range(levels)]
+    asks = [[float(REF_PRICE + PRICE_STEP * (i + 50)), float(random.randint(1, 5))] for i in range(levels)]
+    orders = []
+    for side, book in (('BUY', bids), ('SELL', asks)):
+        for price, amount in random.sample(book, own_orders):
+            orders.append({
+                'id': str(len(orders)), 'symbol': PAIR, 'side': None,
+                'price': price, 'amount': float(random.randint(30, 60) * 10), 'info': {'side': side}
+            })
+    return {'bids': bids, 'asks': asks}, {'last': float(REF_PRICE)}, orders
+
+
+def make_bot():
+    config.read_dict({'MarketMaker': {
+        'DisableLiquidity': 'no',
+        'CurrencyPair': PAIR,
+        'OrderbookPriceStep': str(PRICE_STEP),
+        'OrderbookMaxSpread': '0.000001',
+        'OrderbookMinVolume': '30000',
+        'OrderbookMaxVolume': '100000',
+        'OrderbookPriceTolerance': str(PRICE_STEP),
+        'OrderbookAmountTolerance': '0.1',
+    }})
+    # no API client and no jobs, only the settings are needed for planning
+    bot = MarketMakerBot.__new__(MarketMakerBot)
+    bot.load_settings('MarketMaker')
+    return bot
+
+
+def run():
+    random.seed(1)
+    logging.disable(logging.INFO)
+    bot = make_bot()
+    depth, ticker, open_orders = synthetic_market(options.levels, options.own_orders)
+    build_time = 0
+    plan_time = 0
+    for i in range(options.cycles):
+        started = time.process_time()
+        snapshot = MarketSnapshot.build(PAIR, depth, ticker, REF_PRICE, open_orders, bot.price_scale, bot.amount_scale)
+        built = time.process_time()
+        bot.plan_orders(snapshot)
+        plan_time += time.process_time() - built
+        build_time += built - started
+    print('{} levels per side, {} own orders per side, {} cycles'.format(
+        options.levels, options.own_orders, options.cycles
+    ))
+    print('snapshot: {:.3f} ms/cycle'.format(build_time / options.cycles * 1000))
+    print('planning: {:.3f} ms/cycle'.format(plan_time / options.cycles * 1000))
+    print('total:    {:.3f} ms/cycle'.format((build_time + plan_time) / options.cycles * 1000))
+
+
+if __name__ == '__main__':
+    run()
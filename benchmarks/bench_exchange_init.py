@@ -0,0 +1,53 @@
+"""
+Wall time of creating ccxt exchange instances:
+the first instance of a class prepares the class, the next ones should not depend on the number of endpoints.
+Usage: python benchmarks/bench_exchange_init.py [-n INSTANCES] [-l LARGEST] [EXCHANGE_ID ...]
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ccxt  # noqa: E402
+
+bench_args = argparse.ArgumentParser()
+bench_args.add_argument('exchanges', nargs='*', help='ids of the exchanges to create, the largest ones by default')
+bench_args.add_argument('-n', '--instances', type=int, default=50, help='number of instances to create')
+bench_args.add_argument('-l', '--largest', type=int, default=10, help='number of the largest exchange modules to create')
+options = bench_args.parse_args()
+
+
+def largest_exchanges(count) -> list:
+    """
+    :return: ids of the exchanges with the largest modules, the biggest describe() and api
+    """
+    def module_size(exchange_id):
+        return os.path.getsize(os.path.join(ROOT, 'ccxt', exchange_id + '.py'))
+    return sorted(ccxt.exchanges, key=module_size, reverse=True)[:count]
+
+
+def endpoints(api) -> int:
+    return sum(len(urls) for methods in api.values() for urls in methods.values())
+
+
+def run():
+    print('{:<12} {:>9} {:>14} {:>14}'.format('exchange', 'endpoints', 'first, ms', 'next, ms'))
+    for exchange_id in options.exchanges or largest_exchanges(options.largest):
+        exchange_class = getattr(ccxt, exchange_id)
+        started = time.perf_counter()
+        exchange = exchange_class()
+        first = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(options.instances):
+            exchange_class()
+        after_first = (time.perf_counter() - started) / options.instances
+        print('{:<12} {:>9d} {:>14.3f} {:>14.3f}'.format(
+            exchange_id, endpoints(exchange.api), first * 1000, after_first * 1000
+        ))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,62 @@
+"""
+Wall time of importing ccxt in a fresh interpreter:
+what the bot loads (the package and mandala, sync and async) against loading every exchange,
+which is what "import ccxt" did before the exchange classes were loaded on demand.
+Usage: python benchmarks/bench_import.py [-n RUNS]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+bench_args = argparse.ArgumentParser()
+bench_args.add_argument('-n', '--runs', type=int, default=10, help='number of fresh interpreters per case')
+options = bench_args.parse_args()
+
+CASES = (
+    ('import ccxt', 'import ccxt'),
+    ('bot imports', 'import ccxt, ccxt.async_support; ccxt.mandala; ccxt.async_support.mandala'),
+    ('all exchanges', 'import ccxt, ccxt.async_support\n'
+                      'for exchange_id in ccxt.exchanges:\n'
+                      '    getattr(ccxt, exchange_id)\n'
+                      '    getattr(ccxt.async_support, exchange_id)'),
+)
+
+# the timer starts after the interpreter itself is up, so only the imports are measured
+SCRIPT = '''
+import sys, time, json
+started = time.perf_counter()
+{}
+elapsed = time.perf_counter() - started
+loaded = [name for name in sys.modules if name.startswith('ccxt.') and name.rsplit('.', 1)[-1] in ccxt.exchanges]
+print(json.dumps([elapsed, len(loaded)]))
+'''
+
+
+def measure(code):
+    """
+    :return: (median seconds, number of exchange modules loaded)
+    """
+    times = []
+    loaded = 0
+    for i in range(options.runs):
+        output = subprocess.run([sys.executable, '-c', SCRIPT.format(code)], cwd=ROOT, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        elapsed, loaded = json.loads(output)
+        times.append(elapsed)
+    return statistics.median(times), loaded
+
+
+def run():
+    print('median of {} runs'.format(options.runs))
+    for name, code in CASES:
+        elapsed, loaded = measure(code)
+        print('{:<14} {:8.1f} ms  {:3d} exchange modules'.format(name + ':', elapsed * 1000, loaded))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,79 @@
+"""
+Time a logger.info() call takes on the calling thread, which is the trading thread in the bot,
+with the records written right away and with them queued to the background listener (text and JSON lines).
+Usage: python benchmarks/bench_logging.py [-n RECORDS] [-w WRITE_DELAY_MS]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+bench_args = argparse.ArgumentParser()
+bench_args.add_argument('-n', '--records', type=int, default=20000, help='number of records to log per mode')
+bench_args.add_argument('-w', '--write-delay', type=float, default=0,
+                        help='milliseconds every console write takes, to imitate a slow terminal or pipe')
+options = bench_args.parse_args()
+
+
+class SlowNull:
+    """
+    Console discarding everything after the write delay
+    """
+    def write(self, text):
+        if options.write_delay > 0:
+            time.sleep(options.write_delay / 1000)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+# the handlers write to stderr, it is replaced before any of them is made
+sys.stderr = SlowNull()
+
+import custom_logging  # noqa: E402
+from custom_logging import get_logger, configure_logging, stop_logging  # noqa: E402
+logger = get_logger('bench')
+
+MODES = (
+    ('text', False, False),
+    ('text, queue', True, False),
+    ('json, queue', True, True),
+)
+
+
+def measure():
+    """
+    :return: list of seconds each call took on the calling thread
+    """
+    times = []
+    for i in range(options.records):
+        started = time.perf_counter()
+        logger.info('Placed {} of {} {} orders in {:.2f}s at {:f}', i, 10, 'new', 0.25, Decimal('0.0000123'))
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def run():
+    print('{:<14} {:>10} {:>10} {:>10} {:>12}'.format('mode', 'mean, us', 'p99, us', 'max, us', 'drained, s'))
+    for name, use_queue, json_lines in MODES:
+        configure_logging(use_queue, json_lines)
+        started = time.perf_counter()
+        times = measure()
+        # all the records are written out once the listener is stopped
+        stop_logging()
+        drained = time.perf_counter() - started
+        times.sort()
+        print('{:<14} {:>10.2f} {:>10.2f} {:>10.2f} {:>12.2f}'.format(
+            name, statistics.mean(times) * 1e6, times[int(len(times) * 0.99)] * 1e6, times[-1] * 1e6, drained
+        ))
+    custom_logging.handler_console.flush()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,72 @@
+"""
+CPU time of the bot's exchange calls on recorded mandala responses, without the network:
+signing, the JSON decoding and parse_order_book / parse_orders of real payloads.
+Record them first by running the bot with HttpRecordFile set in the [Exchange] section.
+Usage: python benchmarks/bench_replay.py RECORDING [-s SYMBOL] [-l LIMIT] [-n CALLS] [-m MARKETS_CACHE_DIR]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ccxt  # noqa: E402
+
+bench_args = argparse.ArgumentParser()
+bench_args.add_argument('recording', help='file recorded with HttpRecordFile')
+bench_args.add_argument('-s', '--symbol', default='MDX/BTC', help='currency pair of the recorded order books')
+bench_args.add_argument('-l', '--limit', type=int, default=50, help='depth limit of the recorded order books')
+bench_args.add_argument('-n', '--calls', type=int, default=200, help='number of calls of each method to measure')
+bench_args.add_argument('-m', '--markets-cache', default=os.path.join(ROOT, 'cache'),
+                        help='markets cache directory of the recording bot, if the markets were not recorded')
+options = bench_args.parse_args()
+
+
+def make_exchange():
+    # the credentials only have to be present for the requests to be signed, nothing is sent
+    return ccxt.mandala({
+        'apiKey': 'replay',
+        'secret': 'replay',
+        'options': {'accessToken': 'replay'},
+        'httpReplayFile': options.recording,
+        'marketsCacheDir': options.markets_cache,
+        'marketsCacheTTL': float('inf'),
+        'enableRateLimit': False,
+    })
+
+
+def measure(call):
+    """
+    :return: (median, min) milliseconds per call
+    """
+    times = []
+    for i in range(options.calls):
+        started = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), min(times)
+
+
+def run():
+    exchange = make_exchange()
+    exchange.load_markets()
+    cases = (
+        ('fetch_order_book', lambda: exchange.fetch_order_book(options.symbol, limit=options.limit)),
+        ('fetch_open_orders', lambda: exchange.fetch_open_orders()),
+    )
+    print('{:<20} {:>12} {:>12}'.format('call', 'median, ms', 'min, ms'))
+    for name, call in cases:
+        try:
+            median, fastest = measure(call)
+        except ccxt.ExchangeNotAvailable as e:
+            print('{:<20} not recorded: {}'.format(name, e))
+            continue
+        print('{:<20} {:>12.3f} {:>12.3f}'.format(name, median, fastest))
+    print('{} responses replayed'.format(exchange.http_replay.replayed))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,55 @@
+import math
+from reconciler import ReconcilePlan
+
+# a pass may always restore the spread on both sides, even if the cycle is too short for the rate limit
+MIN_CALLS = 2
+
+
+def calls_per_cycle(cycle_interval, job_interval, calls_per_run=1) -> int:
+    """
+    :return: max number of calls a job running every <job_interval> seconds makes within one cycle
+    """
+    return math.ceil(cycle_interval / job_interval) * calls_per_run
+
+
+class CallBudget:
+    """
+    Caps the writes of a maintenance pass, so that the pass completes within its cycle at the exchange rate limit.
+    Actions are taken in the order of importance: orders restoring the spread, cancels, then the orders
+    topping up the depth. Whatever does not fit is deferred to the next pass, which plans it again
+    """
+    def __init__(self, calls):
+        """
+        :param calls: max number of creates and cancels per pass
+        """
+        self.calls = calls
+
+    @classmethod
+    def for_cycle(cls, cycle_interval, request_interval, reserved=0, pairs=1):
+        """
+        :param cycle_interval: number of seconds between passes
+        :param request_interval: number of seconds between requests allowed by the exchange
+        :param reserved: calls per cycle taken by the reads of the pass and by the other jobs
+        :param pairs: number of pairs maintained in the pass, each gets an equal part of the budget
+        """
+        return cls(max((int(cycle_interval / request_interval) - reserved) // pairs, MIN_CALLS))
+
+    def fit(self, plan: ReconcilePlan) -> ReconcilePlan:
+        """
+        :param plan: orders planned as dicts with 'purpose', 'spread' or 'top-up'
+        :return: plan within the budget, the open orders which could not be cancelled are kept
+        """
+        if plan.calls <= self.calls:
+            return plan
+        left = self.calls
+        spread = [order for order in plan.to_create if order['purpose'] == 'spread'][:left]
+        left -= len(spread)
+        to_cancel = plan.to_cancel[:left]
+        left -= len(to_cancel)
+        top_ups = [order for order in plan.to_create if order['purpose'] != 'spread'][:left]
+        return plan._replace(
+            to_create=spread + top_ups,
+            to_cancel=to_cancel,
+            kept=plan.kept + plan.to_cancel[len(to_cancel):],
+            deferred=plan.calls - len(spread) - len(to_cancel) - len(top_ups)
+        )
@@ -31,7 +31,8 @@ from ccxt.base.errors import NotSupported
 
 # -----------------------------------------------------------------------------
 
-from ccxt.base.exchange import Exchange as BaseExchange
+from ccxt.base.exchange import Exchange as BaseExchange, request_throttle
+from ccxt.base.metrics import RequestTimings, request_timings
 
 # -----------------------------------------------------------------------------
 
@@ -81,6 +82,8 @@ class Exchange(BaseExchange):
             self.session = aiohttp.ClientSession(loop=self.asyncio_loop, connector=connector, trust_env=self.aiohttp_trust_env)
 
     async def close(self):
+        if self.markets_revalidation is not None and not self.markets_revalidation.done():
+            self.markets_revalidation.cancel()
         if self.session is not None:
             if self.own_session:
                 await self.session.close()
@@ -108,12 +111,41 @@ class Exchange(BaseExchange):
 
     async def fetch2(self, path, api='public', method='GET', params={}, headers=None, body=None):
         """A better wrapper over request for deferred signing"""
-        if self.enableRateLimit:
+        if self.metrics is not None:
+            return await self.measured_fetch2(path, api, method, params, headers, body)
+        throttle = request_throttle.get()
+        if throttle is not None:
+            await throttle()
+        elif self.enableRateLimit:
             await self.throttle()
         self.lastRestRequestTimestamp = self.milliseconds()
         request = self.sign(path, api, method, params, headers, body)
         return await self.fetch(request['url'], request['method'], request['headers'], request['body'])
 
+    async def measured_fetch2(self, path, api='public', method='GET', params={}, headers=None, body=None):
+        """fetch2 adding the phases of the request to the metrics of its endpoint"""
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        error = None
+        try:
+            throttle = request_throttle.get()
+            if throttle is not None:
+                await throttle()
+            elif self.enableRateLimit:
+                await self.throttle()
+            timings.start('sign')
+            self.lastRestRequestTimestamp = self.milliseconds()
+            request = self.sign(path, api, method, params, headers, body)
+            timings.start('wait')
+            return await self.fetch(request['url'], request['method'], request['headers'], request['body'])
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            request_timings.reset(token)
+            timings.finish()
+            self.metrics.observe(self.endpoint_name(path, api, method), timings, error)
+
     async def fetch(self, url, method='GET', headers=None, body=None):
         """Perform a HTTP request and return decoded JSON data"""
         request_headers = self.prepare_request_headers(headers)
@@ -126,27 +158,47 @@ class Exchange(BaseExchange):
         encoded_body = body.encode() if body else None
         session_method = getattr(self.session, method.lower())
 
-        response = None
         http_response = None
         json_response = None
+        timings = request_timings.get()
         try:
-            async with session_method(yarl.URL(url, encoded=True),
-                                      data=encoded_body,
-                                      headers=request_headers,
-                                      timeout=(self.timeout / 1000),
-                                      proxy=self.aiohttp_proxy) as response:
-                http_response = await response.text()
-                json_response = self.parse_json(http_response) if self.is_json_encoded_object(http_response) else None
-                headers = response.headers
-                if self.enableLastHttpResponse:
-                    self.last_http_response = http_response
-                if self.enableLastResponseHeaders:
-                    self.last_response_headers = headers
-                if self.enableLastJsonResponse:
-                    self.last_json_response = json_response
-                if self.verbose:
-                    print("\nResponse:", method, url, response.status, headers, http_response)
-                self.logger.debug("%s %s, Response: %s %s %s", method, url, response.status, headers, http_response)
+            if self.http_replay is not None:
+                entry = self.http_replay.next(method, url, self.http_secrets())
+                await asyncio.sleep(self.http_replay.delay(entry))
+                status, reason, headers = entry['status'], entry['reason'], entry['headers']
+                http_response = entry['body']
+                if timings is not None:
+                    timings.start('decode')
+                    timings.bytes = len(http_response.encode('utf-8'))
+            else:
+                started = time.perf_counter()
+                async with session_method(yarl.URL(url, encoded=True),
+                                          data=encoded_body,
+                                          headers=request_headers,
+                                          timeout=(self.timeout / 1000),
+                                          proxy=self.aiohttp_proxy) as response:
+                    if timings is not None:
+                        timings.start('transfer')
+                        timings.bytes = len(await response.read())
+                    http_response = await response.text()
+                    status, reason, headers = response.status, response.reason, response.headers
+                if timings is not None:
+                    timings.start('decode')
+                if self.http_recorder is not None:
+                    self.http_recorder.record(method, url, status, reason, headers, http_response,
+                                              time.perf_counter() - started)
+            json_response = self.parse_json(http_response) if self.is_json_encoded_object(http_response) else None
+            if timings is not None:
+                timings.start('handle')
+            if self.enableLastHttpResponse:
+                self.last_http_response = http_response
+            if self.enableLastResponseHeaders:
+                self.last_response_headers = headers
+            if self.enableLastJsonResponse:
+                self.last_json_response = json_response
+            if self.verbose:
+                print("\nResponse:", method, url, status, headers, http_response)
+            self.logger.debug("%s %s, Response: %s %s %s", method, url, status, headers, http_response)
 
         except socket.gaierror as e:
             self.raise_error(ExchangeNotAvailable, url, method, e, None)
@@ -160,8 +212,8 @@ class Exchange(BaseExchange):
         except aiohttp.client_exceptions.ClientError as e:  # base exception class
             self.raise_error(ExchangeError, url, method, e, None)
 
-        self.handle_errors(response.status, response.reason, url, method, headers, http_response, json_response)
-        self.handle_rest_errors(None, response.status, http_response, url, method)
+        self.handle_errors(status, reason, url, method, headers, http_response, json_response)
+        self.handle_rest_errors(None, status, http_response, url, method)
         self.handle_rest_response(http_response, json_response, url, method, headers, body)
         if json_response is not None:
             return json_response
@@ -173,11 +225,36 @@ class Exchange(BaseExchange):
                 if not self.markets_by_id:
                     return self.set_markets(self.markets)
                 return self.markets
+            cached = self.read_markets_cache()
+            if cached is not None:
+                markets = self.set_markets(cached['markets'], cached['currencies'])
+                self.markets_stale = True
+                if self.revalidateMarkets:
+                    self.revalidate_markets(params)
+                return markets
+        markets, currencies = await self.fetch_markets_and_currencies(params)
+        return self.set_markets(markets, currencies)
+
+    async def fetch_markets_and_currencies(self, params={}):
         currencies = None
         if self.has['fetchCurrencies']:
             currencies = await self.fetch_currencies()
         markets = await self.fetch_markets(params)
-        return self.set_markets(markets, currencies)
+        self.write_markets_cache(markets, currencies)
+        return markets, currencies
+
+    def revalidate_markets(self, params={}, throttle=None):
+        """Reload the markets taken from the disk cache in a background task,
+        await throttle() is made before each of its requests if passed, e.g. to share a rate limiter with the caller"""
+        async def revalidate():
+            request_throttle.set(throttle)
+            try:
+                markets, currencies = await self.fetch_markets_and_currencies(params)
+                self.set_markets(markets, currencies)
+                self.markets_stale = False
+            except Exception as e:
+                self.logger.warning('%s markets revalidation failed: %s', self.id, e)
+        self.markets_revalidation = self.asyncio_loop.create_task(revalidate())
 
     async def fetch_fees(self):
         trading = {}
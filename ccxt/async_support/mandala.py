@@ -265,7 +265,7 @@ class mandala (Exchange):
         #
         expiresIn = self.safe_integer(tokenResponse, 'expires_in')
         self.options['expires'] = self.sum(self.milliseconds(), expiresIn * 1000)
-        self.options['accessToken'] = self.safe_string(tokenResponse, 'accessToken')
+        self.options['accessToken'] = self.safe_string(tokenResponse, 'access_token')
         self.options['tokenType'] = self.safe_string(tokenResponse, 'token_type')
         # accessToken = self.safe_value(tokenResponse, 'access_token')
         # self.headers['Authorization'] = 'Bearer ' + accessToken
@@ -812,7 +812,9 @@ class mandala (Exchange):
         data = self.safe_value(response, 'data')
         return self.parse_ohlcvs(data, market, timeframe, since, limit)
 
-    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+    async def create_order(self, symbol, type, side, amount, price=None, params=None):
+        if params is None:
+            params = {}
         await self.load_markets()
         market = self.market(symbol)
         orderPrice = price
@@ -969,7 +971,7 @@ class mandala (Exchange):
         status = self.safe_value_2(order, 'orderStatus', 'Status')
         status = 'closed' if status else 'open'
         lastTradeTimestamp = None
-        if filled > 0:
+        if filled is not None and filled > 0:
             lastTradeTimestamp = completionDate
         if (filled is not None) and(amount is not None):
             if (filled < amount) and(status == 'closed'):
@@ -1459,6 +1461,8 @@ class mandala (Exchange):
         }
 
     def sign(self, path, api='api', method='GET', params={}, headers=None, body=None):
+        if headers is None:
+            headers = {}
         url = self.implode_params(self.urls['api'], {
             'hostname': self.hostname,
         })
@@ -1509,6 +1513,7 @@ class mandala (Exchange):
             elif method == 'GET':
                 if query:
                     url += '?' + self.urlencode(query)
+        headers.update({'apiKey': self.apiKey})
         return {'url': url, 'method': method, 'body': body, 'headers': headers}
 
     def handle_errors(self, httpCode, reason, url, method, headers, body, response):
@@ -8,6 +8,11 @@ __version__ = '1.18.570'
 
 # -----------------------------------------------------------------------------
 
+# bump when the layout of the markets cache file changes
+MARKETS_CACHE_VERSION = 1
+
+# -----------------------------------------------------------------------------
+
 from ccxt.base.errors import ExchangeError
 from ccxt.base.errors import NetworkError
 from ccxt.base.errors import NotSupported
@@ -23,6 +28,9 @@ from ccxt.base.decimal_to_precision import decimal_to_precision
 from ccxt.base.decimal_to_precision import DECIMAL_PLACES, TRUNCATE, ROUND
 from ccxt.base.decimal_to_precision import number_to_string
 
+from ccxt.base.http_record import HttpRecorder, HttpReplay, requests_response
+from ccxt.base.metrics import ExchangeMetrics, RequestTimings, request_timings
+
 # -----------------------------------------------------------------------------
 
 __all__ = [
@@ -32,11 +40,12 @@ __all__ = [
 # -----------------------------------------------------------------------------
 
 # Python 2 & 3
-import types
+import inspect
 import logging
 import base64
 import calendar
 import collections
+import contextvars
 import datetime
 from email.utils import parsedate
 import functools
@@ -47,7 +56,9 @@ import io
 import json
 import math
 from numbers import Number
+import os
 import re
+import threading
 from requests import Session
 from requests.utils import default_user_agent
 from requests.exceptions import HTTPError, Timeout, TooManyRedirects, RequestException
@@ -61,6 +72,12 @@ from decimal import Decimal
 
 # -----------------------------------------------------------------------------
 
+# callable (coroutine function in async_support) waited for before every request made by the current thread or task
+# instead of the exchange's own throttle(), None to use the latter, see revalidate_markets()
+request_throttle = contextvars.ContextVar('request_throttle', default=None)
+
+# -----------------------------------------------------------------------------
+
 try:
     basestring  # basestring was removed in Python 3
 except NameError:
@@ -199,6 +216,7 @@ class Exchange(object):
     transactions = None
     currencies = None
     options = None  # Python does not allow to define properties in run-time with setattr
+    instanceSettings = ['options', 'headers', 'urls']  # parts of describe() an instance may change
     accounts = None
 
     requiredCredentials = {
@@ -275,6 +293,22 @@ class Exchange(object):
     requiresWeb3 = False
     web3 = None
 
+    marketsCacheDir = None  # directory to keep loaded markets and currencies in between runs, None disables the cache
+    marketsCacheTTL = 86400  # seconds, an older cached copy is not used
+    revalidateMarkets = True  # reload the markets taken from the cache in the background right away, if False
+    # only markets_stale is set and the caller runs revalidate_markets() when it suits it
+    markets_revalidation = None  # background reload of markets taken from the cache
+    markets_stale = False  # whether the markets were taken from the cache and not reloaded since
+
+    httpRecordFile = None  # append every response to this file (JSON lines, gzipped if it ends with .gz), None disables
+    httpReplayFile = None  # serve the responses recorded to this file instead of the network, None disables
+    httpReplayTiming = 'fast'  # 'recorded' to take as long as the recorded requests did
+    http_recorder = None
+    http_replay = None
+
+    enableMetrics = False  # measure the latency phases, errors and response sizes of the requests per endpoint
+    metrics = None  # ExchangeMetrics if enabled
+
     commonCurrencies = {
         'XBT': 'BTC',
         'BCC': 'BCH',
@@ -306,31 +340,44 @@ class Exchange(object):
 
         self.userAgent = default_user_agent()
 
-        settings = self.deep_extend(self.describe(), config)
-
-        for key in settings:
+        # the description is merged once per class and shared by its instances,
+        # except for the settings the instances change (instanceSettings), each instance gets a copy of those
+        cls = type(self)
+        described = cls.__dict__.get('_described')
+        if described is None:
+            described = {}
+            for key, value in self.describe().items():
+                attr = getattr(self, key, None)
+                described[key] = self.deep_extend(attr, value) if isinstance(attr, dict) else value
+            cls._described = described
+
+        for key, value in described.items():
+            setattr(self, key, self.deep_extend(value) if key in self.instanceSettings else value)
+
+        for key in config:
             if hasattr(self, key) and isinstance(getattr(self, key), dict):
-                setattr(self, key, self.deep_extend(getattr(self, key), settings[key]))
+                setattr(self, key, self.deep_extend(getattr(self, key), config[key]))
             else:
-                setattr(self, key, settings[key])
+                setattr(self, key, config[key])
 
-        if self.api:
+        # the endpoint methods and the camelcase aliases of the class attributes are defined once per class,
+        # an api passed in the config is defined again over the class methods for every such instance
+        if self.api and ('api' in config or not cls.__dict__.get('_rest_api_defined', False)):
             self.define_rest_api(self.api, 'request')
+            cls._rest_api_defined = 'api' not in config
+            cls._camelcase_defined = False
 
         if self.markets:
             self.set_markets(self.markets)
 
         # convert all properties from underscore notation foo_bar to camelcase notation fooBar
-        cls = type(self)
-        for name in dir(self):
-            if name[0] != '_' and name[-1] != '_' and '_' in name:
-                parts = name.split('_')
-                camelcase = parts[0] + ''.join(self.capitalize(i) for i in parts[1:])
-                attr = getattr(self, name)
-                if isinstance(attr, types.MethodType):
-                    setattr(cls, camelcase, getattr(cls, name))
-                else:
-                    setattr(self, camelcase, attr)
+        if not cls.__dict__.get('_camelcase_defined', False):
+            cls.define_camelcase_aliases()
+            cls._camelcase_defined = True
+        for name, attr in list(self.__dict__.items()):
+            camelcase = self.camelcase_alias(name)
+            if camelcase is not None:
+                setattr(self, camelcase, attr)
 
         self.tokenBucket = self.extend({
             'refillRate': 1.0 / self.rateLimit,
@@ -342,6 +389,14 @@ class Exchange(object):
         self.session = self.session if self.session else Session()
         self.logger = self.logger if self.logger else logging.getLogger(__name__)
 
+        if self.enableMetrics:
+            self.metrics = ExchangeMetrics(self.id)
+
+        if self.httpReplayFile:
+            self.http_replay = HttpReplay(self.httpReplayFile, self.httpReplayTiming)
+        elif self.httpRecordFile:
+            self.http_recorder = HttpRecorder(self.httpRecordFile, self.http_secrets())
+
         if self.requiresWeb3 and Web3 and not self.web3:
             # self.web3 = w3 if w3 else Web3(HTTPProvider())
             self.web3 = Web3(HTTPProvider())
@@ -376,12 +431,10 @@ class Exchange(object):
 
                     uppercase_method = http_method.upper()
                     lowercase_method = http_method.lower()
-                    camelcase_method = lowercase_method.capitalize()
-                    camelcase_suffix = ''.join([Exchange.capitalize(x) for x in split_path])
                     lowercase_path = [x.strip().lower() for x in split_path]
                     underscore_suffix = '_'.join([k for k in lowercase_path if len(k)])
 
-                    camelcase = api_type + camelcase_method + Exchange.capitalize(camelcase_suffix)
+                    camelcase = cls.endpoint_name(url, api_type, http_method)
                     underscore = api_type + '_' + lowercase_method + '_' + underscore_suffix.lower()
 
                     if 'suffixes' in options:
@@ -409,6 +462,29 @@ class Exchange(object):
                     setattr(cls, camelcase, to_bind)
                     setattr(cls, underscore, to_bind)
 
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def endpoint_name(path, api, method):
+        """Name of the generated method requesting the endpoint, like publicGetTicker"""
+        split_path = re.split('[^a-zA-Z0-9]', path.strip())
+        camelcase_suffix = ''.join([Exchange.capitalize(x) for x in split_path])
+        return api + method.lower().capitalize() + Exchange.capitalize(camelcase_suffix)
+
+    @classmethod
+    def define_camelcase_aliases(cls):
+        for name in dir(cls):
+            camelcase = cls.camelcase_alias(name)
+            if camelcase is not None:
+                # the attribute as defined (function, staticmethod, value), so the alias behaves the same way
+                setattr(cls, camelcase, inspect.getattr_static(cls, name))
+
+    @staticmethod
+    def camelcase_alias(name):
+        if name[0] != '_' and name[-1] != '_' and '_' in name:
+            parts = name.split('_')
+            return parts[0] + ''.join(Exchange.capitalize(i) for i in parts[1:])
+        return None
+
     def raise_error(self, exception_type, url=None, method=None, error=None, details=None):
         if error:
             error = str(error)
@@ -424,12 +500,41 @@ class Exchange(object):
 
     def fetch2(self, path, api='public', method='GET', params={}, headers=None, body=None):
         """A better wrapper over request for deferred signing"""
-        if self.enableRateLimit:
+        if self.metrics is not None:
+            return self.measured_fetch2(path, api, method, params, headers, body)
+        throttle = request_throttle.get()
+        if throttle is not None:
+            throttle()
+        elif self.enableRateLimit:
             self.throttle()
         self.lastRestRequestTimestamp = self.milliseconds()
         request = self.sign(path, api, method, params, headers, body)
         return self.fetch(request['url'], request['method'], request['headers'], request['body'])
 
+    def measured_fetch2(self, path, api='public', method='GET', params={}, headers=None, body=None):
+        """fetch2 adding the phases of the request to the metrics of its endpoint"""
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        error = None
+        try:
+            throttle = request_throttle.get()
+            if throttle is not None:
+                throttle()
+            elif self.enableRateLimit:
+                self.throttle()
+            timings.start('sign')
+            self.lastRestRequestTimestamp = self.milliseconds()
+            request = self.sign(path, api, method, params, headers, body)
+            timings.start('wait')
+            return self.fetch(request['url'], request['method'], request['headers'], request['body'])
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            request_timings.reset(token)
+            timings.finish()
+            self.metrics.observe(self.endpoint_name(path, api, method), timings, error)
+
     def request(self, path, api='public', method='GET', params={}, headers=None, body=None):
         """Exchange.request is the entry point for all generated methods"""
         return self.fetch2(path, api, method, params, headers, body)
@@ -486,17 +591,32 @@ class Exchange(object):
         response = None
         http_response = None
         json_response = None
+        timings = request_timings.get()
         try:
-            response = self.session.request(
-                method,
-                url,
-                data=body,
-                headers=request_headers,
-                timeout=int(self.timeout / 1000),
-                proxies=self.proxies
-            )
+            started = time.perf_counter()
+            if self.http_replay is not None:
+                response = self.replay_http_response(method, url)
+            else:
+                response = self.session.request(
+                    method,
+                    url,
+                    data=body,
+                    headers=request_headers,
+                    timeout=int(self.timeout / 1000),
+                    proxies=self.proxies
+                )
+                if self.http_recorder is not None:
+                    self.http_recorder.record(method, url, response.status_code, response.reason, response.headers,
+                                              response.text, time.perf_counter() - started)
+            if timings is not None:
+                # requests reads the whole body before returning, elapsed is the time till the headers were parsed
+                timings.start('transfer', min(started + response.elapsed.total_seconds(), time.perf_counter()))
+                timings.start('decode')
+                timings.bytes = len(response.content)
             http_response = response.text
             json_response = self.parse_json(http_response) if self.is_json_encoded_object(http_response) else None
+            if timings is not None:
+                timings.start('handle')
             headers = response.headers
             # FIXME remove last_x_responses from subclasses
             if self.enableLastHttpResponse:
@@ -537,6 +657,16 @@ class Exchange(object):
             return json_response
         return http_response
 
+    def http_secrets(self):
+        """Credentials never to be written to a recording of the requests"""
+        return [self.apiKey, self.secret, self.uid, self.password, self.token, self.twofa, self.privateKey,
+                getattr(self, 'login', None)]
+
+    def replay_http_response(self, method, url):
+        entry = self.http_replay.next(method, url, self.http_secrets())
+        time.sleep(self.http_replay.delay(entry))
+        return requests_response(entry, url)
+
     def handle_rest_errors(self, exception, http_status_code, response, url, method='GET'):
         error = None
         string_code = str(http_status_code)
@@ -1094,11 +1224,79 @@ class Exchange(object):
                 if not self.markets_by_id:
                     return self.set_markets(self.markets)
                 return self.markets
+            cached = self.read_markets_cache()
+            if cached is not None:
+                markets = self.set_markets(cached['markets'], cached['currencies'])
+                self.markets_stale = True
+                if self.revalidateMarkets:
+                    self.revalidate_markets(params)
+                return markets
+        markets, currencies = self.fetch_markets_and_currencies(params)
+        return self.set_markets(markets, currencies)
+
+    def fetch_markets_and_currencies(self, params={}):
         currencies = None
         if self.has['fetchCurrencies']:
             currencies = self.fetch_currencies()
         markets = self.fetch_markets(params)
-        return self.set_markets(markets, currencies)
+        self.write_markets_cache(markets, currencies)
+        return markets, currencies
+
+    def revalidate_markets(self, params={}, throttle=None):
+        """Reload the markets taken from the disk cache in a background thread,
+        throttle() is called before each of its requests if passed, e.g. to share a rate limiter with the caller"""
+        def revalidate():
+            request_throttle.set(throttle)
+            try:
+                markets, currencies = self.fetch_markets_and_currencies(params)
+                self.set_markets(markets, currencies)
+                self.markets_stale = False
+            except Exception as e:
+                self.logger.warning('%s markets revalidation failed: %s', self.id, e)
+        self.markets_revalidation = threading.Thread(target=revalidate, name=self.id + '-markets-revalidation')
+        self.markets_revalidation.daemon = True
+        self.markets_revalidation.start()
+
+    def markets_cache_path(self):
+        return os.path.join(self.marketsCacheDir, self.id + '-markets.json')
+
+    def read_markets_cache(self):
+        """Returns a dict with 'markets' and 'currencies' as fetched before or None if there is no fresh cached copy"""
+        if not self.marketsCacheDir:
+            return None
+        try:
+            with open(self.markets_cache_path()) as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cache, dict):
+            return None
+        if cache.get('version') != MARKETS_CACHE_VERSION or cache.get('ccxt') != __version__ or cache.get('id') != self.id:
+            return None
+        if self.milliseconds() - self.safe_integer(cache, 'timestamp', 0) > self.marketsCacheTTL * 1000:
+            return None
+        return cache
+
+    def write_markets_cache(self, markets, currencies):
+        if not self.marketsCacheDir:
+            return
+        path = self.markets_cache_path()
+        temporary_path = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        try:
+            os.makedirs(self.marketsCacheDir, exist_ok=True)
+            with open(temporary_path, 'w') as file:
+                json.dump({
+                    'version': MARKETS_CACHE_VERSION,
+                    'ccxt': __version__,
+                    'id': self.id,
+                    'timestamp': self.milliseconds(),
+                    'markets': markets,
+                    'currencies': currencies,
+                }, file)
+            # readers see either the previous or the new file, never a partial one
+            os.replace(temporary_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning('%s failed to write the markets cache: %s', self.id, e)
 
     def load_accounts(self, reload=False, params={}):
         if reload:
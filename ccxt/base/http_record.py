@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+
+import re
+import gzip
+import json
+import time
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from ccxt.base.errors import ExchangeNotAvailable
+
+# -----------------------------------------------------------------------------
+
+__all__ = [
+    'HttpRecorder',
+    'HttpReplay',
+    'redact_headers',
+    'redact_url',
+    'requests_response',
+]
+
+# -----------------------------------------------------------------------------
+
+# query parameters never written to a recording: credentials, signatures and the values changing with every request,
+# without the latter a replayed request matches the recorded one
+UNRECORDED_PARAMS = frozenset([
+    'apikey', 'api_key', 'key', 'secret', 'password', 'token', 'access_token',
+    'signature', 'sign', 'hmac', 'timestamp', 'nonce',
+])
+
+# response headers carrying cookies, auth tokens or keys, their values are never written to a recording
+SECRET_HEADERS = re.compile(r'cookie|auth|token|session|api-?key|secret|signature', re.IGNORECASE)
+
+# auth tokens the exchanges send back in the response bodies
+SECRET_FIELDS = re.compile(r'("(?:access_token|accessToken|refresh_token|tempAuthToken|token)"\s*:\s*)"[^"]*"')
+
+REDACTED = '***'
+
+# shorter credentials are not cut out of the recordings, they would match ordinary text
+MIN_SECRET_LENGTH = 6
+
+# -----------------------------------------------------------------------------
+
+
+def open_recording(path, mode):
+    # a .gz recording is appended to as gzip members, which gzip reads back as one stream
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def redact_url(url, secrets=()):
+    """
+    :param secrets: credential values to cut out of the url wherever they are
+    :return: the url without the UNRECORDED_PARAMS query parameters and the secrets
+    """
+    parts = urlsplit(url)
+    if parts.query:
+        query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                 if key.lower() not in UNRECORDED_PARAMS]
+        url = urlunsplit(parts._replace(query=urlencode(query)))
+    for secret in secrets:
+        if secret and len(secret) >= MIN_SECRET_LENGTH:
+            url = url.replace(secret, REDACTED)
+    return url
+
+
+def redact_headers(headers, secrets=()):
+    """
+    :param secrets: credential values to cut out of the header values wherever they are
+    :return: dict of the headers with the SECRET_HEADERS values replaced and the secrets cut out of the others
+    """
+    redacted = {}
+    for name, value in headers.items():
+        if SECRET_HEADERS.search(name):
+            value = REDACTED
+        else:
+            for secret in secrets:
+                if secret and len(secret) >= MIN_SECRET_LENGTH:
+                    value = value.replace(secret, REDACTED)
+        redacted[name] = value
+    return redacted
+
+
+def requests_response(entry, url):
+    """
+    :return: requests.Response made of a recorded entry, as the session would have returned it
+    """
+    response = Response()
+    response.status_code = entry['status']
+    response.reason = entry['reason']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.encoding = 'utf-8'
+    response._content = entry['body'].encode('utf-8')
+    response.url = url
+    return response
+
+
+class HttpRecorder:
+    """
+    Appends every response of an exchange to a file of JSON lines: method, url without the secrets, status, reason,
+    response headers and body without the secrets, and the latency in seconds. The request headers and body
+    are not written, they carry the signatures
+    """
+
+    def __init__(self, path, secrets=()):
+        """
+        :param path: file to append to, compressed if the name ends with .gz
+        :param secrets: credential values to cut out of the recorded urls and bodies
+        """
+        self.path = path
+        self.secrets = [secret for secret in secrets if secret and len(secret) >= MIN_SECRET_LENGTH]
+        self.recorded = 0
+        self.file = open_recording(path, 'a')
+        self.lock = threading.Lock()
+
+    def record(self, method, url, status, reason, headers, body, latency):
+        for secret in self.secrets:
+            body = body.replace(secret, REDACTED)
+        line = json.dumps({
+            'time': round(time.time(), 3),
+            'method': method,
+            'url': redact_url(url, self.secrets),
+            'status': status,
+            'reason': reason,
+            'headers': redact_headers(headers, self.secrets),
+            'body': SECRET_FIELDS.sub(r'\1"' + REDACTED + '"', body),
+            'latency': round(latency, 6),
+        }, separators=(',', ':'))
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            self.recorded += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class HttpReplay:
+    """
+    Serves the responses of a recording instead of the network. A request gets the recorded responses
+    to the same method and url in the recorded order, and they start over once all of them are served
+    """
+
+    def __init__(self, path, timing='fast'):
+        """
+        :param path: recording made by HttpRecorder
+        :param timing: 'recorded' to take as long as the recorded request did, 'fast' not to wait at all
+        """
+        self.path = path
+        self.timing = timing
+        self.responses = {}  # (method, url) -> recorded entries
+        self.positions = {}  # (method, url) -> index of the next entry to serve
+        self.replayed = 0
+        self.lock = threading.Lock()
+        with open_recording(path, 'r') as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    entry['headers'] = CaseInsensitiveDict(entry['headers'])
+                    self.responses.setdefault((entry['method'], entry['url']), []).append(entry)
+
+    def next(self, method, url, secrets=()):
+        """
+        :return: the next recorded entry for the request
+        :raises ExchangeNotAvailable: if the request was never recorded
+        """
+        key = (method, redact_url(url, secrets))
+        entries = self.responses.get(key)
+        if entries is None:
+            raise ExchangeNotAvailable('no recorded response to ' + method + ' ' + key[1] + ' in ' + self.path)
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = (position + 1) % len(entries)
+            self.replayed += 1
+        return entries[position]
+
+    def delay(self, entry):
+        """
+        :return: number of seconds to wait before serving the entry
+        """
+        return entry['latency'] if self.timing == 'recorded' else 0
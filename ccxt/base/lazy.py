@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+
+import sys
+import types
+import importlib
+
+# -----------------------------------------------------------------------------
+
+__all__ = [
+    'install_lazy_exchanges',
+]
+
+# -----------------------------------------------------------------------------
+
+
+class LazyExchangesModule(types.ModuleType):
+    """
+    Package module exposing every exchange class under its id, the exchange module is imported on first access.
+    Importing ccxt.<id> binds the submodule to the package, the class is bound instead like the eager imports did
+    """
+
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and name in self.__dict__.get('exchanges', ()):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+def install_lazy_exchanges(module_name):
+    """
+    Makes the exchange classes of a package (ccxt or ccxt.async_support) load on demand (PEP 562)
+    :param module_name: name of the package, must define the exchanges list of ids
+    """
+    module = sys.modules[module_name]
+    exchanges = frozenset(module.exchanges)
+
+    def __getattr__(name):
+        if name not in exchanges:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(module_name, name))
+        # the import machinery binds the class through LazyExchangesModule.__setattr__
+        exchange_module = importlib.import_module(module_name + '.' + name)
+        return getattr(exchange_module, name)
+
+    def __dir__():
+        return sorted(set(module.__dict__) | exchanges)
+
+    module.__getattr__ = __getattr__
+    module.__dir__ = __dir__
+    module.__class__ = LazyExchangesModule
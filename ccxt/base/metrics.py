@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+
+import time
+import bisect
+import threading
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------------------------------------------------------
+
+__all__ = [
+    'ExchangeMetrics',
+    'RequestTimings',
+    'request_timings',
+    'prometheus_text',
+    'serve_metrics',
+]
+
+# -----------------------------------------------------------------------------
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+
+# what the time of a request goes to, in order:
+# throttle - waiting for the rate limiter, sign - sign(),
+# wait - connecting and waiting for the response headers, transfer - receiving the body,
+# decode - JSON decoding, handle - handle_errors() and handle_rest_response(), total - all of it
+PHASES = ('throttle', 'sign', 'wait', 'transfer', 'decode', 'handle', 'total')
+
+QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+# timings of the request being made by the current thread or task, None if the requests are not measured
+request_timings = contextvars.ContextVar('request_timings', default=None)
+
+# -----------------------------------------------------------------------------
+
+
+class RequestTimings:
+    """
+    Phases of one request: each phase lasts from its start() till the start() of the next one
+    """
+    __slots__ = ('started', 'phase', 'phase_started', 'phases', 'bytes')
+
+    def __init__(self):
+        self.started = self.phase_started = time.perf_counter()
+        self.phase = 'throttle'
+        self.phases = {}
+        self.bytes = 0
+
+    def start(self, phase, now=None):
+        """
+        :param now: perf_counter() time the phase started at, now by default
+        """
+        if now is None:
+            now = time.perf_counter()
+        self.phases[self.phase] = self.phases.get(self.phase, 0) + now - self.phase_started
+        self.phase = phase
+        self.phase_started = now
+
+    def finish(self):
+        self.start(None)
+        self.phases['total'] = self.phase_started - self.started
+
+
+class Histogram:
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        :return: estimate of the q-quantile interpolated within its bucket, the same way Prometheus does it
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            if cumulative + count >= rank and count > 0:
+                if index == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0
+                return lower + (LATENCY_BUCKETS[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return LATENCY_BUCKETS[-1]
+
+
+class EndpointMetrics:
+    __slots__ = ('count', 'errors', 'bytes', 'phases')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = {}  # error class name -> number of requests
+        self.bytes = 0
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+
+class ExchangeMetrics:
+    """
+    Request latency, errors and response sizes of one exchange, per endpoint (the generated method name)
+    """
+
+    def __init__(self, exchange_id):
+        self.exchange_id = exchange_id
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def observe(self, endpoint, timings, error=None):
+        """
+        :param timings: finished RequestTimings
+        :param error: exception the request failed with, if any
+        """
+        with self.lock:
+            metrics = self.endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.endpoints[endpoint] = EndpointMetrics()
+            metrics.count += 1
+            metrics.bytes += timings.bytes
+            if error is not None:
+                name = type(error).__name__
+                metrics.errors[name] = metrics.errors.get(name, 0) + 1
+            for phase, seconds in timings.phases.items():
+                metrics.phases[phase].observe(seconds)
+
+    def snapshot(self):
+        """
+        :return: dict of endpoint -> dict with the number of requests 'count', 'errors' by class name, 'bytes' received
+                 and 'phases' - dict of phase -> dict with 'count', 'sum', 'p50', 'p95', 'p99' in seconds
+        """
+        with self.lock:
+            return {
+                endpoint: {
+                    'count': metrics.count,
+                    'errors': dict(metrics.errors),
+                    'bytes': metrics.bytes,
+                    'phases': {
+                        phase: dict(
+                            [('count', histogram.count), ('sum', histogram.sum)] +
+                            [(name, histogram.quantile(q)) for name, q in QUANTILES]
+                        ) for phase, histogram in metrics.phases.items() if histogram.count > 0
+                    },
+                } for endpoint, metrics in self.endpoints.items()
+            }
+
+    def samples(self):
+        """
+        :return: list of (metric family, labels, value) to expose
+        """
+        samples = []
+        with self.lock:
+            for endpoint, metrics in sorted(self.endpoints.items()):
+                labels = (('exchange', self.exchange_id), ('endpoint', endpoint))
+                samples.append(('ccxt_requests_total', labels, metrics.count))
+                samples.append(('ccxt_response_bytes_total', labels, metrics.bytes))
+                for error, count in sorted(metrics.errors.items()):
+                    samples.append(('ccxt_request_errors_total', labels + (('error', error),), count))
+                for phase in PHASES:
+                    histogram = metrics.phases[phase]
+                    if histogram.count == 0:
+                        continue
+                    phase_labels = labels + (('phase', phase),)
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram.buckets):
+                        cumulative += count
+                        samples.append(('ccxt_request_phase_seconds_bucket', phase_labels + (('le', str(bound)),),
+                                        cumulative))
+                    samples.append(('ccxt_request_phase_seconds_sum', phase_labels, histogram.sum))
+                    samples.append(('ccxt_request_phase_seconds_count', phase_labels, histogram.count))
+        return samples
+
+
+FAMILIES = (
+    ('ccxt_requests_total', 'counter', 'Requests made to the exchange endpoint'),
+    ('ccxt_request_errors_total', 'counter', 'Requests to the exchange endpoint failed, by error class'),
+    ('ccxt_response_bytes_total', 'counter', 'Response body bytes received from the exchange endpoint'),
+    ('ccxt_request_phase_seconds', 'histogram', 'Time the requests to the exchange endpoint spent in each phase'),
+)
+
+
+def prometheus_text(*exchange_metrics):
+    """
+    :return: the metrics of the exchanges in the Prometheus text exposition format
+    """
+    samples = [sample for metrics in exchange_metrics for sample in metrics.samples()]
+    lines = []
+    for family, kind, help_text in FAMILIES:
+        lines.append('# HELP {} {}'.format(family, help_text))
+        lines.append('# TYPE {} {}'.format(family, kind))
+        for name, labels, value in samples:
+            if name == family or (kind == 'histogram' and name.rsplit('_', 1)[0] == family):
+                lines.append('{}{{{}}} {}'.format(
+                    name, ','.join('{}="{}"'.format(key, label) for key, label in labels), value
+                ))
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(port, *exchange_metrics, host='127.0.0.1'):
+    """
+    Serves the metrics of the exchanges at http://<host>:<port>/metrics from a background thread
+    :return: the server, shutdown() stops it
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text(*exchange_metrics).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server')
+    thread.daemon = True
+    thread.start()
+    return server
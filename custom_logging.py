@@ -1,5 +1,15 @@
-import logging
+import copy
+import json
+import time
+import queue
+import atexit
+import random
 import string
+import logging
+import functools
+import threading
+from decimal import Decimal
+from logging.handlers import QueueHandler, QueueListener
 
 
 class GracefulStringFormatter(string.Formatter):
@@ -39,24 +49,141 @@ class GracefulStringFormatter(string.Formatter):
 string_formatter = GracefulStringFormatter(missing='NONE', bad_fmt='BADFORMAT')
 
 
+class Template:
+    """
+    Format string parsed once and rendered any number of times the same failsafe way as string_formatter
+    """
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.parts = []  # (literal text, field name or None, conversion, format spec)
+        # nested replacement fields in the format spec are left to string_formatter
+        self.nested = False
+        auto_index = 0
+        for literal, field_name, spec, conversion in string_formatter.parse(fmt):
+            if field_name == '':
+                field_name = str(auto_index)
+                auto_index += 1
+            self.nested = self.nested or '{' in (spec or '')
+            self.parts.append((literal, field_name, conversion, spec))
+
+    def render(self, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        if self.nested:
+            return string_formatter.format(self.fmt, *args, **kwargs)
+        result = []
+        for literal, field_name, conversion, spec in self.parts:
+            result.append(literal)
+            if field_name is None:
+                continue
+            try:
+                value = string_formatter.get_field(field_name, args, kwargs)[0]
+            except IndexError:
+                value = None
+            if conversion is not None and value is not None:
+                value = string_formatter.convert_field(value, conversion)
+            result.append(string_formatter.format_field(value, spec))
+        return ''.join(result)
+
+
+@functools.lru_cache(maxsize=4096)
+def template(fmt) -> Template:
+    """
+    :return: Template of the format string, parsed on the first use only
+    """
+    return Template(fmt)
+
+
 class GracefulFormatter(logging.Formatter):
     """
     Formatter that uses the above failsafe string formatting
     """
     def __init__(self, fmt=None, datefmt=None, style='{'):
         super().__init__(fmt, datefmt, style)
+        self.template = Template(self._fmt)
 
     def formatMessage(self, record):
-        return string_formatter.format(self._fmt, **record.__dict__)
+        return self.template.render(kwargs=record.__dict__)
+
+
+def json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): json_value(item) for key, item in value.items()}
+    return str(value)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object: the message as logged and also its template and arguments as they were,
+    so the lines can be filtered and aggregated by the values without parsing the text
+    """
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if isinstance(record.msg, Message):
+            entry['template'] = record.msg.fmt
+            entry['args'] = [json_value(arg) for arg in record.msg.args]
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry)
 
 
 class Message(object):
+    __slots__ = ('fmt', 'args')
+
     def __init__(self, fmt, args):
         self.fmt = fmt
         self.args = args
 
     def __str__(self):
-        return string_formatter.format(self.fmt, *self.args)
+        return template(self.fmt).render(self.args)
+
+
+# argument types which can not change after they are logged, the others are copied before they are queued
+IMMUTABLE_ARGS = (type(None), bool, int, float, str, bytes, Decimal)
+
+
+def snapshot_args(args) -> tuple:
+    """
+    :return: the arguments as they are now: containers (an order dict, a list of orders) are deep-copied,
+             so changing them after the call does not change the line written later
+    """
+    if all(isinstance(arg, IMMUTABLE_ARGS) for arg in args):
+        return args
+    snapshot = []
+    for arg in args:
+        if isinstance(arg, (list, tuple, dict, set)):
+            try:
+                arg = copy.deepcopy(arg)
+            except Exception:
+                arg = str(arg)
+        snapshot.append(arg)
+    return tuple(snapshot)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Puts the records to the queue unrendered: the message is rendered and written by the listener thread,
+    the logging thread only pays for creating the record and copying the container arguments, see snapshot_args()
+    """
+    def prepare(self, record):
+        if isinstance(record.msg, Message):
+            record.msg = Message(record.msg.fmt, snapshot_args(record.msg.args))
+        elif isinstance(record.args, tuple):
+            record.args = snapshot_args(record.args)
+        return record
 
 
 class StyleAdapter(logging.LoggerAdapter):
@@ -72,12 +199,79 @@ class StyleAdapter(logging.LoggerAdapter):
             self.logger._log(level, Message(msg, args), (), **kwargs)
 
 
+class RepeatedMessageFilter(logging.Filter):
+    """
+    Lets a warning or error through once per <interval> seconds per logger, level and message template,
+    whatever the arguments, the next one let through tells how many were dropped meanwhile.
+    The messages are not rendered to tell them apart, so the deferred rendering stays with the listener thread
+    """
+    def __init__(self, interval):
+        super().__init__()
+        self.interval = interval
+        self.seen = {}  # (logger, level, template) -> [monotonic time let through, number dropped since]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg.fmt if isinstance(record.msg, Message) else str(record.msg))
+        now = time.monotonic()
+        with self.lock:
+            seen = self.seen.get(key)
+            if seen is not None and now - seen[0] < self.interval:
+                seen[1] += 1
+                return False
+            if len(self.seen) > 1000:
+                self.seen = {key: value for key, value in self.seen.items() if now - value[0] < self.interval}
+            self.seen[key] = [now, 0]
+        if seen is not None and seen[1] > 0:
+            suffix = ' ({} more like this in the last {:.0f}s)'
+            if isinstance(record.msg, Message):
+                record.msg = Message(record.msg.fmt + suffix, tuple(record.msg.args) + (seen[1], now - seen[0]))
+            else:
+                record.msg = str(record.getMessage()) + suffix.format(seen[1], now - seen[0])
+                record.args = None
+        return True
+
+
+class DetailLog:
+    """
+    Detail lines of a frequent job like an orderbook cycle: logged as they are, or in the summary mode
+    the step lines at DEBUG and only a random sample of the item (e.g. order) lines, at DEBUG too.
+    The job logs one summary line of its own in that mode
+    """
+    def __init__(self, logger, summary=False, sample=0.0):
+        """
+        :param logger: logger made by get_logger()
+        :param summary: whether the summary mode is on
+        :param sample: share of the item lines still logged in the summary mode, from 0 to 1
+        """
+        self.logger = logger
+        self.summary = summary
+        self.sample = sample
+
+    def step(self, msg, *args):
+        self.logger.log(logging.DEBUG if self.summary else logging.INFO, msg, *args)
+
+    def item(self, msg, *args, level=logging.INFO):
+        if not self.summary:
+            self.logger.log(level, msg, *args)
+        elif self.sample > 0 and random.random() < self.sample:
+            self.logger.debug(msg, *args)
+
+
 format_main_info = '{asctime}\t{levelname}\t({threadName})\t[{filename}]\t{message}'
 log_formatter_info = GracefulFormatter(format_main_info)
 handler_console = logging.StreamHandler()
 handler_console.setLevel(logging.INFO)
 handler_console.setFormatter(log_formatter_info)
 
+# handler attached to all our loggers, see configure_logging()
+handler_main = handler_console
+# loggers made by get_logger()
+loggers = []
+log_listener = None
+
 
 def get_logger(name):
     """
@@ -89,8 +283,60 @@ def get_logger(name):
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
 
-    # writing a general log to console
-    logger.addHandler(handler_console)
+    # writing a general log to console, the handler is attached once however many times the logger is got
+    if handler_main not in logger.handlers:
+        logger.addHandler(handler_main)
+        loggers.append(logger)
 
     logger = StyleAdapter(logger)
     return logger
+
+
+def configure_logging(use_queue=False, json_lines=False, level=logging.INFO, repeat_interval=0):
+    """
+    Switches all our loggers, made so far and later, to the chosen output
+    :param use_queue: the records are only put to a queue by the logging thread,
+                      a background listener formats and writes them, so logging never blocks on the console
+    :param json_lines: write JSON lines instead of the text, see JsonLinesFormatter
+    :param level: min level written, a number or a name like 'DEBUG'
+    :param repeat_interval: warnings and errors of the same template are written once per that many seconds,
+                            0 writes them all
+    """
+    global handler_main, log_listener
+    output = handler_console
+    if json_lines:
+        output = logging.StreamHandler()
+        output.setFormatter(JsonLinesFormatter())
+    output.setLevel(level)
+    handler = output
+    listener = None
+    if use_queue:
+        records = queue.SimpleQueue()
+        handler = DeferredQueueHandler(records)
+        # the records below the output level are dropped before they are queued
+        handler.setLevel(output.level)
+        listener = QueueListener(records, output, respect_handler_level=True)
+        listener.start()
+    if repeat_interval > 0:
+        # on the queue handler the repeated records are dropped before they are queued
+        handler.addFilter(RepeatedMessageFilter(repeat_interval))
+    for logger in loggers:
+        logger.removeHandler(handler_main)
+        logger.addHandler(handler)
+    handler_main = handler
+    # the previous listener writes out what was queued before the switch
+    stop_logging()
+    log_listener = listener
+
+
+def stop_logging():
+    """
+    Writes out the records still queued, if any
+    """
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,205 @@
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from custom_logging import get_logger
+logger = get_logger(__name__)
+
+# trace of the maintenance cycle being run by the current thread or task, None outside of a cycle
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class Span:
+    """
+    Phase of a cycle: its duration and the REST calls made during it, summed if the phase is entered several times
+    """
+    __slots__ = ('name', 'duration', 'calls')
+
+    def __init__(self, name):
+        self.name = name
+        self.duration = 0.0
+        self.calls = 0
+
+
+class CycleTrace:
+    """
+    What one orderbook maintenance cycle of a pair did: spans in the order they were first entered,
+    REST calls made and the counts of the orders created, cancelled, kept etc.
+    """
+    def __init__(self, currency_pair):
+        self.currency_pair = currency_pair
+        self.started = time.time()
+        self.duration = None
+        self.spans = {}
+        self.counts = {}
+        self.calls = 0
+        self.error = None
+        self._span = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()  # calls are counted from the threads of the batch requests too
+
+    @contextmanager
+    def span(self, name):
+        span = self.spans.get(name)
+        if span is None:
+            span = self.spans[name] = Span(name)
+        outer = self._span
+        self._span = span
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.duration += time.perf_counter() - started
+            self._span = outer
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+            if self._span is not None:
+                self._span.calls += 1
+
+    def count(self, **counts):
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def fail(self, error):
+        """
+        Marks the cycle as failed with the error, whether it was raised out of it or handled inside
+        """
+        self.error = type(error).__name__
+
+    def elapsed(self) -> float:
+        """
+        :return: seconds since the cycle started, its duration once it is finished
+        """
+        if self.duration is not None:
+            return self.duration
+        return time.perf_counter() - self._started
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.fail(error)
+
+    def to_dict(self) -> dict:
+        return {
+            'pair': self.currency_pair,
+            'started': round(self.started, 3),
+            'duration': round(self.duration, 6) if self.duration is not None else None,
+            'calls': self.calls,
+            'spans': [
+                {'name': span.name, 'duration': round(span.duration, 6), 'calls': span.calls}
+                for span in self.spans.values()
+            ],
+            'counts': dict(self.counts),
+            'error': self.error
+        }
+
+
+@contextmanager
+def span(name):
+    """
+    Measures a phase of the current cycle, does nothing outside of a traced cycle
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name) as current:
+        yield current
+
+
+def count_call():
+    """
+    Counts a REST call in the current cycle and span
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        trace.count_call()
+
+
+def count(**counts):
+    """
+    Adds to the counts of the current cycle, e.g. count(created=3)
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        trace.count(**counts)
+
+
+class CycleTracer:
+    """
+    Traces the maintenance cycles: each finished cycle is written out as a JSON line
+    and the last <history> ones are kept in memory
+    """
+    def __init__(self, history=100, path=None, log_level=logging.DEBUG):
+        """
+        :param history: number of the last cycles to keep
+        :param path: file to append the JSON lines to, they are logged if None
+        :param log_level: level the JSON lines are logged at, they are too long for the default INFO log
+        """
+        self.traces = deque(maxlen=history)
+        self.path = path
+        self.log_level = log_level
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def cycle(self, currency_pair):
+        """
+        Traces the cycle run inside: spans and calls made by the same thread or task, including the tasks
+        and the batch request threads it starts, are added to it
+        """
+        trace = CycleTrace(currency_pair)
+        token = current_trace.set(trace)
+        error = None
+        try:
+            yield trace
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            current_trace.reset(token)
+            trace.finish(error)
+            self.emit(trace)
+
+    def emit(self, trace: CycleTrace):
+        line = json.dumps(trace.to_dict(), separators=(',', ':'))
+        with self._lock:
+            self.traces.append(trace)
+            if self.path is not None:
+                with open(self.path, 'a') as file:
+                    file.write(line + '\n')
+        if self.path is None:
+            logger.log(self.log_level, 'Cycle trace: {}', line)
+
+    def recent(self, currency_pair=None) -> list:
+        """
+        :return: the kept cycles as dicts, oldest first
+        """
+        with self._lock:
+            traces = list(self.traces)
+        return [trace.to_dict() for trace in traces if currency_pair is None or trace.currency_pair == currency_pair]
+
+    def summary(self, currency_pair=None) -> dict:
+        """
+        :return: dict of span name -> dict with the 'mean' and 'max' duration in seconds, mean 'calls'
+                 and the 'share' of the cycle time spent in the span, over the kept cycles
+        """
+        traces = self.recent(currency_pair)
+        total = sum(trace['duration'] for trace in traces)
+        spans = {}
+        for trace in traces:
+            for item in trace['spans']:
+                spans.setdefault(item['name'], []).append(item)
+        return {
+            name: {
+                'mean': sum(item['duration'] for item in items) / len(traces),
+                'max': max(item['duration'] for item in items),
+                'calls': sum(item['calls'] for item in items) / len(traces),
+                'share': sum(item['duration'] for item in items) / total if total > 0 else 0.0
+            }
+            for name, items in spans.items()
+        }
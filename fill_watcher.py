@@ -0,0 +1,36 @@
+from ticks import TickScale
+from reconciler import order_remaining
+
+
+class FillWatcher:
+    """
+    Tells whether our orders on a pair were hit since the last maintenance pass
+    by comparing our open orders with the ones the pass left on the book:
+    an order which is gone or has less amount remaining was filled, as the bot cancels orders only within a pass.
+    The open orders come from the api ledger, so fills by others are seen once it is synced with the exchange.
+    """
+    def __init__(self, currency_pair, amount_scale: TickScale):
+        self.currency_pair = currency_pair
+        self.amount_scale = amount_scale
+        # order id -> remaining amount in ticks, as left by the last pass
+        self.expected = {}
+
+    def expect(self, orders: dict):
+        """
+        :param orders: dict order id -> remaining amount in ticks of all our orders on the pair after a pass
+        """
+        self.expected = orders
+
+    def hit_orders(self, open_orders) -> list:
+        """
+        :param open_orders: our open orders on all pairs, as the api ledger knows them or as returned by ccxt
+        :return: ids of the orders filled, fully or partially, since the last pass
+        """
+        remaining = {
+            order['id']: self.amount_scale.to_ticks(order_remaining(order))
+            for order in open_orders if order['symbol'] == self.currency_pair
+        }
+        return [
+            order_id for order_id, amount in self.expected.items()
+            if order_id not in remaining or remaining[order_id] < amount
+        ]
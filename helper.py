@@ -1,54 +1,163 @@
-import threading
-import time
-import random
+import asyncio
+from scheduler import Scheduler, AsyncScheduler
+
+# all the jobs of the process run in one worker thread, or in one task per event loop,
+# except for the ones blocking on the network for long, which run apart
+_scheduler = None
+_async_schedulers = {}
+
+
+def default_scheduler() -> Scheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler()
+    return _scheduler
+
+
+def default_async_scheduler() -> AsyncScheduler:
+    """
+    :return: the scheduler of the running event loop
+    """
+    loop = asyncio.get_event_loop()
+    if loop not in _async_schedulers:
+        _async_schedulers[loop] = AsyncScheduler()
+    return _async_schedulers[loop]
 
 
 def run_repeatedly(func, interval, thread_name=None, *args, **kwargs):
     """
-    In a new thread executes func() every <interval> seconds
+    Executes func() every <interval> seconds on the default scheduler
     if func() execution takes more than <interval> seconds it will repeat right after the previous execution completes
     :param func: function to execute repeatedly
     :param interval: number of seconds between executions
-    :param thread_name: name of the thread to be created (useful for logging)
+    :param thread_name: name of the job, the worker thread is named after it while it runs (useful for logging)
     :param args: arbitrary arguments passed to func()
     :param kwargs: arbitrary keyword arguments passed to func()
     :return: threading.Event, when you .set() it, execution stops
     """
-    def _run(stop_event):
-        while not stop_event.is_set():
-            last_time = time.time()
-            func(*args, **kwargs)
-            time_passed = time.time() - last_time
-            if time_passed < interval:
-                time.sleep(interval - time_passed)
-    stop = threading.Event()
-    thread = threading.Thread(target=_run, args=(stop,), name=thread_name)
-    thread.setDaemon(True)
-    thread.start()
-    return stop
+    return default_scheduler().every(func, interval, thread_name, *args, **kwargs)
 
 
 def run_at_random_intervals(func, min_interval, max_interval, thread_name=None, *args, **kwargs):
     """
-    In a new thread executes func() every random interval anywhere from <min_interval> to <max_interval> seconds.
+    Executes func() on the default scheduler every random interval anywhere from <min_interval> to <max_interval> seconds.
     :param func: function to execute at random intervals
     :param min_interval: min number of seconds between executions
     :param max_interval: max number of seconds between executions
-    :param thread_name: name of the thread to be created (useful for logging)
+    :param thread_name: name of the job, the worker thread is named after it while it runs (useful for logging)
     :param args: arbitrary arguments passed to func()
     :param kwargs: arbitrary keyword arguments passed to func()
     :return: threading.Event, when you .set() it, execution stops
     """
-    def _run(stop_event):
-        while not stop_event.is_set():
-            interval = random.randint(min_interval, max_interval)
-            last_time = time.time()
-            func(*args, **kwargs)
-            time_passed = time.time() - last_time
-            if time_passed < interval:
-                time.sleep(interval - time_passed)
-    stop = threading.Event()
-    thread = threading.Thread(target=_run, args=(stop,), name=thread_name)
-    thread.setDaemon(True)
-    thread.start()
-    return stop
+    return default_scheduler().at_random_intervals(func, min_interval, max_interval, thread_name, *args, **kwargs)
+
+
+def run_repeatedly_apart(func, interval, thread_name=None, *args, **kwargs):
+    """
+    Same as run_repeatedly(), but in a worker thread of its own, for a job which may block on the network for long
+    (another exchange, signing in) and must not hold up the jobs of the default scheduler
+    :return: threading.Event, when you .set() it, execution stops and the thread exits
+    """
+    scheduler = Scheduler(thread_name or 'Scheduler', stop_when_empty=True)
+    return scheduler.every(func, interval, thread_name, *args, **kwargs)
+
+
+def run_repeatedly_async(coro_func, interval, task_name=None, *args, **kwargs):
+    """
+    Same as run_repeatedly(), but runs coroutine function coro_func() on the scheduler of the current event loop
+    :return: threading.Event, when you .set() it, execution stops
+    """
+    return default_async_scheduler().every(coro_func, interval, task_name, *args, **kwargs)
+
+
+def run_at_random_intervals_async(coro_func, min_interval, max_interval, task_name=None, *args, **kwargs):
+    """
+    Same as run_at_random_intervals(), but runs coroutine function coro_func() on the scheduler of the current event loop
+    :return: threading.Event, when you .set() it, execution stops
+    """
+    return default_async_scheduler().at_random_intervals(
+        coro_func, min_interval, max_interval, task_name, *args, **kwargs
+    )
+
+
+def run_at_intervals(func, next_interval, thread_name=None, *args, **kwargs):
+    """
+    Executes func() on the default scheduler right away, then every time the number of seconds
+    returned by next_interval() passes after the previous execution completes
+    :param func: function to execute
+    :param next_interval: function returning the number of seconds till the next execution
+    :param thread_name: name of the job, the worker thread is named after it while it runs (useful for logging)
+    :return: threading.Event, when you .set() it, execution stops
+    """
+    return default_scheduler().at_intervals(func, next_interval, thread_name, *args, **kwargs)
+
+
+def run_at_intervals_apart(func, next_interval, thread_name=None, *args, **kwargs):
+    """
+    Same as run_at_intervals(), but in a worker thread of its own, see run_repeatedly_apart()
+    :return: threading.Event, when you .set() it, execution stops and the thread exits
+    """
+    scheduler = Scheduler(thread_name or 'Scheduler', stop_when_empty=True)
+    return scheduler.at_intervals(func, next_interval, thread_name, *args, **kwargs)
+
+
+def run_repeatedly_apart_async(coro_func, interval, task_name=None, *args, **kwargs):
+    """
+    Same as run_repeatedly_async(), but in a task of its own, so that a job awaiting the network for long
+    does not hold up the other jobs of the event loop
+    :return: threading.Event, when you .set() it, execution stops and the task completes
+    """
+    scheduler = AsyncScheduler(task_name or 'Scheduler', stop_when_empty=True)
+    return scheduler.every(coro_func, interval, task_name, *args, **kwargs)
+
+
+def run_at_intervals_apart_async(coro_func, next_interval, task_name=None, *args, **kwargs):
+    """
+    Same as run_at_intervals_async(), but in a task of its own, see run_repeatedly_apart_async()
+    :return: threading.Event, when you .set() it, execution stops and the task completes
+    """
+    scheduler = AsyncScheduler(task_name or 'Scheduler', stop_when_empty=True)
+    return scheduler.at_intervals(coro_func, next_interval, task_name, *args, **kwargs)
+
+
+def run_at_intervals_async(coro_func, next_interval, task_name=None, *args, **kwargs):
+    """
+    Same as run_at_intervals(), but runs coroutine function coro_func() on the scheduler of the current event loop
+    :return: threading.Event, when you .set() it, execution stops
+    """
+    return default_async_scheduler().at_intervals(coro_func, next_interval, task_name, *args, **kwargs)
+
+
+def run_on_trigger(func, check, check_interval, min_interval, idle_interval, max_idle_interval, thread_name=None):
+    """
+    Executes func() on the default scheduler as soon as check() reports a trigger,
+    or every <idle_interval> seconds without one.
+    check() returns None or a trigger value which is passed to func(), func(None) means it was not triggered
+    or the trigger went stale while waiting for <min_interval>.
+    While nothing happens the job backs off: the check interval doubles after every check without a trigger,
+    up to <idle_interval>, and the idle interval doubles after every func() call returning False (nothing to do),
+    up to <max_idle_interval>. Both are reset by a trigger.
+    :param func: function to execute, func(trigger) -> bool, whether it had anything to do
+    :param check: function checking for triggers, check() -> trigger or None
+    :param check_interval: number of seconds between checks
+    :param min_interval: min number of seconds between func() executions, triggers coming earlier wait for it
+    :param idle_interval: number of seconds between func() executions without triggers
+    :param max_idle_interval: the longest the idle interval may back off to
+    :param thread_name: name of the job, the worker thread is named after it while it runs (useful for logging)
+    :return: threading.Event, when you .set() it, execution stops
+    """
+    return default_scheduler().on_trigger(
+        func, check, check_interval, min_interval, idle_interval, max_idle_interval, thread_name
+    )
+
+
+def run_on_trigger_async(coro_func, check, check_interval, min_interval, idle_interval, max_idle_interval,
+                         task_name=None):
+    """
+    Same as run_on_trigger(), but runs coroutine functions coro_func() and check() on the scheduler
+    of the current event loop
+    :return: threading.Event, when you .set() it, execution stops
+    """
+    return default_async_scheduler().on_trigger(
+        coro_func, check, check_interval, min_interval, idle_interval, max_idle_interval, task_name
+    )
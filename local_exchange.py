@@ -0,0 +1,496 @@
+import time
+import random
+import asyncio
+import bisect
+import threading
+import collections
+from decimal import Decimal
+import ccxt
+from ccxt.base.errors import ArgumentsRequired, AuthenticationError, DDoSProtection, ExchangeError
+from ccxt.base.errors import ExchangeNotAvailable, InvalidOrder, OrderNotFound, RequestTimeout
+
+# errors a request fails with when one is injected
+INJECTED_ERRORS = (RequestTimeout, ExchangeNotAvailable, DDoSProtection)
+# requests made by a mandala sign-in: authentication and the token itself
+SIGN_IN_REQUESTS = 2
+
+
+class LocalOrder:
+    __slots__ = ('id', 'symbol', 'side', 'price', 'amount', 'remaining', 'timestamp')
+
+    def __init__(self, order_id, symbol, side, price, amount, timestamp):
+        self.id = order_id
+        self.symbol = symbol
+        self.side = side            # 'buy' or 'sell'
+        self.price = price          # Decimal, None for market orders
+        self.amount = amount        # Decimal
+        self.remaining = amount
+        self.timestamp = timestamp  # milliseconds
+
+
+class BookSide:
+    """
+    Resting orders on one side of a book: price levels sorted by price, orders within a level in time priority
+    """
+    def __init__(self, side):
+        self.side = side
+        self.prices = []    # ascending
+        self.levels = {}    # price -> deque of LocalOrder
+
+    def best(self):
+        if len(self.prices) == 0:
+            return None
+        return self.prices[-1] if self.side == 'buy' else self.prices[0]
+
+    def add(self, order: LocalOrder):
+        if order.price not in self.levels:
+            bisect.insort(self.prices, order.price)
+            self.levels[order.price] = collections.deque()
+        self.levels[order.price].append(order)
+
+    def remove(self, order: LocalOrder):
+        level = self.levels[order.price]
+        level.remove(order)
+        if len(level) == 0:
+            self.remove_level(order.price)
+
+    def remove_level(self, price):
+        del self.levels[price]
+        del self.prices[bisect.bisect_left(self.prices, price)]
+
+    def crosses(self, price) -> bool:
+        """
+        :param price: limit price of an incoming order from the other side, None for a market order
+        :return: whether the best order of this side trades with it
+        """
+        best = self.best()
+        if best is None:
+            return False
+        if price is None:
+            return True
+        return best >= price if self.side == 'buy' else best <= price
+
+    def levels_best_first(self):
+        return reversed(self.prices) if self.side == 'buy' else iter(self.prices)
+
+    def available(self, price) -> Decimal:
+        """
+        :return: total amount an incoming order from the other side with this limit price may take
+        """
+        total = Decimal(0)
+        for level_price in self.levels_best_first():
+            if price is not None and (level_price < price if self.side == 'buy' else level_price > price):
+                break
+            total += sum(order.remaining for order in self.levels[level_price])
+        return total
+
+    def depth(self, limit=None) -> list:
+        """
+        :return: [[price, amount], ...] best price first
+        """
+        depth = []
+        for price in self.levels_best_first():
+            if limit is not None and len(depth) >= limit:
+                break
+            depth.append([price, sum(order.remaining for order in self.levels[price])])
+        return depth
+
+
+class MatchingEngine:
+    """
+    Order book of one pair matching the orders in price-time priority,
+    a trade is made at the price of the resting order
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.sides = {'buy': BookSide('buy'), 'sell': BookSide('sell')}
+        self.last_price = None
+        self.base_volume = Decimal(0)
+        self.quote_volume = Decimal(0)
+        self.trades = collections.deque(maxlen=1000)
+
+    def place(self, order: LocalOrder, time_in_force='GTC') -> list:
+        """
+        Matches the order against the book, the rest of a GTC limit order stays on the book
+        :param time_in_force: GTC, IOC (the rest is cancelled) or FOK (nothing is traded unless all of it can be)
+        :return: list of the resting orders filled, fully or partially
+        """
+        opposite = self.sides['sell' if order.side == 'buy' else 'buy']
+        if time_in_force == 'FOK' and opposite.available(order.price) < order.amount:
+            order.remaining = Decimal(0)
+            return []
+        makers = []
+        while order.remaining > 0 and opposite.crosses(order.price):
+            price = opposite.best()
+            level = opposite.levels[price]
+            maker = level[0]
+            amount = min(order.remaining, maker.remaining)
+            maker.remaining -= amount
+            order.remaining -= amount
+            makers.append(maker)
+            self.trade(price, amount, order.side)
+            if maker.remaining == 0:
+                level.popleft()
+                if len(level) == 0:
+                    opposite.remove_level(price)
+        if order.remaining > 0 and order.price is not None and time_in_force == 'GTC':
+            self.sides[order.side].add(order)
+        else:
+            order.remaining = Decimal(0)
+        return makers
+
+    def cancel(self, order: LocalOrder):
+        self.sides[order.side].remove(order)
+
+    def trade(self, price, amount, taker_side):
+        self.last_price = price
+        self.base_volume += amount
+        self.quote_volume += amount * price
+        self.trades.append((time.time(), price, amount, taker_side))
+
+    def best_bid(self):
+        return self.sides['buy'].best()
+
+    def best_ask(self):
+        return self.sides['sell'].best()
+
+
+def to_float(value):
+    return float(value) if value is not None else None
+
+
+class LocalExchange(ccxt.Exchange):
+    """
+    In-process stand-in for ccxt.mandala with the part of its interface APIClient uses,
+    so that the bot runs without network and credentials.
+    Orders of all the pairs are matched by a MatchingEngine, the responses are shaped as mandala returns them.
+    Every request waits for <latency> seconds (from half to one and a half of it, at random)
+    and fails with a network error at the <errorRate> probability, either before or after it took effect.
+    Requests made more often than the rate limit are counted and fail with DDoSProtection if <strictRateLimit>.
+    The auth token expires <tokenLifetime> seconds after sign-in, private requests fail without a valid one.
+    """
+    def describe(self):
+        return self.deep_extend(super(LocalExchange, self).describe(), {
+            'id': 'local',
+            'name': 'Local mandala stand-in',
+            'rateLimit': 1500,
+            'has': {
+                'fetchCurrencies': False,
+                'fetchOpenOrders': True,
+                'fetchTicker': True,
+                'fetchOrderBook': True,
+                'createOrder': True,
+                'cancelOrder': True,
+            },
+            'latency': 0.0,
+            'errorRate': 0.0,
+            'strictRateLimit': False,
+            'tokenLifetime': 86400,
+            'seed': None,
+        })
+
+    def __init__(self, config={}):
+        super(LocalExchange, self).__init__(config)
+        self.random = random.Random(self.seed)
+        self.engines = {}
+        self.open_orders = {}   # order id -> LocalOrder resting on a book
+        self.order_ids = iter(range(20000000, 2 ** 63))
+        self.engine_lock = threading.Lock()
+        self.last_request = None
+        self.request_counts = collections.Counter()
+        self.rate_limit_violations = 0
+        self.injected_errors = 0
+
+    # requests
+
+    def call(self, name, func, *args):
+        """
+        Makes a request: waits for the latency, processes it and may fail with an injected error
+        """
+        latency, error, lost = self.begin_request(name)
+        time.sleep(latency / 2)
+        if error is not None and not lost:
+            raise error
+        with self.engine_lock:
+            result = func(*args)
+        time.sleep(latency / 2)
+        if error is not None:
+            raise error
+        return result
+
+    def begin_request(self, name):
+        """
+        :return: (latency in seconds, error to inject or None,
+                  whether the error comes after the request took effect, i.e. its response was lost)
+        """
+        now = time.monotonic()
+        with self.engine_lock:
+            self.request_counts[name] += 1
+            too_soon = self.last_request is not None and now - self.last_request < self.rateLimit / 1000 * 0.9
+            self.last_request = now
+            if too_soon:
+                self.rate_limit_violations += 1
+            latency = self.latency * self.random.uniform(0.5, 1.5)
+            error = None
+            if too_soon and self.strictRateLimit:
+                error = DDoSProtection(self.id + ' ' + name + ' rate limit exceeded')
+            elif self.random.random() < self.errorRate:
+                self.injected_errors += 1
+                error = self.random.choice(INJECTED_ERRORS)(self.id + ' ' + name + ' injected error')
+            lost = error is not None and not isinstance(error, DDoSProtection) and self.random.random() < 0.5
+            return latency, error, lost
+
+    def check_token(self):
+        expires = self.options.get('expires')
+        if expires is None or expires <= self.milliseconds():
+            raise AuthenticationError(self.id + ' auth token is missing or expired, sign in')
+
+    def engine(self, symbol) -> MatchingEngine:
+        if not isinstance(symbol, str) or '/' not in symbol:
+            raise ExchangeError(self.id + ' no market symbol ' + str(symbol))
+        if symbol not in self.engines:
+            self.engines[symbol] = MatchingEngine(symbol)
+        return self.engines[symbol]
+
+    # public
+
+    def sign_in(self, params={}):
+        for i in range(SIGN_IN_REQUESTS - 1):
+            self.call('signIn', lambda: None)
+        return self.call('signIn', self.issue_token)
+
+    def issue_token(self):
+        self.options['expires'] = self.sum(self.milliseconds(), self.tokenLifetime * 1000)
+        self.options['accessToken'] = self.uuid()
+        self.options['tokenType'] = 'bearer'
+        return {'access_token': self.options['accessToken'], 'token_type': 'bearer', 'expires_in': self.tokenLifetime}
+
+    def fetch_markets(self, params={}):
+        # any BASE/QUOTE pair is traded, its book is created by the first request
+        return [self.local_market(symbol) for symbol in sorted(self.engines)]
+
+    def local_market(self, symbol):
+        base, quote = symbol.split('/')
+        return {
+            'id': base + '-' + quote,
+            'symbol': symbol,
+            'base': base,
+            'quote': quote,
+            'baseId': base,
+            'quoteId': quote,
+            'active': True,
+            'precision': {'amount': 8, 'price': 8},
+            'limits': {'amount': {'min': None, 'max': None}, 'price': {'min': None, 'max': None}},
+            'info': {},
+        }
+
+    def fetch_order_book(self, symbol, limit=None, params={}):
+        return self.call('fetchOrderBook', self.order_book, symbol, limit)
+
+    def order_book(self, symbol, limit):
+        engine = self.engine(symbol)
+        timestamp = self.milliseconds()
+        return {
+            'bids': [[float(price), float(amount)] for price, amount in engine.sides['buy'].depth(limit)],
+            'asks': [[float(price), float(amount)] for price, amount in engine.sides['sell'].depth(limit)],
+            'timestamp': timestamp,
+            'datetime': self.iso8601(timestamp),
+            'nonce': None,
+        }
+
+    def fetch_ticker(self, symbol, params={}):
+        return self.call('fetchTicker', self.ticker, symbol)
+
+    def ticker(self, symbol):
+        engine = self.engine(symbol)
+        timestamp = self.milliseconds()
+        return {
+            'symbol': symbol,
+            'timestamp': timestamp,
+            'datetime': self.iso8601(timestamp),
+            'high': None,
+            'low': None,
+            'bid': to_float(engine.best_bid()),
+            'bidVolume': None,
+            'ask': to_float(engine.best_ask()),
+            'askVolume': None,
+            'vwap': None,
+            'open': None,
+            'close': to_float(engine.last_price),
+            'last': to_float(engine.last_price),
+            'previousClose': None,
+            'change': None,
+            'percentage': None,
+            'average': None,
+            'baseVolume': float(engine.base_volume),
+            'quoteVolume': float(engine.quote_volume),
+            'info': {},
+        }
+
+    # private
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = params or {}
+        return self.call('createOrder', self.place_order, symbol, type, side, amount, price, params)
+
+    def place_order(self, symbol, type, side, amount, price, params):
+        self.check_token()
+        engine = self.engine(symbol)
+        if side not in ('buy', 'sell'):
+            raise InvalidOrder(self.id + ' createOrder() side must be buy or sell')
+        order_amount = Decimal(str(amount))
+        order_price = None if type == 'market' else Decimal(str(price))
+        if order_amount <= 0 or (order_price is not None and order_price <= 0):
+            raise InvalidOrder(self.id + ' createOrder() amount and price must be positive')
+        order = LocalOrder(str(next(self.order_ids)), symbol, side, order_price, order_amount, self.milliseconds())
+        for maker in engine.place(order, params.get('timeInForce', 'GTC')):
+            if maker.remaining == 0:
+                del self.open_orders[maker.id]
+        if order.remaining > 0:
+            self.open_orders[order.id] = order
+        # mandala returns the order id only, ccxt adds the arguments to it
+        return {
+            'info': {'orderId': int(order.id)},
+            'id': order.id,
+            'timestamp': None,
+            'datetime': None,
+            'lastTradeTimestamp': None,
+            'symbol': symbol,
+            'type': type,
+            'side': side,
+            'price': price,
+            'cost': None,
+            'average': None,
+            'amount': amount,
+            'filled': None,
+            'remaining': None,
+            'status': 'open',
+            'fee': None,
+        }
+
+    def cancel_order(self, id, symbol=None, params={}):
+        side = self.safe_string(params, 'side')
+        if side is None:
+            raise ArgumentsRequired(self.id + ' cancelOrder() requires an order side extra parameter')
+        return self.call('cancelOrder', self.remove_order, str(id), symbol, side)
+
+    def remove_order(self, order_id, symbol, side):
+        self.check_token()
+        order = self.open_orders.get(order_id)
+        if order is None or order.side != side.lower():
+            raise OrderNotFound(self.id + ' order ' + order_id + ' not found')
+        self.engine(order.symbol).cancel(order)
+        del self.open_orders[order_id]
+        return {
+            'info': {'Status': 'Success', 'Message': 'Success_General', 'Data': 'Success!'},
+            'id': order_id,
+            'symbol': symbol,
+            'side': side,
+            'status': 'canceled',
+        }
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        return self.call('fetchOpenOrders', self.list_open_orders, symbol)
+
+    def list_open_orders(self, symbol):
+        self.check_token()
+        return [
+            self.parse_local_order(order) for order in self.open_orders.values()
+            if symbol is None or order.symbol == symbol
+        ]
+
+    def parse_local_order(self, order: LocalOrder):
+        """
+        :return: open order as mandala returns it: the side is only reported in the raw response
+        """
+        base, quote = order.symbol.split('/')
+        info = {
+            'orderId': int(order.id),
+            'market': quote,
+            'trade': base,
+            'volume': float(order.amount),
+            'pendingVolume': float(order.remaining),
+            'rate': float(order.price),
+            'side': order.side.upper(),
+            'date': self.iso8601(order.timestamp),
+        }
+        return {
+            'info': info,
+            'id': order.id,
+            'timestamp': order.timestamp,
+            'datetime': self.iso8601(order.timestamp),
+            'lastTradeTimestamp': None,
+            'symbol': order.symbol,
+            'type': 'limit',
+            'side': None,
+            'price': float(order.price),
+            'cost': None,
+            'average': None,
+            'amount': float(order.amount),
+            'filled': float(order.amount - order.remaining),
+            'remaining': float(order.remaining),
+            'status': 'open',
+            'fee': None,
+        }
+
+    def stats(self) -> dict:
+        """
+        :return: dict with the number of 'requests' by method, 'rate_limit_violations', 'injected_errors',
+                 and the number of 'open_orders' and 'trades' made on all the pairs
+        """
+        with self.engine_lock:
+            return {
+                'requests': dict(self.request_counts),
+                'rate_limit_violations': self.rate_limit_violations,
+                'injected_errors': self.injected_errors,
+                'open_orders': len(self.open_orders),
+                'trades': sum(len(engine.trades) for engine in self.engines.values()),
+            }
+
+
+class AsyncLocalExchange(LocalExchange):
+    """
+    Same as LocalExchange with the interface of ccxt.async_support.mandala: requests are coroutines
+    waiting for the latency without blocking the event loop
+    """
+    async def call(self, name, func, *args):
+        latency, error, lost = self.begin_request(name)
+        await asyncio.sleep(latency / 2)
+        if error is not None and not lost:
+            raise error
+        with self.engine_lock:
+            result = func(*args)
+        await asyncio.sleep(latency / 2)
+        if error is not None:
+            raise error
+        return result
+
+    async def sign_in(self, params={}):
+        for i in range(SIGN_IN_REQUESTS - 1):
+            await self.call('signIn', lambda: None)
+        return await self.call('signIn', self.issue_token)
+
+    async def load_markets(self, reload=False, params={}):
+        return super(AsyncLocalExchange, self).load_markets(reload, params)
+
+    async def fetch_order_book(self, symbol, limit=None, params={}):
+        return await self.call('fetchOrderBook', self.order_book, symbol, limit)
+
+    async def fetch_ticker(self, symbol, params={}):
+        return await self.call('fetchTicker', self.ticker, symbol)
+
+    async def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = params or {}
+        return await self.call('createOrder', self.place_order, symbol, type, side, amount, price, params)
+
+    async def cancel_order(self, id, symbol=None, params={}):
+        side = self.safe_string(params, 'side')
+        if side is None:
+            raise ArgumentsRequired(self.id + ' cancelOrder() requires an order side extra parameter')
+        return await self.call('cancelOrder', self.remove_order, str(id), symbol, side)
+
+    async def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        return await self.call('fetchOpenOrders', self.list_open_orders, symbol)
+
+    async def close(self):
+        pass
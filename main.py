@@ -1,17 +1,28 @@
 import random
 import time
-import requests
+import logging
+import asyncio
 import argparse
 import ccxt
 from config import config
-from helper import run_repeatedly, run_at_random_intervals
+from helper import run_at_random_intervals, run_repeatedly_apart_async, run_at_random_intervals_async
+from helper import run_on_trigger, run_on_trigger_async
 from decimal import Decimal
-from api_client import APIClient
-from custom_logging import get_logger
+from api_client import APIClient, AsyncAPIClient, offline
+from market_snapshot import MarketSnapshot
+from reconciler import OrderReconciler, order_remaining, order_side
+from fill_watcher import FillWatcher
+from budget import CallBudget, calls_per_cycle
+from reference_price import ReferencePriceService
+from ticks import TickScale, min_cost_ticks
+from cycle_trace import CycleTracer, span, count
+from custom_logging import get_logger, configure_logging, DetailLog
 logger = get_logger(__name__)
 
 ap = argparse.ArgumentParser()
 ap.add_argument('-c', dest='config_file')
+ap.add_argument('-a', '--asyncio', dest='use_asyncio', action='store_true',
+                help='run all jobs as tasks on one asyncio event loop')
 args = ap.parse_args()
 
 config_file = args.config_file
@@ -19,42 +30,162 @@ if config_file is None:
     config_file = 'config.ini'
 
 config.read(config_file)
+configure_logging(
+    use_queue=config.get('Logging', 'Queue', fallback='no') == 'yes',
+    json_lines=config.get('Logging', 'Format', fallback='text') == 'json',
+    level=config.get('Logging', 'Level', fallback='INFO').upper(),
+    repeat_interval=config.getint('Logging', 'RepeatedErrorInterval', fallback=0)
+)
 
 
-def random_decimal(minimum, maximum, step):
-    minimum = int(Decimal(minimum)/step)
-    maximum = int(Decimal(maximum)/step)
-    return Decimal(random.randint(minimum, maximum)) * step
+# which side of the orderbook an order of the given side goes to
+BOOK_SIDES = {'buy': 'bids', 'sell': 'asks'}
+# requests made by a market snapshot: depth, ticker and open orders
+SNAPSHOT_READS = 3
 
+# the per-order lines of the cycles, or one summary line per cycle
+detail_log = DetailLog(
+    logger,
+    summary=config.get('Logging', 'OrderLines', fallback='all') == 'summary',
+    sample=config.getfloat('Logging', 'OrderLineSample', fallback=0)
+)
+# every orderbook maintenance cycle of every pair is traced here
+cycle_tracer = CycleTracer(
+    config.getint('MarketMaker', 'CycleTraceHistory', fallback=100),
+    config.get('MarketMaker', 'CycleTraceFile', fallback='') or None
+)
 
-class MarketMakerBot:
-    def __init__(self):
-        self.api = APIClient()
-        self.currency_pair = config.get('MarketMaker', 'CurrencyPair')
-        self.check_binance = True
 
-        self.min_order_size = config.getdecimal('MarketMaker', 'MinOrderSize')
-        self.amount_step = config.getdecimal('MarketMaker', 'OrderbookMinAmountStep')
+def create_ref_price_service(currency_pairs, section='MarketMaker'):
+    venues = config.get(section, 'RefPriceVenues', fallback='binance').replace(' ', '')
+    return ReferencePriceService(
+        currency_pairs,
+        # offline, the prices come from the stand-in exchange (or StartPrice) only
+        venues=[] if offline() else list(filter(None, venues.split(','))),
+        aggregation=config.get(section, 'RefPriceAggregation', fallback='median'),
+        source=config.get(section, 'RefPriceSource', fallback='last'),
+        refresh_interval=config.getint(section, 'RefPriceRefreshInterval', fallback=10),
+        max_age=config.getint(section, 'RefPriceMaxAge', fallback=60),
+        connect_timeout=config.getfloat(section, 'RefPriceConnectTimeout', fallback=3),
+        read_timeout=config.getfloat(section, 'RefPriceReadTimeout', fallback=5)
+    )
+
+
+def pair_sections() -> list:
+    """
+    Multi-pair mode: every pair from CurrencyPairs gets its own config section,
+    [MarketMaker] settings overridden by the optional [MarketMaker <pair>] section
+    :return: list of section names, empty if CurrencyPairs is not set
+    """
+    pairs = config.get('MarketMaker', 'CurrencyPairs', fallback='').replace(' ', '')
+    sections = []
+    for pair in filter(None, pairs.split(',')):
+        section = f'MarketMaker {pair}'
+        settings = dict(config['MarketMaker'])
+        if config.has_section(section):
+            settings.update(config[section])
+        settings[config.optionxform('CurrencyPair')] = pair
+        config.read_dict({section: settings})
+        sections.append(section)
+    return sections
+
 
+class MarketMakerBot:
+    def __init__(self, api=None, ref_price_service=None, section='MarketMaker', autostart=True):
+        """
+        :param api: APIClient to share with other bots, a new one is created if not passed
+        :param ref_price_service: ReferencePriceService to share with other bots, a new one is created if not passed
+        :param section: config section with the settings of this bot
+        :param autostart: start the jobs right away, otherwise call start()
+        """
+        self.api = api if api is not None else APIClient()
+        self.load_settings(section)
+        if self.provide_liquidity:
+            self.call_budget = CallBudget.for_cycle(
+                self.orderbook_interval, self.api.request_interval, self.reserved_calls() + SNAPSHOT_READS
+            )
+        self.own_ref_price_service = ref_price_service is None
+        if ref_price_service is None:
+            ref_price_service = create_ref_price_service([self.currency_pair], section)
+        self.ref_price_service = ref_price_service
+        if autostart:
+            self.start()
+
+    def start(self):
+        if self.own_ref_price_service:
+            self.ref_price_service.start()
         logger.info('Market Maker Bot started at {}', self.currency_pair)
-        if config.get('MarketMaker', 'DisableLiquidity', fallback='no') != 'yes':
+        if self.provide_liquidity:
             self.stop_event_orderbook = self.generate_random_orderbook()
             # bot will start making trades <StartTradesDelay> seconds after it started placing orders
-            time.sleep(config.getint('MarketMaker', 'StartTradesDelay'))
+            time.sleep(self.start_trades_delay)
         self.stop_event_trades = self.generate_random_trades()
 
-    def calculate_price_range(self, side, target_price_range, min_price_step):
-        # get current bid, ask, last price
-        depth = self.api.depth(currency_pair=self.currency_pair, limit=1)
-        try:
-            best_bid = Decimal(str(depth['bids'][0][0]))
-        except IndexError:
-            best_bid = None
-        try:
-            best_ask = Decimal(str(depth['asks'][0][0]))
-        except IndexError:
-            best_ask = None
-        last_price = Decimal(str(self.api.ticker(currency_pair=self.currency_pair)['last']))
+    def load_settings(self, section):
+        self.section = section
+        self.currency_pair = config.get(section, 'CurrencyPair')
+        self.min_order_size = config.getdecimal(section, 'MinOrderSize')
+        self.amount_step = config.getdecimal(section, 'OrderbookMinAmountStep')
+        self.provide_liquidity = config.get(section, 'DisableLiquidity', fallback='no') != 'yes'
+        self.start_trades_delay = config.getint(section, 'StartTradesDelay')
+
+        # orderbook settings are only required when providing liquidity
+        if self.provide_liquidity:
+            self.orderbook_interval = config.getint(section, 'OrderbookUpdateInterval')
+            self.max_orderbook_interval = config.getint(section, 'OrderbookMaxUpdateInterval', fallback=600)
+            self.fill_check_interval = config.getint(section, 'OrderbookFillCheckInterval', fallback=5)
+            self.min_requote_interval = config.getint(section, 'OrderbookMinRequoteInterval', fallback=2)
+            self.price_step = config.getdecimal(section, 'OrderbookPriceStep')
+            # the orderbook is planned in integer ticks of the price and amount steps
+            self.price_scale = TickScale(self.price_step)
+            self.amount_scale = TickScale(self.amount_step)
+            self.max_spread = self.price_scale.to_ticks(config.getdecimal(section, 'OrderbookMaxSpread'))
+            self.min_orderbook_volume = self.amount_scale.to_ticks(config.getdecimal(section, 'OrderbookMinVolume'))
+            self.max_orderbook_volume = self.amount_scale.to_ticks(config.getdecimal(section, 'OrderbookMaxVolume'))
+            self.target_price_range = config.getdecimal(section, 'OrderbookPriceRange')
+            self.min_order_amount = self.amount_scale.to_ticks(config.getdecimal(section, 'OrderbookMinOrderAmount'))
+            self.min_order_cost = min_cost_ticks(self.min_order_size, self.amount_scale, self.price_scale)
+            self.reconciler = OrderReconciler(
+                price_tolerance=self.price_scale.to_ticks(
+                    config.getdecimal(section, 'OrderbookPriceTolerance', fallback=Decimal(0))
+                ),
+                amount_tolerance=config.getdecimal(section, 'OrderbookAmountTolerance', fallback=Decimal(0))
+            )
+            self.fill_watcher = FillWatcher(self.currency_pair, self.amount_scale)
+
+        self.trade_min_interval = config.getint(section, 'TradeMinInterval')
+        self.trade_max_interval = config.getint(section, 'TradeMaxInterval')
+        self.trade_min_amount = config.getdecimal(section, 'TradeMinAmount')
+        self.trade_max_amount = config.getdecimal(section, 'TradeMaxAmount')
+        self.min_volume_24h = config.getfloat(section, 'MinTradeVolume24h')
+        self.trade_amount_deviation = config.getfloat(section, 'TradeAmountVariation')
+        self.trade_max_price = config.getdecimal(section, 'TradeMaxPrice')
+        self.trade_min_price = config.getdecimal(section, 'TradeMinPrice')
+
+    def reserved_calls(self) -> int:
+        """
+        :return: number of requests the trades and the fill checks of this bot may make within an orderbook cycle
+        """
+        # a trade reads the depth and places an order, our open orders it may have filled are loaded again
+        reserved = calls_per_cycle(self.orderbook_interval, self.trade_min_interval, 3)
+        if self.provide_liquidity:
+            # the fill checks read the api ledger, which loads the orders from the exchange at its sync interval
+            reserved += calls_per_cycle(
+                self.orderbook_interval, max(self.fill_check_interval, self.api.ledger_sync_interval)
+            )
+        return reserved
+
+    def take_snapshot(self, open_orders=None) -> MarketSnapshot:
+        return MarketSnapshot.take(
+            self.api, self.currency_pair, self.get_ref_price, self.price_scale, self.amount_scale,
+            open_orders=open_orders
+        )
+
+    def calculate_price_range(self, snapshot: MarketSnapshot, side, target_price_range, min_price_step=1):
+        # current bid, ask, last price come from the cycle snapshot, all in price ticks
+        best_bid = snapshot.best_bid
+        best_ask = snapshot.best_ask
+        last_price = snapshot.last_price
         # choose a price range
         price_max = None
         price_min = None
@@ -66,8 +197,8 @@ class MarketMakerBot:
             elif last_price > 0:
                 price_max = last_price - min_price_step
             if price_max is None:
-                price_max = self.get_ref_price()
-            price_min = price_max / (Decimal(1) + target_price_range)
+                price_max = snapshot.ref_price
+            price_min = int(price_max / (Decimal(1) + target_price_range))
         if side == 'asks':
             if best_bid is not None:
                 price_min = best_bid + min_price_step
@@ -76,8 +207,8 @@ class MarketMakerBot:
             elif last_price > 0:
                 price_min = last_price + min_price_step
             if price_min is None:
-                price_min = self.get_ref_price()
-            price_max = price_min * (Decimal(1) + target_price_range)
+                price_min = snapshot.ref_price
+            price_max = int(price_min * (Decimal(1) + target_price_range))
         if price_min is None and price_max is None:
             price_min = min_price_step
             price_max = price_min * 1000
@@ -85,32 +216,27 @@ class MarketMakerBot:
             price_min += min_price_step
         return price_min, price_max
 
-    def get_ref_price(self):
-        # check reference price on Binance if it is present there
-        if self.check_binance:
-            try:
-                symbol = self.currency_pair.replace('/', '').replace('BCHBTC', 'BCHABCBTC')
-                r = requests.get(f'https://api.binance.com/api/v3/ticker/price?symbol={symbol}').json()
-                if 'msg' in r and r['msg'] == 'Invalid symbol.':
-                    logger.info('Symbol {} is not present on Binance', symbol)
-                    # do not ask anymore
-                    self.check_binance = False
-                else:
-                    return Decimal(r['price'])
-            except Exception as e:
-                logger.info('Failed to load price from Binance: {}', e)
+    def get_ref_price(self, last_price=None):
+        # use the reference price from other exchanges if the pair is present there and the price is not stale
+        ref_price = self.ref_price_service.price(self.currency_pair)
+        if ref_price is not None:
+            return ref_price
         # otherwise just use our own last price
-        last_price = Decimal(str(self.api.ticker(currency_pair=self.currency_pair)['last']))
+        if last_price is None:
+            last_price = Decimal(str(self.api.ticker(currency_pair=self.currency_pair)['last']))
         if last_price > 0:
             return last_price
         # if we had no trades here yet, get price from config
-        return config.getdecimal('MarketMaker', 'StartPrice')
+        return config.getdecimal(self.section, 'StartPrice')
 
-    def calculate_spread_levels(self, max_spread: Decimal, price_step: Decimal) -> tuple:
-        ref_price = self.get_ref_price()
-        spread_bid = (ref_price - max_spread / 2).quantize(price_step)
-        if spread_bid < price_step:
-            spread_bid = price_step
+    def calculate_spread_levels(self, snapshot: MarketSnapshot, max_spread: int) -> tuple:
+        """
+        :param max_spread: in price ticks
+        :return: (spread_bid, spread_ask) in price ticks
+        """
+        spread_bid = round(snapshot.ref_price - max_spread / 2)
+        if spread_bid < 1:
+            spread_bid = 1
         spread_ask = spread_bid + max_spread
         return spread_bid, spread_ask
 
@@ -119,214 +245,748 @@ class MarketMakerBot:
             return (self.min_order_size / price).quantize(self.amount_step)
         return amount
 
-    def generate_random_orderbook(self):
-        interval = config.getint('MarketMaker', 'OrderbookUpdateInterval')
-        max_spread = config.getdecimal('MarketMaker', 'OrderbookMaxSpread')
-        min_orderbook_volume = config.getdecimal('MarketMaker', 'OrderbookMinVolume')
-        max_orderbook_volume = config.getdecimal('MarketMaker', 'OrderbookMaxVolume')
-        target_price_range = config.getdecimal('MarketMaker', 'OrderbookPriceRange')
-        price_step = config.getdecimal('MarketMaker', 'OrderbookPriceStep')
-        min_order_amount = config.getdecimal('MarketMaker', 'OrderbookMinOrderAmount')
-
-        def maintain_orders():
+    def respect_order_size_ticks(self, amount: int, price: int) -> int:
+        """
+        Same as respect_order_size() in ticks, the amount is rounded up so the order cost is never below MinOrderSize
+        """
+        if amount * price < self.min_order_cost:
+            return -(-self.min_order_cost // price)
+        return amount
+
+    def price_decimal(self, price: int) -> Decimal:
+        return self.price_scale.to_decimal(price)
+
+    def amount_decimal(self, amount: int) -> Decimal:
+        return self.amount_scale.to_decimal(amount)
+
+    def plan_spread_orders(self, snapshot: MarketSnapshot, spread_bid, spread_ask) -> list:
+        """
+        Plans the orders restoring the spread if the best bid or ask is beyond it
+        :return: list of orders as dicts with 'side', 'amount', 'price' in ticks, 'purpose'
+        """
+        orders = []
+        best_bid = snapshot.best_bid
+        best_ask = snapshot.best_ask
+        detail_log.step('Actual spread right now: {:f} {:f}', self.price_decimal(best_bid), self.price_decimal(best_ask))
+        if best_bid is None or best_bid < spread_bid:
+            # place a bid at spread_bid
+            min_amount = self.respect_order_size_ticks(self.min_order_amount, spread_bid)
+            amount = random.randint(min_amount, min_amount*3)
+            detail_log.item('Placing spread bid: {} @ {:f}', self.amount_decimal(amount), self.price_decimal(spread_bid))
+            orders.append({'side': 'buy', 'amount': amount, 'price': spread_bid, 'purpose': 'spread'})
+        if best_ask is None or best_ask > spread_ask:
+            # place an ask at spread_ask
+            min_amount = self.respect_order_size_ticks(self.min_order_amount, spread_ask)
+            amount = random.randint(min_amount, min_amount*3)
+            detail_log.item('Placing spread ask: {} @ {:f}', self.amount_decimal(amount), self.price_decimal(spread_ask))
+            orders.append({'side': 'sell', 'amount': amount, 'price': spread_ask, 'purpose': 'spread'})
+        return orders
+
+    def plan_ladder(self, snapshot: MarketSnapshot, side, volume_to_add, spread_bid, spread_ask) -> list:
+        """
+        Plans random orders on one side of the orderbook until <volume_to_add> is covered
+        :return: list of orders as dicts with 'side', 'amount', 'price' in ticks, 'purpose'
+        """
+        orders = []
+        # calculate the price range to operate within
+        price_min, price_max = self.calculate_price_range(snapshot, side, self.target_price_range)
+        if side == 'bids':
+            order_side = 'buy'
+            price_max = spread_bid  # don't go above our spread
+            # the whole range may lie within the spread, then the orders go to the spread level
+            price_min = min(price_min, price_max)
+        else:
+            order_side = 'sell'
+            price_min = spread_ask  # don't go below our spread
+            price_max = max(price_max, price_min)
+        while volume_to_add > self.min_order_amount:
+            # choose a random price within the range
+            price = random.randint(price_min, price_max)
+            # choose a random amount
+            min_amount = self.respect_order_size_ticks(self.min_order_amount, price)
+            if volume_to_add <= min_amount:
+                amount = min_amount
+            else:
+                amount = random.randint(min_amount, volume_to_add)
+            detail_log.item(
+                'Creating random order: {} {} @ {:f}', order_side, self.amount_decimal(amount), self.price_decimal(price)
+            )
+            orders.append({'side': order_side, 'amount': amount, 'price': price, 'purpose': 'top-up'})
+            # place more orders until target orderbook volume is reached
+            volume_to_add -= amount
+        return orders
+
+    def plan_top_ups(self, snapshot: MarketSnapshot, spread_bid, spread_ask, volumes=None) -> list:
+        """
+        Plans the ladders for the sides of the orderbook which lack volume
+        :param volumes: dict side -> orderbook volume to use instead of the snapshot one
+        :return: list of (side, ladder) tuples, see plan_ladder()
+        """
+        ladders = []
+        # processing randomly first bids then asks or first asks then bids
+        for side in random.choice([['bids', 'asks'], ['asks', 'bids']]):
+            # check orderbook volume
+            orderbook_volume = volumes[side] if volumes is not None else snapshot.volume(side)
+            if orderbook_volume >= self.max_orderbook_volume:
+                continue
+            # if volume is not enough place some orders
+            target_orderbook_volume = random.randint(self.min_orderbook_volume, self.max_orderbook_volume)
+            logger.debug(
+                'Target random orderbook volume ({}): {}', side, self.amount_decimal(target_orderbook_volume)
+            )
+            volume_to_add = target_orderbook_volume - orderbook_volume
+            if volume_to_add > self.min_order_amount:
+                ladders.append((side, self.plan_ladder(snapshot, side, volume_to_add, spread_bid, spread_ask)))
+        return ladders
+
+    def plan_kept_orders(self, snapshot: MarketSnapshot) -> tuple:
+        """
+        Keeps our orders nearest to the spread while their volume fits into the max orderbook volume,
+        the farthest orders beyond it are to be cancelled to free the funds.
+        The api ledger keeps the volume of each side, so the orders are walked only on a side over the max
+        :return: (kept, dropped) lists of our open orders
+        """
+        max_volume = self.amount_decimal(self.max_orderbook_volume)
+        beyond = set()
+        for side in ('buy', 'sell'):
+            excess = self.api.ledger.volume(self.currency_pair, side) - max_volume
+            if excess > 0:
+                beyond.update(order['id'] for order in self.api.ledger.farthest(self.currency_pair, side, excess))
+        if len(beyond) == 0:
+            return list(snapshot.my_orders), []
+        kept = [order for order in snapshot.my_orders if order['id'] not in beyond]
+        dropped = [order for order in snapshot.my_orders if order['id'] in beyond]
+        return kept, dropped
+
+    def plan_desired_orders(self, snapshot: MarketSnapshot, spread_bid, spread_ask) -> list:
+        """
+        Plans the whole set of orders we want to have on the pair after this cycle
+        :return: list of orders as dicts with 'side', 'amount', 'price', our open orders to keep also have 'id'
+        """
+        spread_orders = self.plan_spread_orders(snapshot, spread_bid, spread_ask)
+        kept, dropped = self.plan_kept_orders(snapshot)
+        detail_log.step('Checking orderbook volume...')
+        # the orderbook volume as it will be once the plan is carried out
+        volumes = {side: snapshot.volume(side) for side in ('bids', 'asks')}
+        for order in spread_orders:
+            volumes[BOOK_SIDES[order['side']]] += order['amount']
+        for order in dropped:
+            volumes[BOOK_SIDES[order['side']]] -= order['amount']
+        desired = list(spread_orders)
+        for order in kept:
+            desired.append({'id': order['id'], 'side': order['side'], 'amount': order['amount'], 'price': order['price']})
+        for side, ladder in self.plan_top_ups(snapshot, spread_bid, spread_ask, volumes):
+            desired.extend(ladder)
+        return desired
+
+    def plan_orders(self, snapshot: MarketSnapshot):
+        """
+        :return: ReconcilePlan turning our open orders into the desired ones
+        """
+        with span('spread'):
+            spread_bid, spread_ask = self.calculate_spread_levels(snapshot, self.max_spread)
+        detail_log.step('Calculated spread levels: {:f} {:f}', self.price_decimal(spread_bid), self.price_decimal(spread_ask))
+        with span('plan'):
+            desired = self.plan_desired_orders(snapshot, spread_bid, spread_ask)
+            plan = self.reconciler.reconcile(desired, snapshot.my_orders)
+        for order in plan.to_cancel:
+            detail_log.item(
+                'Removing order: {} {} @ {:f}',
+                order['side'], self.amount_decimal(order['amount']), self.price_decimal(order['price'])
+            )
+        detail_log.step(
+            'Orders plan: keeping {}, creating {}, cancelling {}, saved {} calls',
+            len(plan.kept), len(plan.to_create), len(plan.to_cancel), plan.calls_saved
+        )
+        return plan
+
+    def plan_random_trade(self, depth):
+        """
+        :param depth: orderbook with the best bid and ask, if any
+        :return: IOC order as a dict with 'side', 'amount', 'price', 'params' or None if no trade should be made
+        """
+        interval_ev = (self.trade_max_interval + self.trade_min_interval) / 2
+        amount_ev = self.min_volume_24h * interval_ev / (24*60*60)
+        amount = Decimal(
+            random.normalvariate(amount_ev, self.trade_amount_deviation*amount_ev)
+        )
+        if amount < self.trade_min_amount:
+            amount = self.trade_min_amount
+        elif amount > self.trade_max_amount:
+            amount = self.trade_max_amount
+        amount = amount.quantize(self.amount_step)
+        side = random.choice(['buy', 'sell'])
+        # find the nearest price to execute a trade
+        depth_side = {'buy': 'asks', 'sell': 'bids'}[side]
+        if len(depth[depth_side]) == 0:
+            logger.info('No {} to make a random trade with', depth_side)
+            return None
+        best_price = Decimal(str(depth[depth_side][0][0]))
+        # check the price limits
+        if not self.trade_min_price <= best_price <= self.trade_max_price:
+            logger.error(
+                'Best price {:f} is beyond the limits: {:f} {:f}',
+                best_price, self.trade_min_price, self.trade_max_price
+            )
+            return None
+        amount = self.respect_order_size(amount, best_price)
+        logger.info('Random trade: {} {} @ {:f} IOC', side, amount, best_price)
+        return {'side': side, 'amount': amount, 'price': best_price, 'params': {'timeInForce': 'IOC'}}
+
+    def report_batch(self, orders, report, description, started):
+        """
+        Logs the outcome of an order batch
+        :return: list of created orders
+        """
+        created = [item['result'] for item in report if item['result'] is not None]
+        for item in report:
+            if item['result'] is None:
+                order = item['order']
+                detail_log.item(
+                    'Order was not placed: {} {} @ {}', order['side'], order['amount'], order['price'],
+                    level=logging.WARNING
+                )
+        detail_log.step(
+            'Placed {} of {} {} orders in {:.2f}s', len(created), len(orders), description, time.time() - started
+        )
+        return created
+
+    def exchange_orders(self, orders) -> list:
+        """
+        Converts the planned orders from ticks to the strings sent to the exchange
+        """
+        return [
+            {
+                'side': order['side'],
+                'amount': self.amount_scale.to_string(order['amount']),
+                'price': self.price_scale.to_string(order['price'])
+            }
+            for order in orders
+        ]
+
+    def submit_orders(self, orders, description):
+        """
+        Places the planned orders concurrently and reports the outcome
+        :param orders: list of orders as dicts with 'side', 'amount', 'price' in ticks
+        :param description: what these orders are, for logging
+        :return: list of created orders
+        """
+        if len(orders) == 0:
+            return []
+        started = time.time()
+        orders = self.exchange_orders(orders)
+        report = self.api.order_create_batch(self.currency_pair, orders)
+        return self.report_batch(orders, report, description, started)
+
+    def report_removals(self, report) -> int:
+        """
+        :return: number of orders removed
+        """
+        for item in report:
+            if item['error'] is not None:
+                detail_log.item('Order {} was not removed', item['order']['id'], level=logging.WARNING)
+        return sum(1 for item in report if item['error'] is None)
+
+    def fit_call_budget(self, plan):
+        """
+        :return: the plan cut down to the calls the pass may make, see CallBudget
+        """
+        plan = self.call_budget.fit(plan)
+        if plan.deferred > 0:
+            detail_log.step(
+                'Call budget of {} per pass exceeded, {} actions deferred to the next pass',
+                self.call_budget.calls, plan.deferred
+            )
+        return plan
+
+    def remove_orders(self, orders) -> int:
+        """
+        Cancels our open orders concurrently
+        :return: number of orders removed
+        """
+        if len(orders) == 0:
+            return 0
+        return self.report_removals(self.api.order_remove_batch(self.currency_pair, orders))
+
+    def count_orders(self, plan, cancelled, created):
+        """
+        Adds the outcome of the pass to the cycle trace: orders kept, cancelled, failed, deferred,
+        and created with the volume added, in ticks, per side
+        """
+        sides = {'buy': [0, 0], 'sell': [0, 0]}
+        for order in created:
+            added = sides[order_side(order)]
+            added[0] += 1
+            added[1] += self.amount_scale.to_ticks(order['amount'])
+        count(
+            kept=len(plan.kept), cancelled=cancelled, created=len(created),
+            created_buy=sides['buy'][0], created_sell=sides['sell'][0],
+            volume_buy_ticks=sides['buy'][1], volume_sell_ticks=sides['sell'][1],
+            failed=len(plan.to_cancel) - cancelled + len(plan.to_create) - len(created), deferred=plan.deferred
+        )
+
+    def log_cycle(self, trace):
+        """
+        Logs the cycle in one line in place of its per-order lines, in the summary mode of detail_log
+        """
+        if not detail_log.summary:
+            return
+        counts = trace.counts
+        logger.info(
+            'Cycle {}: created {} buy (+{}) and {} sell (+{}), cancelled {}, kept {}, failed {}, deferred {}{}; '
+            '{} calls in {:.2f}s',
+            self.currency_pair, counts.get('created_buy', 0), self.amount_decimal(counts.get('volume_buy_ticks', 0)),
+            counts.get('created_sell', 0), self.amount_decimal(counts.get('volume_sell_ticks', 0)),
+            counts.get('cancelled', 0), counts.get('kept', 0), counts.get('failed', 0), counts.get('deferred', 0),
+            ', error ' + trace.error if trace.error is not None else '', trace.calls, trace.elapsed()
+        )
+
+    def expect_orders(self, kept, created):
+        """
+        Remembers our orders left on the book by a pass, to tell later whether they were hit
+        :param kept: our open orders kept from the snapshot, amounts in ticks
+        :param created: orders created, as returned by ccxt
+        """
+        expected = {order['id']: order['amount'] for order in kept}
+        for order in created:
+            expected[order['id']] = self.amount_scale.to_ticks(order_remaining(order))
+        self.fill_watcher.expect(expected)
+
+    def requote_trigger(self, open_orders):
+        """
+        :param open_orders: our open orders on all pairs
+        :return: open_orders if some of our orders on the pair were hit since the last pass, None otherwise
+        """
+        hit = self.fill_watcher.hit_orders(open_orders)
+        if len(hit) == 0:
+            return None
+        logger.info('{} of our orders were hit, requoting', len(hit))
+        return open_orders
+
+    def check_fills(self):
+        """
+        Reads our open orders from the api ledger, they are loaded from the exchange at <OrderLedgerSyncInterval>
+        :return: requote trigger, see requote_trigger()
+        """
+        try:
+            open_orders = self.api.known_open_orders()
+        except ccxt.errors.BaseError as e:
+            logger.error('Exchange API error: {}', e)
+            return None
+        return self.requote_trigger(open_orders)
+
+    def maintain_orders(self, open_orders=None) -> bool:
+        """
+        :param open_orders: our open orders on all pairs if already loaded this cycle
+        :return: whether the orderbook needed any changes
+        """
+        with cycle_tracer.cycle(self.currency_pair) as trace:
             try:
-                # maintain the spread
-                spread_bid, spread_ask = self.calculate_spread_levels(max_spread, price_step)
-                logger.info('Calculated spread levels: {:f} {:f}', spread_bid, spread_ask)
-                depth = self.api.depth(currency_pair=self.currency_pair, limit=1)
-                best_bid = Decimal(str(depth['bids'][0][0])) if len(depth['bids']) > 0 else None
-                best_ask = Decimal(str(depth['asks'][0][0])) if len(depth['asks']) > 0 else None
-                logger.info('Actual spread right now: {:f} {:f}', best_bid, best_ask)
-                if best_bid is None or best_bid < spread_bid:
-                    # place a bid at spread_bid
-                    min_amount = self.respect_order_size(min_order_amount, spread_bid)
-                    amount = random_decimal(min_amount, min_amount*3, self.amount_step)
-                    logger.info('Placing spread bid: {} @ {:f}', amount, spread_bid)
-                    self.api.order_create(
-                        currency_pair=self.currency_pair,
-                        order_type='limit',
-                        side='buy',
-                        amount=amount,
-                        price=spread_bid
-                    )
-                if best_ask is None or best_ask > spread_ask:
-                    # place an ask at spread_ask
-                    min_amount = self.respect_order_size(min_order_amount, spread_ask)
-                    amount = random_decimal(min_amount, min_amount*3, self.amount_step)
-                    logger.info('Placing spread ask: {} @ {:f}', amount, spread_ask)
-                    self.api.order_create(
-                        currency_pair=self.currency_pair,
-                        order_type='limit',
-                        side='sell',
-                        amount=amount,
-                        price=spread_ask
-                    )
-                logger.info('Checking orderbook volume...')
-                # get the orderbook now
-                depth = self.api.depth(currency_pair=self.currency_pair, limit=100)
-                # processing randomly first bids then asks or first asks then bids
-                for side in random.choice([['bids', 'asks'], ['asks', 'bids']]):
-                    # check orderbook volume
-                    orderbook_volume = 0
-                    for level in depth[side]:
-                        orderbook_volume += Decimal(str(level[1]))
-                    if orderbook_volume >= max_orderbook_volume:
-                        continue
-                    # if volume is not enough place some orders
-                    target_orderbook_volume = random_decimal(min_orderbook_volume, max_orderbook_volume, self.amount_step)
-                    logger.debug('Target random orderbook volume ({}): {}', side, target_orderbook_volume)
-                    volume_to_add = target_orderbook_volume - orderbook_volume
-                    if volume_to_add > min_order_amount:
-                        while volume_to_add > min_order_amount:
-                            # calculate the price range to operate within
-                            price_min, price_max = self.calculate_price_range(side, target_price_range, price_step)
-                            if side == 'bids':
-                                order_side = 'buy'
-                                price_max = spread_bid  # don't go above our spread
-                            elif side == 'asks':
-                                order_side = 'sell'
-                                price_min = spread_ask  # don't go below our spread
-                            # choose a random price within the range
-                            price = random_decimal(price_min, price_max, price_step)
-                            # choose a random amount
-                            min_amount = self.respect_order_size(min_order_amount, price)
-                            if volume_to_add <= min_amount:
-                                amount = min_amount
-                            else:
-                                amount = random_decimal(min_amount, volume_to_add, self.amount_step)
-                            # place the order
-                            logger.info('Creating random order: {} {} @ {:f}', order_side, amount, price)
-                            self.api.order_create(
-                                currency_pair=self.currency_pair,
-                                order_type='limit',
-                                side=order_side,
-                                amount=amount,
-                                price=price
-                            )
-                            # place more orders until target orderbook volume is reached
-                            volume_to_add -= amount
-
-                # check total volume of own orders on each side
-                my_bids_volume = Decimal(0)
-                my_asks_volume = Decimal(0)
-                lowest_bid_order = None
-                lowest_bid_price = None
-                highest_ask_order = None
-                highest_ask_price = None
-                active_orders = self.api.my_open_orders()
-                for order in active_orders:
-                    if order['symbol'] != self.currency_pair:
-                        continue
-                    order_amount = Decimal(str(order['amount']))
-                    order_price = Decimal(str(order['price']))
-                    if order['info']['side'] == 'BUY':
-                        my_bids_volume += order_amount
-                        if lowest_bid_price is None or order_price < lowest_bid_price:
-                            lowest_bid_order = order
-                            lowest_bid_price = order_price
-                    elif order['info']['side'] == 'SELL':
-                        my_asks_volume += order_amount
-                        if highest_ask_price is None or order_price > highest_ask_price:
-                            highest_ask_order = order
-                            highest_ask_price = order_price
-                # if we have too much volume on orders, cancel the farthest orders to free the funds
-                if my_bids_volume > max_orderbook_volume:
-                    # too much volume on bids, remove the lowest bid
-                    logger.info(
-                        'Removing lowest bid: {} {} @ {:f}',
-                        lowest_bid_order['info']['side'],
-                        Decimal(str(lowest_bid_order['amount'])),
-                        Decimal(str(lowest_bid_order['price']))
-                    )
-                    self.api.order_remove(
-                        currency_pair=self.currency_pair,
-                        order_id=lowest_bid_order['id'],
-                        side=lowest_bid_order['info']['side']
-                    )
-                if my_asks_volume > max_orderbook_volume:
-                    # too much volume on asks, remove the highest ask
-                    logger.info(
-                        'Removing highest ask: {} {} @ {:f}',
-                        highest_ask_order['info']['side'],
-                        Decimal(str(highest_ask_order['amount'])),
-                        Decimal(str(highest_ask_order['price']))
-                    )
-                    self.api.order_remove(
-                        currency_pair=self.currency_pair,
-                        order_id=highest_ask_order['id'],
-                        side=highest_ask_order['info']['side']
-                    )
+                # all market data for this cycle is read once here
+                with span('snapshot'):
+                    snapshot = self.take_snapshot(open_orders)
+                plan = self.plan_orders(snapshot)
+                with span('plan'):
+                    plan = self.fit_call_budget(plan)
+                # free the funds first, then place the new orders
+                with span('cancel'):
+                    cancelled = self.remove_orders(plan.to_cancel)
+                with span('submit'):
+                    created = self.submit_orders(plan.to_create, 'new')
+                self.count_orders(plan, cancelled, created)
+                self.expect_orders(plan.kept, created)
+                self.log_cycle(trace)
+                return plan.calls > 0
             except ccxt.errors.BaseError as e:
+                trace.fail(e)
                 logger.error('Exchange API error: {}', e)
+                self.log_cycle(trace)
+                # no backing off until the orderbook is maintained successfully
+                return True
 
-        # launch it
-        return run_repeatedly(maintain_orders, interval, 'Orderbook-Generator')
+    def generate_random_orderbook(self):
+        """
+        Maintains the orderbook right after our orders are hit, and every <OrderbookUpdateInterval> seconds otherwise,
+        backing off up to <OrderbookMaxUpdateInterval> while there is nothing to change
+        """
+        return run_on_trigger(
+            self.maintain_orders, self.check_fills, self.fill_check_interval, self.min_requote_interval,
+            self.orderbook_interval, self.max_orderbook_interval, 'Orderbook-Generator'
+        )
+
+    def make_a_trade(self):
+        try:
+            depth = self.api.depth(currency_pair=self.currency_pair, limit=1)
+            order = self.plan_random_trade(depth)
+            if order is None:
+                return
+            # make a trade
+            result = self.api.order_create(
+                currency_pair=self.currency_pair,
+                order_type='limit',
+                side=order['side'],
+                amount=order['amount'],
+                price=order['price'],
+                params=order['params']
+            )
+            if result is None:
+                logger.error('Failed to make a random trade')
+        except ccxt.errors.BaseError as e:
+            logger.error('Exchange API error: {}', e)
 
     def generate_random_trades(self):
-        min_interval = config.getint('MarketMaker', 'TradeMinInterval')
-        max_interval = config.getint('MarketMaker', 'TradeMaxInterval')
-        min_amount = config.getdecimal('MarketMaker', 'TradeMinAmount')
-        max_amount = config.getdecimal('MarketMaker', 'TradeMaxAmount')
-        min_volume_24h = config.getfloat('MarketMaker', 'MinTradeVolume24h')
-        amount_deviation = config.getfloat('MarketMaker', 'TradeAmountVariation')
-        max_price = config.getdecimal('MarketMaker', 'TradeMaxPrice')
-        min_price = config.getdecimal('MarketMaker', 'TradeMinPrice')
-
-        def make_a_trade():
+        return run_at_random_intervals(
+            self.make_a_trade, self.trade_min_interval, self.trade_max_interval, 'Trades-Generator'
+        )
+
+    def __del__(self):
+        try:
+            if self.own_ref_price_service:
+                self.ref_price_service.stop()
+        except AttributeError:
+            pass
+        try:
+            self.stop_event_orderbook.set()
+        except AttributeError:
+            pass
+        try:
+            self.stop_event_trades.set()
+        except AttributeError:
+            pass
+        time.sleep(1)  # let the threads complete
+        logger.info('Market Maker Bot stopped')
+
+
+async def start_ref_price_service_async(ref_price_service):
+    """
+    Keeps refreshing the reference prices in a task of their own on the current event loop,
+    the first refresh starts right away, see ReferencePriceService.start()
+    :return: threading.Event, when you .set() it, refreshing stops
+    """
+    async def refresh():
+        # the reference price requests are blocking, keep them off the event loop
+        await asyncio.get_event_loop().run_in_executor(None, ref_price_service.refresh)
+    return run_repeatedly_apart_async(refresh, ref_price_service.refresh_interval, 'Reference-Price')
+
+
+class AsyncMarketMakerBot(MarketMakerBot):
+    """
+    Same bot running on ccxt.async_support: all the jobs are tasks on one event loop,
+    market data reads and order writes overlap instead of blocking a thread each.
+    Must be created inside a running event loop, then started with run()
+    """
+    def __init__(self, api=None, ref_price_service=None, section='MarketMaker'):
+        self.own_api = api is None
+        self.api = api if api is not None else AsyncAPIClient()
+        self.load_settings(section)
+        if self.provide_liquidity:
+            self.call_budget = CallBudget.for_cycle(
+                self.orderbook_interval, self.api.request_interval, self.reserved_calls() + SNAPSHOT_READS
+            )
+        self.own_ref_price_service = ref_price_service is None
+        if ref_price_service is None:
+            ref_price_service = create_ref_price_service([self.currency_pair], section)
+        self.ref_price_service = ref_price_service
+
+    async def run(self):
+        if self.own_api:
+            await self.api.start()
+        if self.own_ref_price_service:
+            self.stop_event_ref_price = await start_ref_price_service_async(self.ref_price_service)
+        logger.info('Market Maker Bot started at {}', self.currency_pair)
+        if self.provide_liquidity:
+            self.stop_event_orderbook = self.generate_random_orderbook()
+            # bot will start making trades <StartTradesDelay> seconds after it started placing orders
+            await asyncio.sleep(self.start_trades_delay)
+        self.stop_event_trades = self.generate_random_trades()
+
+    async def stop(self):
+        for name in ('stop_event_ref_price', 'stop_event_orderbook', 'stop_event_trades'):
+            if hasattr(self, name):
+                getattr(self, name).set()
+        if self.own_ref_price_service:
+            self.ref_price_service.stop()
+        if self.own_api:
+            await self.api.close()
+        logger.info('Market Maker Bot stopped')
+
+    async def get_ref_price_async(self, last_price):
+        return self.get_ref_price(last_price)
+
+    async def take_snapshot(self, open_orders=None) -> MarketSnapshot:
+        return await MarketSnapshot.take_async(
+            self.api, self.currency_pair, self.get_ref_price_async, self.price_scale, self.amount_scale,
+            open_orders=open_orders
+        )
+
+    async def submit_orders(self, orders, description):
+        if len(orders) == 0:
+            return []
+        started = time.time()
+        orders = self.exchange_orders(orders)
+        report = await self.api.order_create_batch(self.currency_pair, orders)
+        return self.report_batch(orders, report, description, started)
+
+    async def remove_orders(self, orders) -> int:
+        if len(orders) == 0:
+            return 0
+        return self.report_removals(await self.api.order_remove_batch(self.currency_pair, orders))
+
+    async def check_fills(self):
+        try:
+            open_orders = await self.api.known_open_orders()
+        except ccxt.errors.BaseError as e:
+            logger.error('Exchange API error: {}', e)
+            return None
+        return self.requote_trigger(open_orders)
+
+    async def maintain_orders(self, open_orders=None) -> bool:
+        with cycle_tracer.cycle(self.currency_pair) as trace:
             try:
-                interval_ev = (max_interval + min_interval) / 2
-                amount_ev = min_volume_24h * interval_ev / (24*60*60)
-                amount = Decimal(
-                    random.normalvariate(amount_ev, amount_deviation*amount_ev)
-                )
-                if amount < min_amount:
-                    amount = min_amount
-                elif amount > max_amount:
-                    amount = max_amount
-                amount = amount.quantize(self.amount_step)
-                side = random.choice(['buy', 'sell'])
-                # find the nearest price to execute a trade
-                depth = self.api.depth(currency_pair=self.currency_pair, limit=1)
-                depth_side = {'buy': 'asks', 'sell': 'bids'}[side]
-                best_price = Decimal(str(depth[depth_side][0][0]))
-                # check the price limits
-                if not min_price <= best_price <= max_price:
-                    logger.error('Best price {:f} is beyond the limits: {:f} {:f}', best_price, min_price, max_price)
-                    return
-                amount = self.respect_order_size(amount, best_price)
-                # make a trade
-                logger.info('Random trade: {} {} @ {:f} IOC', side, amount, best_price)
-                result = self.api.order_create(
-                    currency_pair=self.currency_pair,
-                    order_type='limit',
-                    side=side,
-                    amount=amount,
-                    price=best_price,
-                    params={'timeInForce': 'IOC'}
-                )
-                if result is None:
-                    logger.error('Failed to make a random trade')
+                with span('snapshot'):
+                    snapshot = await self.take_snapshot(open_orders)
+                plan = self.plan_orders(snapshot)
+                with span('plan'):
+                    plan = self.fit_call_budget(plan)
+                with span('cancel'):
+                    cancelled = await self.remove_orders(plan.to_cancel)
+                with span('submit'):
+                    created = await self.submit_orders(plan.to_create, 'new')
+                self.count_orders(plan, cancelled, created)
+                self.expect_orders(plan.kept, created)
+                self.log_cycle(trace)
+                return plan.calls > 0
             except ccxt.errors.BaseError as e:
+                trace.fail(e)
                 logger.error('Exchange API error: {}', e)
+                self.log_cycle(trace)
+                return True
 
-        return run_at_random_intervals(
-            make_a_trade, min_interval, max_interval, 'Trades-Generator'
+    def generate_random_orderbook(self):
+        return run_on_trigger_async(
+            self.maintain_orders, self.check_fills, self.fill_check_interval, self.min_requote_interval,
+            self.orderbook_interval, self.max_orderbook_interval, 'Orderbook-Generator'
+        )
+
+    async def make_a_trade(self):
+        try:
+            depth = await self.api.depth(currency_pair=self.currency_pair, limit=1)
+            order = self.plan_random_trade(depth)
+            if order is None:
+                return
+            result = await self.api.order_create(
+                currency_pair=self.currency_pair,
+                order_type='limit',
+                side=order['side'],
+                amount=order['amount'],
+                price=order['price'],
+                params=order['params']
+            )
+            if result is None:
+                logger.error('Failed to make a random trade')
+        except ccxt.errors.BaseError as e:
+            logger.error('Exchange API error: {}', e)
+
+    def generate_random_trades(self):
+        return run_at_random_intervals_async(
+            self.make_a_trade, self.trade_min_interval, self.trade_max_interval, 'Trades-Generator'
+        )
+
+    def __del__(self):
+        pass
+
+
+class MultiPairMarketMaker:
+    """
+    Quotes all the pairs from CurrencyPairs in one process: one sign-in, one load_markets,
+    one reference price refresh and one open orders request per cycle shared by all the pairs
+    """
+    def __init__(self, sections):
+        self.api = APIClient()
+        self.ref_price_service = create_ref_price_service([config.get(section, 'CurrencyPair') for section in sections])
+        self.bots = [
+            MarketMakerBot(self.api, self.ref_price_service, section, autostart=False) for section in sections
+        ]
+        self.liquidity_bots = [bot for bot in self.bots if bot.provide_liquidity]
+        self.share_call_budget()
+        self.cycle = 0
+
+        self.ref_price_service.start()
+        logger.info('Market Maker Bot started at {}', ', '.join(bot.currency_pair for bot in self.bots))
+        if len(self.liquidity_bots) > 0:
+            self.stop_event_orderbook = run_on_trigger(
+                self.maintain_orders, self.check_fills, *self.requote_intervals(), 'Orderbook-Generator'
+            )
+            # bot will start making trades <StartTradesDelay> seconds after it started placing orders
+            time.sleep(config.getint('MarketMaker', 'StartTradesDelay'))
+        for bot in self.bots:
+            bot.stop_event_trades = bot.generate_random_trades()
+
+    def requote_intervals(self) -> tuple:
+        # all the pairs are maintained together, on the intervals of the first one
+        bot = self.liquidity_bots[0]
+        return (bot.fill_check_interval, bot.min_requote_interval, bot.orderbook_interval,
+                bot.max_orderbook_interval)
+
+    def share_call_budget(self):
+        """
+        The pairs share the rate limit: the trades of all the pairs, one fill check and one open orders request
+        are reserved, the rest is split equally between the pairs
+        """
+        if len(self.liquidity_bots) == 0:
+            return
+        fill_check_interval, min_interval, cycle_interval, max_interval = self.requote_intervals()
+        reserved = (
+            sum(calls_per_cycle(cycle_interval, bot.trade_min_interval, 3) for bot in self.bots)
+            + calls_per_cycle(cycle_interval, max(fill_check_interval, self.api.ledger_sync_interval))
+            + 1 + 2 * len(self.liquidity_bots)  # open orders once, depth and ticker of every pair
         )
+        budget = CallBudget.for_cycle(cycle_interval, self.api.request_interval, reserved, len(self.liquidity_bots))
+        for bot in self.liquidity_bots:
+            bot.call_budget = budget
+
+    def requote_trigger(self, open_orders):
+        """
+        :return: (open_orders, bots whose orders were hit) or None if no orders were hit
+        """
+        hit = [bot for bot in self.liquidity_bots if bot.requote_trigger(open_orders) is not None]
+        if len(hit) == 0:
+            return None
+        return open_orders, hit
+
+    def check_fills(self):
+        try:
+            open_orders = self.api.known_open_orders()
+        except ccxt.errors.BaseError as e:
+            logger.error('Exchange API error: {}', e)
+            return None
+        return self.requote_trigger(open_orders)
+
+    def fair_order(self) -> list:
+        # the pair going first changes every cycle, so no pair always waits behind the others for the rate limit
+        shift = self.cycle % len(self.liquidity_bots)
+        self.cycle += 1
+        return self.liquidity_bots[shift:] + self.liquidity_bots[:shift]
+
+    def maintain_orders(self, trigger=None) -> bool:
+        """
+        :param trigger: see requote_trigger(), only the pairs hit are maintained then, all of them otherwise
+        :return: whether any of the pairs needed changes
+        """
+        if trigger is None:
+            try:
+                open_orders = self.api.known_open_orders()
+            except ccxt.errors.BaseError as e:
+                logger.error('Exchange API error: {}', e)
+                return True
+            bots = self.fair_order()
+        else:
+            open_orders, hit = trigger
+            bots = [bot for bot in self.fair_order() if bot in hit]
+        busy = False
+        for bot in bots:
+            busy = bot.maintain_orders(open_orders) or busy
+        return busy
 
     def __del__(self):
         try:
             self.stop_event_orderbook.set()
         except AttributeError:
             pass
+        for bot in getattr(self, 'bots', []):
+            try:
+                bot.stop_event_trades.set()
+            except AttributeError:
+                pass
         try:
-            self.stop_event_trades.set()
+            self.ref_price_service.stop()
         except AttributeError:
             pass
         time.sleep(1)  # let the threads complete
         logger.info('Market Maker Bot stopped')
 
 
+class AsyncMultiPairMarketMaker(MultiPairMarketMaker):
+    """
+    Same as MultiPairMarketMaker on one event loop, the pairs are maintained concurrently.
+    Must be created inside a running event loop, then started with run()
+    """
+    def __init__(self, sections):
+        self.api = AsyncAPIClient()
+        self.ref_price_service = create_ref_price_service([config.get(section, 'CurrencyPair') for section in sections])
+        self.bots = [AsyncMarketMakerBot(self.api, self.ref_price_service, section) for section in sections]
+        self.liquidity_bots = [bot for bot in self.bots if bot.provide_liquidity]
+        self.share_call_budget()
+        self.cycle = 0
+
+    async def run(self):
+        await self.api.start()
+        self.stop_event_ref_price = await start_ref_price_service_async(self.ref_price_service)
+        logger.info('Market Maker Bot started at {}', ', '.join(bot.currency_pair for bot in self.bots))
+        if len(self.liquidity_bots) > 0:
+            self.stop_event_orderbook = run_on_trigger_async(
+                self.maintain_orders, self.check_fills, *self.requote_intervals(), 'Orderbook-Generator'
+            )
+            await asyncio.sleep(config.getint('MarketMaker', 'StartTradesDelay'))
+        for bot in self.bots:
+            bot.stop_event_trades = bot.generate_random_trades()
+
+    async def stop(self):
+        for name in ('stop_event_ref_price', 'stop_event_orderbook'):
+            if hasattr(self, name):
+                getattr(self, name).set()
+        for bot in self.bots:
+            await bot.stop()
+        self.ref_price_service.stop()
+        await self.api.close()
+
+    async def check_fills(self):
+        try:
+            open_orders = await self.api.known_open_orders()
+        except ccxt.errors.BaseError as e:
+            logger.error('Exchange API error: {}', e)
+            return None
+        return self.requote_trigger(open_orders)
+
+    async def maintain_orders(self, trigger=None) -> bool:
+        if trigger is None:
+            try:
+                open_orders = await self.api.known_open_orders()
+            except ccxt.errors.BaseError as e:
+                logger.error('Exchange API error: {}', e)
+                return True
+            bots = self.fair_order()
+        else:
+            open_orders, hit = trigger
+            bots = [bot for bot in self.fair_order() if bot in hit]
+        return any(await asyncio.gather(*[bot.maintain_orders(open_orders) for bot in bots]))
+
+    def __del__(self):
+        pass
+
+
+async def run_async(sections):
+    if len(sections) > 0:
+        bot = AsyncMultiPairMarketMaker(sections)
+    else:
+        bot = AsyncMarketMakerBot()
+    await bot.run()
+    try:
+        while 1:
+            await asyncio.sleep(1)
+    finally:
+        await bot.stop()
+
+
 if __name__ == '__main__':
-    bot = MarketMakerBot()
-    while 1:
-        time.sleep(1)
+    multi_pair_sections = pair_sections()
+    if args.use_asyncio:
+        asyncio.run(run_async(multi_pair_sections))
+    elif len(multi_pair_sections) > 0:
+        bot = MultiPairMarketMaker(multi_pair_sections)
+        while 1:
+            time.sleep(1)
+    else:
+        bot = MarketMakerBot()
+        while 1:
+            time.sleep(1)
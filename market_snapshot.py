@@ -0,0 +1,131 @@
+import time
+import asyncio
+from decimal import Decimal
+from typing import NamedTuple
+from ticks import TickScale
+from reconciler import order_side, order_remaining
+
+
+def _to_levels(levels, price_scale: TickScale, amount_scale: TickScale) -> tuple:
+    price_ticks = price_scale.to_ticks
+    amount_ticks = amount_scale.to_ticks
+    return tuple((price_ticks(price), amount_ticks(amount)) for price, amount in levels)
+
+
+async def _nothing():
+    return None
+
+
+def _last_price(ticker) -> Decimal:
+    # no trades on the pair yet
+    if ticker['last'] is None:
+        return Decimal(0)
+    return Decimal(str(ticker['last']))
+
+
+def _own_orders(orders, currency_pair, price_scale: TickScale, amount_scale: TickScale) -> tuple:
+    return tuple(
+        {
+            'id': order['id'],
+            'side': order_side(order),
+            'price': price_scale.to_ticks(order['price']),
+            'amount': amount_scale.to_ticks(order_remaining(order)),
+            'info': order['info'],
+        }
+        for order in orders if order['symbol'] == currency_pair
+    )
+
+
+class MarketSnapshot(NamedTuple):
+    """
+    Immutable view of the market taken once per maintenance cycle:
+    orderbook depth, last price, reference price and our own open orders on the pair.
+    All prices and amounts are integer ticks of price_scale and amount_scale.
+    Take a new one only after our own writes changed the market.
+    """
+    currency_pair: str
+    bids: tuple         # ((price, amount), ...) best bid first
+    asks: tuple         # ((price, amount), ...) best ask first
+    last_price: int
+    ref_price: int
+    my_orders: tuple    # our open orders on currency_pair as dicts with 'id', 'side', 'price', 'amount' (remaining), 'info'
+    price_scale: TickScale
+    amount_scale: TickScale
+    timestamp: float
+
+    @classmethod
+    def build(cls, currency_pair, depth, ticker, ref_price, open_orders, price_scale, amount_scale):
+        """
+        Makes a snapshot out of the raw ccxt responses
+        :param ref_price: Decimal
+        """
+        return cls(
+            currency_pair=currency_pair,
+            bids=_to_levels(depth['bids'], price_scale, amount_scale),
+            asks=_to_levels(depth['asks'], price_scale, amount_scale),
+            last_price=price_scale.to_ticks(_last_price(ticker)),
+            ref_price=price_scale.to_ticks(ref_price),
+            my_orders=_own_orders(open_orders, currency_pair, price_scale, amount_scale),
+            price_scale=price_scale,
+            amount_scale=amount_scale,
+            timestamp=time.time()
+        )
+
+    @classmethod
+    def take(cls, api, currency_pair, ref_price_func, price_scale, amount_scale, depth_limit=100, open_orders=None):
+        """
+        :param api: APIClient
+        :param currency_pair: pair to take the snapshot of
+        :param ref_price_func: callable(last_price) -> Decimal, reference price provider
+        :param price_scale: TickScale of prices
+        :param amount_scale: TickScale of amounts
+        :param depth_limit: number of orderbook levels to load
+        :param open_orders: our open orders on all pairs if already loaded, taken from the api ledger otherwise.
+                            The ones the depth shows filled are corrected, see OrderLedger.fit_depth()
+        :return: MarketSnapshot
+        """
+        started = time.monotonic()
+        depth = api.depth(currency_pair=currency_pair, limit=depth_limit)
+        ticker = api.ticker(currency_pair=currency_pair)
+        ref_price = ref_price_func(_last_price(ticker))
+        if open_orders is None:
+            open_orders = api.known_open_orders()
+        if api.ledger.fit_depth(currency_pair, depth, started, amount_scale.step / 2) > 0:
+            # some of our orders were filled since they were loaded, planning with them would misjudge our volume
+            open_orders = api.ledger.open_orders(currency_pair)
+        return cls.build(currency_pair, depth, ticker, ref_price, open_orders, price_scale, amount_scale)
+
+    @classmethod
+    async def take_async(cls, api, currency_pair, ref_price_func, price_scale, amount_scale,
+                         depth_limit=100, open_orders=None):
+        """
+        Same as take() for AsyncAPIClient, all the reads are made concurrently
+        :param ref_price_func: coroutine function(last_price) -> Decimal, reference price provider
+        """
+        started = time.monotonic()
+        depth, ticker, loaded_orders = await asyncio.gather(
+            api.depth(currency_pair=currency_pair, limit=depth_limit),
+            api.ticker(currency_pair=currency_pair),
+            api.known_open_orders() if open_orders is None else _nothing()
+        )
+        if open_orders is None:
+            open_orders = loaded_orders
+        if api.ledger.fit_depth(currency_pair, depth, started, amount_scale.step / 2) > 0:
+            open_orders = api.ledger.open_orders(currency_pair)
+        ref_price = await ref_price_func(_last_price(ticker))
+        return cls.build(currency_pair, depth, ticker, ref_price, open_orders, price_scale, amount_scale)
+
+    @property
+    def best_bid(self):
+        return self.bids[0][0] if len(self.bids) > 0 else None
+
+    @property
+    def best_ask(self):
+        return self.asks[0][0] if len(self.asks) > 0 else None
+
+    def volume(self, side) -> int:
+        """
+        :param side: 'bids' or 'asks'
+        :return: total amount on that side of the loaded depth, in amount ticks
+        """
+        return sum(amount for price, amount in getattr(self, side))
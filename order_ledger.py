@@ -0,0 +1,285 @@
+import time
+import bisect
+import threading
+from decimal import Decimal
+from reconciler import order_side, order_remaining
+
+# orders which are never left on the book
+IMMEDIATE_TIME_IN_FORCE = ('IOC', 'FOK')
+
+
+def rests_on_book(order_type, params=None) -> bool:
+    """
+    :return: whether an order placed with these arguments may stay open after it is placed
+    """
+    if order_type == 'market':
+        return False
+    return (params or {}).get('timeInForce') not in IMMEDIATE_TIME_IN_FORCE
+
+
+class LedgerSide:
+    """
+    Our open orders on one side of one pair, sorted by price, with the running volume
+    """
+    def __init__(self, side):
+        self.side = side
+        self.keys = []  # (price, order id) ascending
+        self.volume = Decimal(0)
+
+    def add(self, order_id, price: Decimal, remaining: Decimal):
+        bisect.insort(self.keys, (price, order_id))
+        self.volume += remaining
+
+    def remove(self, order_id, price: Decimal, remaining: Decimal):
+        index = bisect.bisect_left(self.keys, (price, order_id))
+        del self.keys[index]
+        self.volume -= remaining
+
+    @property
+    def count(self) -> int:
+        return len(self.keys)
+
+    def farthest_first(self) -> list:
+        """
+        :return: (price, order id) of the orders, the farthest from the spread first: the lowest bid or the highest ask
+        """
+        return list(self.keys) if self.side == 'buy' else self.keys[::-1]
+
+    def within(self, price: Decimal) -> list:
+        """
+        :return: (price, order id) of the orders at that price or nearer to the spread
+        """
+        index = bisect.bisect_left(self.keys, (price,))
+        if self.side == 'buy':
+            return self.keys[index:]
+        while index < len(self.keys) and self.keys[index][0] == price:
+            index += 1
+        return self.keys[:index]
+
+
+class OrderLedger:
+    """
+    Our open orders on all pairs as we know them from our own creates and cancels,
+    so that most passes do not have to load them from the exchange.
+    Fills by others are seen when the open orders are loaded again and the ledger is synced with them,
+    or when a pass finds them in the depth it loads, see fit_depth().
+    The orders our own trades may have filled are stale until the next sync, see invalidate().
+    Safe to use from many threads at once.
+    """
+    def __init__(self):
+        self.orders = {}        # order id -> ccxt order with 'side' and 'remaining' always set
+        self.sides = {}         # (pair, side) -> LedgerSide
+        self.synced = None      # monotonic time the last sync loaded the orders at
+        self.stale = {}         # order id -> monotonic time our trade may have filled it at
+        self.syncs = 0
+        self.discrepancies = 0  # orders the ledger was wrong about, found by the syncs and the depth checks
+        self._lock = threading.Lock()
+        # order id -> monotonic time of our own add or remove, a sync started before that does not override it
+        self._changed = {}
+
+    def add(self, order):
+        """
+        :param order: order created by us, as returned by ccxt
+        """
+        with self._lock:
+            self._changed[order['id']] = time.monotonic()
+            self._add(order)
+
+    def remove(self, order_id):
+        """
+        :param order_id: id of an order cancelled by us or known to be gone
+        """
+        with self._lock:
+            self._changed[order_id] = time.monotonic()
+            self._remove(order_id)
+            self.stale.pop(order_id, None)
+
+    def invalidate(self, currency_pair, side, price=None):
+        """
+        Marks our orders which our own trade may have filled as stale, so they are loaded again
+        :param side: side of our trade, it reaches our orders on the other side
+        :param price: limit price of the trade, a market one reaches all of them
+        """
+        with self._lock:
+            ledger_side = self.sides.get((currency_pair, 'sell' if side == 'buy' else 'buy'))
+            if ledger_side is None:
+                return
+            now = time.monotonic()
+            keys = ledger_side.keys if price is None else ledger_side.within(Decimal(str(price)))
+            for _, order_id in keys:
+                self.stale[order_id] = now
+
+    def sync(self, open_orders, started):
+        """
+        Replaces the ledger with the open orders loaded from the exchange,
+        except for the orders we added or removed while they were being loaded
+        :param open_orders: our open orders on all pairs, as returned by ccxt
+        :param started: monotonic time the orders started loading at
+        """
+        with self._lock:
+            loaded = {order['id']: order for order in open_orders}
+            changed_since = {order_id for order_id, changed in self._changed.items() if changed >= started}
+            discrepancies = 0
+            for order_id in list(self.orders):
+                if order_id not in loaded and order_id not in changed_since:
+                    discrepancies += 1
+                    self._remove(order_id)
+            for order_id, order in loaded.items():
+                if order_id in changed_since:
+                    continue
+                known = self.orders.get(order_id)
+                if known is not None and Decimal(str(order_remaining(order))) == Decimal(str(known['remaining'])):
+                    continue
+                if known is not None:
+                    self._remove(order_id)
+                discrepancies += 1
+                self._add(order)
+            self._changed = {order_id: self._changed[order_id] for order_id in changed_since}
+            # the orders our trades reached while they were being loaded may be filled still
+            self.stale = {
+                order_id: marked for order_id, marked in self.stale.items()
+                if marked >= started and order_id in self.orders
+            }
+            self.synced = started
+            self.syncs += 1
+            self.discrepancies += discrepancies
+        return discrepancies
+
+    def fit_depth(self, currency_pair, depth, started, tolerance=Decimal(0)) -> int:
+        """
+        Corrects our orders on the pair by the depth loaded from the exchange: a fill we did not see yet shows up
+        as a price level which is gone or holds less than our remaining amount at that price.
+        The orders at a thinner level are taken to be filled in time priority, the oldest first.
+        Orders of others at the level make our remaining amount look bigger than it is, until the next sync
+        :param depth: orderbook as returned by ccxt
+        :param started: monotonic time the depth started loading at, the orders changed since are left as they are
+        :param tolerance: amount difference taken for a rounding error
+        :return: number of orders corrected
+        """
+        with self._lock:
+            if self.synced is not None and self.synced >= started:
+                # the orders were loaded after the depth
+                return 0
+            corrected = 0
+            for side, book_side in (('buy', 'bids'), ('sell', 'asks')):
+                ledger_side = self.sides.get((currency_pair, side))
+                if ledger_side is None or ledger_side.count == 0:
+                    continue
+                levels = {Decimal(str(price)): Decimal(str(amount)) for price, amount in depth[book_side]}
+                farthest = Decimal(str(depth[book_side][-1][0])) if len(levels) > 0 else None
+                ours = {}
+                for price, order_id in ledger_side.keys:
+                    # orders beyond the loaded levels can not be checked
+                    if farthest is not None and (price < farthest if side == 'buy' else price > farthest):
+                        continue
+                    if self._changed.get(order_id, 0) >= started:
+                        continue
+                    ours.setdefault(price, []).append(self.orders[order_id])
+                for price, orders in ours.items():
+                    filled = sum(Decimal(str(order['remaining'])) for order in orders) - levels.get(price, 0)
+                    if filled > tolerance:
+                        corrected += self._fill(orders, filled)
+            self.discrepancies += corrected
+        return corrected
+
+    def age(self) -> float:
+        """
+        :return: number of seconds since the orders were last loaded from the exchange,
+                 inf if never or if our trade may have filled some of them since
+        """
+        if self.synced is None or len(self.stale) > 0:
+            return float('inf')
+        return time.monotonic() - self.synced
+
+    def open_orders(self, currency_pair=None) -> list:
+        """
+        :return: our open orders, same as ccxt fetch_open_orders() returns them
+        """
+        with self._lock:
+            return [
+                order for order in self.orders.values() if currency_pair is None or order['symbol'] == currency_pair
+            ]
+
+    def count(self, currency_pair, side) -> int:
+        with self._lock:
+            ledger_side = self.sides.get((currency_pair, side))
+            return ledger_side.count if ledger_side is not None else 0
+
+    def volume(self, currency_pair, side) -> Decimal:
+        """
+        :param side: 'buy' or 'sell'
+        :return: remaining amount of our open orders on that side
+        """
+        with self._lock:
+            ledger_side = self.sides.get((currency_pair, side))
+            return ledger_side.volume if ledger_side is not None else Decimal(0)
+
+    def farthest(self, currency_pair, side, volume: Decimal) -> list:
+        """
+        :param volume: remaining amount the orders are to hold between them
+        :return: the fewest of our open orders farthest from the spread on that side holding at least that volume,
+                 the farthest first
+        """
+        farthest = []
+        with self._lock:
+            ledger_side = self.sides.get((currency_pair, side))
+            if ledger_side is None:
+                return farthest
+            for _, order_id in ledger_side.farthest_first():
+                if volume <= 0:
+                    break
+                order = self.orders[order_id]
+                farthest.append(order)
+                volume -= Decimal(str(order['remaining']))
+        return farthest
+
+    def stats(self) -> dict:
+        """
+        :return: dict with the number of open 'orders', 'syncs', 'discrepancies' found by them
+                 and the number of seconds since the last sync, 'age'
+        """
+        return {
+            'orders': len(self.orders),
+            'syncs': self.syncs,
+            'discrepancies': self.discrepancies,
+            'age': self.age()
+        }
+
+    def _add(self, order):
+        if order['id'] in self.orders:
+            self._remove(order['id'])
+        side = order_side(order)
+        order = dict(order, side=side, remaining=order_remaining(order))
+        self.orders[order['id']] = order
+        key = (order['symbol'], side)
+        if key not in self.sides:
+            self.sides[key] = LedgerSide(side)
+        self.sides[key].add(order['id'], Decimal(str(order['price'])), Decimal(str(order['remaining'])))
+
+    def _remove(self, order_id):
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return
+        self.sides[(order['symbol'], order['side'])].remove(
+            order_id, Decimal(str(order['price'])), Decimal(str(order['remaining']))
+        )
+
+    def _fill(self, orders, amount: Decimal) -> int:
+        """
+        Takes the amount off the orders at one price level, the oldest first
+        :return: number of orders changed
+        """
+        changed = 0
+        for order in sorted(orders, key=lambda order: order.get('timestamp') or float('inf')):
+            if amount <= 0:
+                break
+            remaining = Decimal(str(order['remaining']))
+            filled = min(amount, remaining)
+            amount -= filled
+            changed += 1
+            if filled == remaining:
+                self._remove(order['id'])
+                self.stale.pop(order['id'], None)
+            else:
+                self._add(dict(order, filled=None, remaining=float(remaining - filled)))
+        return changed
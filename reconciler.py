@@ -0,0 +1,97 @@
+from decimal import Decimal
+from typing import NamedTuple
+
+
+def order_side(order) -> str:
+    """
+    :param order: planned order dict or ccxt order
+    :return: 'buy' or 'sell'
+    """
+    side = order.get('side')
+    if side is None:
+        # mandala reports the side of open orders only in the raw response
+        side = order['info']['side']
+    return side.lower()
+
+
+def order_remaining(order):
+    """
+    :param order: ccxt order
+    :return: amount still open, the whole amount if the exchange does not report it
+    """
+    remaining = order.get('remaining')
+    if remaining is None:
+        return order['amount']
+    return remaining
+
+
+class ReconcilePlan(NamedTuple):
+    to_create: list     # planned orders to place
+    to_cancel: list     # open orders to cancel
+    kept: list          # open orders left as they are
+    matched: int        # how many of the kept orders stand in for a planned order within tolerance
+    deferred: int = 0   # creates and cancels left for the next pass, see CallBudget
+
+    @property
+    def calls(self) -> int:
+        return len(self.to_create) + len(self.to_cancel)
+
+    @property
+    def calls_saved(self) -> int:
+        # every order kept within tolerance spares a cancel and a create
+        return 2 * self.matched
+
+
+class OrderReconciler:
+    """
+    Computes the minimal set of cancels and creates turning the open orders into the desired ones.
+    Planned orders may carry the 'id' of an open order to keep it as is,
+    the others are matched against the remaining open orders within the tolerances.
+    Prices and amounts of both the planned and the open orders must be in the same units (the bot uses ticks).
+    """
+    def __init__(self, price_tolerance=0, amount_tolerance=Decimal(0)):
+        """
+        :param price_tolerance: max price difference, in price units, for an open order to match a planned one
+        :param amount_tolerance: max amount difference, relative to the planned amount
+        """
+        self.price_tolerance = price_tolerance
+        self.amount_tolerance = amount_tolerance
+
+    def matches(self, planned, order) -> bool:
+        price_diff = abs(order['price'] - planned['price'])
+        amount_diff = abs(order['amount'] - planned['amount'])
+        return price_diff <= self.price_tolerance and amount_diff <= self.amount_tolerance * planned['amount']
+
+    def reconcile(self, desired, open_orders) -> ReconcilePlan:
+        """
+        :param desired: planned orders as dicts with 'side', 'amount', 'price' and optional 'id'
+        :param open_orders: our open orders on the pair, dicts with 'id', 'side', 'price', 'amount' 
+        :return: ReconcilePlan
+        """
+        remaining = {order['id']: order for order in open_orders}
+        kept = []
+        to_create = []
+        unplanned = []
+        for planned in desired:
+            if planned.get('id') in remaining:
+                kept.append(remaining.pop(planned['id']))
+            else:
+                unplanned.append(planned)
+        matched = 0
+        for planned in unplanned:
+            candidates = [
+                order for order in remaining.values()
+                if order_side(order) == order_side(planned) and self.matches(planned, order)
+            ]
+            if len(candidates) == 0:
+                to_create.append(planned)
+                continue
+            nearest = min(candidates, key=lambda order: abs(order['price'] - planned['price']))
+            kept.append(remaining.pop(nearest['id']))
+            matched += 1
+        return ReconcilePlan(
+            to_create=to_create,
+            to_cancel=list(remaining.values()),
+            kept=kept,
+            matched=matched
+        )
@@ -0,0 +1,156 @@
+import time
+import statistics
+import threading
+import requests
+import ccxt
+from decimal import Decimal
+from helper import run_repeatedly_apart
+from custom_logging import get_logger
+logger = get_logger(__name__)
+
+
+class TimeoutSession(requests.Session):
+    """
+    Keep-alive session enforcing separate connect and read timeouts on every request,
+    ccxt passes a single timeout value otherwise
+    """
+    def __init__(self, connect_timeout, read_timeout):
+        super().__init__()
+        self.timeouts = (connect_timeout, read_timeout)
+
+    def request(self, method, url, **kwargs):
+        kwargs['timeout'] = self.timeouts
+        return super().request(method, url, **kwargs)
+
+
+def aggregate_prices(quotes, method='median'):
+    """
+    :param quotes: list of (price, volume) tuples from different venues, volume may be None
+    :param method: 'median' or 'vwap' (volume-weighted), vwap falls back to median without volumes
+    :return: Decimal
+    """
+    if method == 'vwap':
+        weighted = [(price, volume) for price, volume in quotes if volume]
+        total_volume = sum(volume for price, volume in weighted)
+        if total_volume > 0:
+            return sum(price * volume for price, volume in weighted) / total_volume
+    return statistics.median(price for price, volume in quotes)
+
+
+class ReferencePriceService:
+    """
+    Keeps the last good reference prices of our pairs from other ccxt exchanges (venues).
+    Every refresh makes one bulk ticker request per venue for all the pairs it lists,
+    and combines the venues into one price per pair.
+    Prices are refreshed in the background over keep-alive sessions with strict timeouts,
+    readers get the cached value at once and never wait for the network.
+    """
+    def __init__(self, currency_pairs, venues=('binance',), aggregation='median', source='last',
+                 refresh_interval=10, max_age=60, connect_timeout=3, read_timeout=5):
+        """
+        :param currency_pairs: list of pairs in ccxt notation, e.g. ['MDX/BTC']
+        :param venues: ids of ccxt exchanges to take the prices from
+        :param aggregation: how to combine the venues, 'median' or 'vwap'
+        :param source: 'last' for the last trade price, 'mid' for the middle between the best bid and ask
+        :param refresh_interval: how often the prices are reloaded, in seconds
+        :param max_age: a price older than that many seconds is considered stale and not returned
+        :param connect_timeout: HTTP connect timeout, in seconds
+        :param read_timeout: HTTP read timeout, in seconds
+        """
+        self.currency_pairs = list(currency_pairs)
+        self.aggregation = aggregation
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.venues = [
+            getattr(ccxt, venue_id)({
+                'session': TimeoutSession(connect_timeout, read_timeout),
+                'timeout': int(max(connect_timeout, read_timeout) * 1000),
+            })
+            for venue_id in venues
+        ]
+        # pairs each venue lists, known after its markets are loaded
+        self.venue_symbols = {}
+        self._lock = threading.Lock()
+        self._prices = {}
+        self.stop_event = None
+
+    def load_venue_symbols(self, venue):
+        """
+        Maps our pairs to the venue markets once, the venue common currency codes take care of renamed coins
+        """
+        if venue.id in self.venue_symbols:
+            return self.venue_symbols[venue.id]
+        venue.load_markets()
+        symbols = [pair for pair in self.currency_pairs if pair in venue.markets]
+        for pair in self.currency_pairs:
+            if pair not in venue.markets:
+                logger.info('Symbol {} is not present on {}', pair, venue.name)
+        self.venue_symbols[venue.id] = symbols
+        return symbols
+
+    def fetch_venue_quotes(self, venue, symbols) -> dict:
+        """
+        :return: dict pair -> (price, volume) from one bulk request
+        """
+        quotes = {}
+        if self.source == 'mid' and venue.has.get('fetchBidsAsks'):
+            for symbol, ticker in venue.fetch_bids_asks(symbols).items():
+                if ticker['bid'] and ticker['ask']:
+                    quotes[symbol] = ((Decimal(str(ticker['bid'])) + Decimal(str(ticker['ask']))) / 2, None)
+            return quotes
+        if venue.has.get('fetchTickers'):
+            tickers = venue.fetch_tickers(symbols)
+        else:
+            tickers = {symbol: venue.fetch_ticker(symbol) for symbol in symbols}
+        for symbol, ticker in tickers.items():
+            if ticker['last']:
+                volume = Decimal(str(ticker['baseVolume'])) if ticker['baseVolume'] else None
+                quotes[symbol] = (Decimal(str(ticker['last'])), volume)
+        return quotes
+
+    def refresh(self):
+        """
+        Loads the prices once, keeps the previous ones for the pairs which failed to load
+        """
+        quotes = {}
+        for venue in self.venues:
+            try:
+                symbols = self.load_venue_symbols(venue)
+                if len(symbols) == 0:
+                    continue
+                for symbol, quote in self.fetch_venue_quotes(venue, symbols).items():
+                    if symbol in self.currency_pairs:
+                        quotes.setdefault(symbol, []).append(quote)
+            except Exception as e:
+                logger.info('Failed to load prices from {}: {}', venue.name, e)
+        now = time.monotonic()
+        with self._lock:
+            for symbol, venue_quotes in quotes.items():
+                self._prices[symbol] = (aggregate_prices(venue_quotes, self.aggregation), now)
+
+    def price(self, currency_pair):
+        """
+        :return: the last loaded price of the pair or None if there is no price or it is stale
+        """
+        with self._lock:
+            if currency_pair not in self._prices:
+                return None
+            price, updated = self._prices[currency_pair]
+        if time.monotonic() - updated > self.max_age:
+            return None
+        return price
+
+    def start(self):
+        """
+        Keeps refreshing the prices in a background thread, the first refresh starts right away.
+        Until it completes price() returns None and the bots use their own last price
+        """
+        # the venues may take up to their timeouts to answer, neither the start nor the bot jobs wait for them
+        self.stop_event = run_repeatedly_apart(self.refresh, self.refresh_interval, 'Reference-Price')
+
+    def stop(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for venue in self.venues:
+            venue.session.close()
@@ -0,0 +1,337 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from custom_logging import get_logger
+logger = get_logger(__name__)
+
+
+class JobStats:
+    """
+    Counters of a scheduled job, times are in seconds
+    """
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0           # runs which ended after the next one was due
+        self.last_latency = 0.0     # how long the last run took
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.last_lateness = 0.0    # how late the last run started after it was due
+        self.max_lateness = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class Job:
+    def __init__(self, func, next_interval, name, args=(), kwargs=None, fixed_rate=True):
+        """
+        :param func: function (or coroutine function for AsyncScheduler) to execute
+        :param next_interval: callable returning the number of seconds to the next execution
+        :param name: job name, the worker thread takes it while the job runs (useful for logging)
+        :param fixed_rate: if True, intervals are counted from the time the run was due, so the job does not drift,
+                           otherwise from the time it completed
+        """
+        self.func = func
+        self.next_interval = next_interval
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.fixed_rate = fixed_rate
+        self.stop_event = threading.Event()
+        self.stats = JobStats()
+        self.due = time.monotonic()
+
+    def started(self) -> float:
+        started = time.monotonic()
+        lateness = max(started - self.due, 0)
+        self.stats.last_lateness = lateness
+        self.stats.max_lateness = max(self.stats.max_lateness, lateness)
+        return started
+
+    def completed(self, started, error=None):
+        """
+        Updates the counters and schedules the next run
+        :param error: exception the run failed with, the job is restarted at its next due time anyway
+        """
+        completed = time.monotonic()
+        latency = completed - started
+        self.stats.runs += 1
+        self.stats.last_latency = latency
+        self.stats.max_latency = max(self.stats.max_latency, latency)
+        self.stats.total_latency += latency
+        if error is not None:
+            self.stats.errors += 1
+            logger.error('Job {} failed: {!r}, it will be restarted', self.name, error, exc_info=error)
+        if not self.fixed_rate:
+            self.due = completed + self.next_interval()
+            return
+        due = self.due + self.next_interval()
+        if due < completed:
+            # the run took longer than the interval: start the next one right away without catching up the missed ones
+            self.stats.overruns += 1
+            due = completed
+        self.due = due
+
+
+class TriggeredJob:
+    """
+    Job state for run_on_trigger(): every run either checks for a trigger or executes the function,
+    and tells the scheduler how long to wait till the next run
+    """
+    def __init__(self, func, check, check_interval, min_interval, idle_interval, max_idle_interval):
+        self.func = func
+        self.check = check
+        self.check_interval = check_interval
+        self.min_interval = min_interval
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.last_time = -idle_interval
+        self.check_delay = check_interval
+        self.idle_delay = idle_interval
+        # a trigger came too early and waits for <min_interval>
+        self.pending = False
+        self.delay = 0
+
+    def next_interval(self) -> float:
+        return self.delay
+
+    def checked(self, trigger) -> bool:
+        """
+        :return: whether the function should be executed right away
+        """
+        if trigger is None:
+            now = time.monotonic()
+            self.delay = max(min(self.check_delay, self.last_time + self.idle_delay - now), 0)
+            self.check_delay = min(self.check_delay * 2, self.idle_interval)
+            return False
+        self.check_delay = self.check_interval
+        wait = self.last_time + self.min_interval - time.monotonic()
+        if wait > 0:
+            # the trigger value goes stale while waiting, the function reloads what it needs
+            self.pending = True
+            self.delay = wait
+            return False
+        return True
+
+    def executed(self, triggered, busy):
+        self.pending = False
+        self.idle_delay = self.idle_interval if triggered or busy else min(self.idle_delay * 2, self.max_idle_interval)
+        self.delay = self.check_delay
+
+    def due_without_check(self) -> bool:
+        return self.pending or time.monotonic() - self.last_time >= self.idle_delay
+
+    def run(self):
+        triggered = self.pending
+        trigger = None
+        if not self.due_without_check():
+            trigger = self.check()
+            if not self.checked(trigger):
+                return
+            triggered = True
+        self.last_time = time.monotonic()
+        self.executed(triggered, self.func(trigger))
+
+    async def run_async(self):
+        triggered = self.pending
+        trigger = None
+        if not self.due_without_check():
+            trigger = await self.check()
+            if not self.checked(trigger):
+                return
+            triggered = True
+        self.last_time = time.monotonic()
+        self.executed(triggered, await self.func(trigger))
+
+
+class Scheduler:
+    """
+    Runs many periodic jobs one after another in a single worker thread.
+    Times are monotonic, a job is dropped when the threading.Event returned for it is set.
+    An exception in a job is logged and counted, it does not affect the other jobs
+    """
+    def __init__(self, name='Scheduler', stop_when_empty=False):
+        """
+        :param stop_when_empty: stop the worker once the last job is dropped, for a scheduler made for one job
+        """
+        self.name = name
+        self.stop_when_empty = stop_when_empty
+        self.jobs = []
+        self.stop_event = threading.Event()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self._condition:
+            self._condition.notify()
+
+    def add(self, job: Job) -> threading.Event:
+        """
+        :return: threading.Event, when you .set() it, the job stops
+        """
+        with self._condition:
+            self.jobs.append(job)
+            heapq.heappush(self._queue, (job.due, next(self._sequence), job))
+            self._condition.notify()
+        self.start()
+        return job.stop_event
+
+    def every(self, func, interval, name=None, *args, **kwargs) -> threading.Event:
+        """
+        Executes func() every <interval> seconds starting right away,
+        if it takes longer than that, the next execution starts right after the previous one completes
+        """
+        return self.add(Job(func, lambda: interval, name, args, kwargs))
+
+    def at_random_intervals(self, func, min_interval, max_interval, name=None, *args, **kwargs) -> threading.Event:
+        """
+        Executes func() every random interval anywhere from <min_interval> to <max_interval> seconds
+        """
+        return self.add(Job(func, lambda: random.randint(min_interval, max_interval), name, args, kwargs))
+
+    def at_intervals(self, func, next_interval, name=None, *args, **kwargs) -> threading.Event:
+        """
+        Executes func() right away, then every time the number of seconds returned by next_interval() passes
+        after the previous execution completes
+        """
+        return self.add(Job(func, next_interval, name, args, kwargs, fixed_rate=False))
+
+    def on_trigger(self, func, check, check_interval, min_interval, idle_interval, max_idle_interval,
+                   name=None) -> threading.Event:
+        """
+        See helper.run_on_trigger()
+        """
+        state = TriggeredJob(func, check, check_interval, min_interval, idle_interval, max_idle_interval)
+        return self.add(Job(state.run, state.next_interval, name, fixed_rate=False))
+
+    def stats(self) -> dict:
+        """
+        :return: dict job name -> counters, see JobStats
+        """
+        with self._condition:
+            return {job.name: job.stats.as_dict() for job in self.jobs if not job.stop_event.is_set()}
+
+    def _next_job(self):
+        with self._condition:
+            while not self.stop_event.is_set():
+                if len(self._queue) == 0:
+                    self._condition.wait()
+                    continue
+                due, sequence, job = self._queue[0]
+                wait = due - time.monotonic()
+                if wait <= 0:
+                    heapq.heappop(self._queue)
+                    return job
+                self._condition.wait(wait)
+            return None
+
+    def _reschedule(self, job):
+        with self._condition:
+            if job.stop_event.is_set():
+                self.jobs.remove(job)
+                if self.stop_when_empty and len(self.jobs) == 0:
+                    self.stop()
+                return
+            heapq.heappush(self._queue, (job.due, next(self._sequence), job))
+
+    def _run(self):
+        thread = threading.current_thread()
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.stop_event.is_set():
+                self._reschedule(job)
+                continue
+            started = job.started()
+            error = None
+            thread.name = job.name or self.name
+            try:
+                job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                thread.name = self.name
+            job.completed(started, error)
+            self._reschedule(job)
+
+
+class AsyncScheduler(Scheduler):
+    """
+    Same as Scheduler, but runs coroutine functions one after another in a single task on the current event loop.
+    Must be created inside a running event loop
+    """
+    def __init__(self, name='Scheduler', stop_when_empty=False):
+        super().__init__(name, stop_when_empty)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run_async())
+            # tasks are named since python 3.8
+            if hasattr(self._task, 'set_name'):
+                self._task.set_name(self.name)
+
+    def stop(self):
+        self.stop_event.set()
+        self._wakeup.set()
+
+    def add(self, job: Job) -> threading.Event:
+        self.jobs.append(job)
+        heapq.heappush(self._queue, (job.due, next(self._sequence), job))
+        self._wakeup.set()
+        self.start()
+        return job.stop_event
+
+    def on_trigger(self, coro_func, check, check_interval, min_interval, idle_interval, max_idle_interval,
+                   name=None) -> threading.Event:
+        state = TriggeredJob(coro_func, check, check_interval, min_interval, idle_interval, max_idle_interval)
+        return self.add(Job(state.run_async, state.next_interval, name, fixed_rate=False))
+
+    async def _next_job_async(self):
+        while not self.stop_event.is_set():
+            self._wakeup.clear()
+            timeout = None
+            if len(self._queue) > 0:
+                due, sequence, job = self._queue[0]
+                timeout = due - time.monotonic()
+                if timeout <= 0:
+                    heapq.heappop(self._queue)
+                    return job
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+    async def _run_async(self):
+        while True:
+            job = await self._next_job_async()
+            if job is None:
+                return
+            if job.stop_event.is_set():
+                self._reschedule(job)
+                continue
+            started = job.started()
+            error = None
+            try:
+                await job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                error = e
+            job.completed(started, error)
+            self._reschedule(job)
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import threading
+import ccxt
+import ccxt.async_support
+
+MARKETS = [
+    {'id': 'mdxbtc', 'symbol': 'MDX/BTC', 'base': 'MDX', 'quote': 'BTC', 'precision': {'amount': 0, 'price': 7}},
+]
+RELOADED_MARKETS = MARKETS + [
+    {'id': 'ethbtc', 'symbol': 'ETH/BTC', 'base': 'ETH', 'quote': 'BTC', 'precision': {'amount': 3, 'price': 6}},
+]
+
+
+class SlowMarkets:
+    """
+    Serves the markets from fetch() once <release> is set, records the throttle calls and requests in <events>
+    """
+    id = 'slowmarkets'
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.release = threading.Event()
+        self.events = []
+
+    def fetch_markets(self, params={}):
+        return self.fetch2('markets')
+
+    def sign(self, path, api='public', method='GET', params={}, headers=None, body=None):
+        return {'url': path, 'method': method, 'headers': headers, 'body': body}
+
+
+class SyncSlowMarkets(SlowMarkets, ccxt.Exchange):
+    def fetch(self, url, method='GET', headers=None, body=None):
+        self.events.append('request')
+        self.release.wait(5)
+        return RELOADED_MARKETS
+
+
+class AsyncSlowMarkets(SlowMarkets, ccxt.async_support.Exchange):
+    async def fetch_markets(self, params={}):
+        return await self.fetch2('markets')
+
+    async def fetch(self, url, method='GET', headers=None, body=None):
+        self.events.append('request')
+        while not self.release.is_set():
+            await asyncio.sleep(0.01)
+        return RELOADED_MARKETS
+
+
+def cached_exchange(cls, cache_dir, **config):
+    SyncSlowMarkets({'marketsCacheDir': str(cache_dir)}).write_markets_cache(MARKETS, None)
+    return cls(dict({'marketsCacheDir': str(cache_dir)}, **config))
+
+
+def test_cache_hit_does_not_block_on_revalidation(tmp_path):
+    exchange = cached_exchange(SyncSlowMarkets, tmp_path)
+    started = time.monotonic()
+    markets = exchange.load_markets()
+    assert time.monotonic() - started < 1
+    assert list(markets) == ['MDX/BTC']
+    assert exchange.markets_stale
+    exchange.release.set()
+    exchange.markets_revalidation.join(5)
+    assert sorted(exchange.markets) == ['ETH/BTC', 'MDX/BTC']
+    assert not exchange.markets_stale
+
+
+def test_revalidation_left_to_the_caller_waits_for_its_throttle(tmp_path):
+    exchange = cached_exchange(SyncSlowMarkets, tmp_path, revalidateMarkets=False)
+    exchange.load_markets()
+    assert exchange.markets_stale and exchange.markets_revalidation is None
+    exchange.release.set()
+    exchange.revalidate_markets(throttle=lambda: exchange.events.append('throttle'))
+    exchange.markets_revalidation.join(5)
+    assert exchange.events == ['throttle', 'request']
+    assert 'ETH/BTC' in exchange.markets
+    # the throttle only applies to the revalidation thread
+    exchange.fetch_markets()
+    assert exchange.events == ['throttle', 'request', 'request']
+
+
+def test_async_cache_hit_does_not_block_on_revalidation(tmp_path):
+    async def run():
+        exchange = cached_exchange(AsyncSlowMarkets, tmp_path, revalidateMarkets=False)
+        try:
+            markets = await asyncio.wait_for(exchange.load_markets(), 1)
+            assert list(markets) == ['MDX/BTC']
+
+            async def throttle():
+                exchange.events.append('throttle')
+            exchange.revalidate_markets(throttle=throttle)
+            await asyncio.sleep(0.05)
+            # the reload waits for its response in the background
+            assert exchange.events == ['throttle', 'request'] and exchange.markets_stale
+            exchange.release.set()
+            await asyncio.wait_for(exchange.markets_revalidation, 5)
+            assert 'ETH/BTC' in exchange.markets and not exchange.markets_stale
+        finally:
+            await exchange.close()
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import time
+from decimal import Decimal
+from order_ledger import OrderLedger
+
+
+def open_order(order_id, side, price, amount, remaining=None, timestamp=None):
+    return {
+        'id': order_id, 'symbol': 'MDX/BTC', 'side': side, 'price': price, 'amount': amount,
+        'remaining': amount if remaining is None else remaining, 'timestamp': timestamp, 'info': {}
+    }
+
+
+def synced_ledger(orders):
+    ledger = OrderLedger()
+    ledger.sync(orders, time.monotonic())
+    return ledger
+
+
+def test_side_aggregates_follow_adds_and_removes():
+    ledger = synced_ledger([open_order('1', 'buy', 0.0000020, 300), open_order('2', 'buy', 0.0000018, 200)])
+    ledger.add(open_order('3', 'buy', 0.0000019, 100))
+    ledger.remove('1')
+    assert ledger.count('MDX/BTC', 'buy') == 2
+    assert ledger.volume('MDX/BTC', 'buy') == Decimal(300)
+    assert [order['id'] for order in ledger.farthest('MDX/BTC', 'buy', Decimal(250))] == ['2', '3']
+
+
+def test_depth_corrects_the_fills_oldest_first():
+    ledger = synced_ledger([
+        open_order('1', 'sell', 0.0000025, 300, timestamp=2), open_order('2', 'sell', 0.0000025, 200, timestamp=1),
+        open_order('3', 'sell', 0.0000026, 100, timestamp=3),
+    ])
+    depth = {'bids': [], 'asks': [[0.0000025, 250]]}
+    assert ledger.fit_depth('MDX/BTC', depth, time.monotonic()) == 2
+    assert {order['id']: order['remaining'] for order in ledger.open_orders()} == {'1': 250, '3': 100}
+    assert ledger.volume('MDX/BTC', 'sell') == Decimal(350)
+
+
+def test_own_trade_makes_only_the_orders_in_reach_stale():
+    ledger = synced_ledger([open_order('1', 'sell', 0.0000025, 300), open_order('2', 'sell', 0.0000027, 200)])
+    ledger.invalidate('MDX/BTC', 'sell', 0.0000025)
+    assert ledger.age() < 1
+    ledger.invalidate('MDX/BTC', 'buy', 0.0000026)
+    assert list(ledger.stale) == ['1']
+    assert ledger.age() == float('inf')
+    ledger.sync(ledger.open_orders(), time.monotonic())
+    assert ledger.age() < 1
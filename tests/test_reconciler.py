@@ -0,0 +1,80 @@
+from decimal import Decimal
+from ticks import TickScale
+from market_snapshot import MarketSnapshot
+from reconciler import OrderReconciler
+
+PRICE_SCALE = TickScale(Decimal('0.0000001'))
+AMOUNT_SCALE = TickScale(Decimal('1'))
+
+
+def open_order(order_id, side, price, amount):
+    # mandala reports the side of open orders only in the raw response
+    return {
+        'id': order_id, 'symbol': 'MDX/BTC', 'side': None, 'price': price, 'amount': amount, 'remaining': amount,
+        'info': {'side': side.upper()}
+    }
+
+
+def snapshot(open_orders):
+    depth = {
+        'bids': [[0.0000020, 500], [0.0000019, 300]],
+        'asks': [[0.0000025, 400], [0.0000026, 200]],
+    }
+    return MarketSnapshot.build(
+        'MDX/BTC', depth, {'last': 0.0000022}, Decimal('0.0000022'), open_orders, PRICE_SCALE, AMOUNT_SCALE
+    )
+
+
+def test_snapshot_orders_in_ticks():
+    my_orders = snapshot([open_order('1', 'buy', 0.0000020, 300)]).my_orders
+    assert my_orders[0]['side'] == 'buy'
+    assert my_orders[0]['price'] == 20
+    assert my_orders[0]['amount'] == 300
+
+
+def test_keeps_planned_ids_and_cancels_the_rest():
+    market = snapshot([open_order('1', 'buy', 0.0000020, 300), open_order('2', 'sell', 0.0000025, 200)])
+    desired = [{'id': '1', 'side': 'buy', 'price': 20, 'amount': 300}]
+    plan = OrderReconciler().reconcile(desired, market.my_orders)
+    assert [order['id'] for order in plan.kept] == ['1']
+    assert [order['id'] for order in plan.to_cancel] == ['2']
+    assert plan.to_create == []
+    assert plan.calls == 1
+
+
+def test_keeps_open_order_within_tolerance():
+    market = snapshot([open_order('1', 'buy', 0.0000019, 290)])
+    desired = [{'side': 'buy', 'price': 20, 'amount': 300}]
+    plan = OrderReconciler(price_tolerance=1, amount_tolerance=Decimal('0.05')).reconcile(desired, market.my_orders)
+    assert [order['id'] for order in plan.kept] == ['1']
+    assert plan.to_create == [] and plan.to_cancel == []
+    assert plan.calls_saved == 2
+
+
+def test_replaces_open_order_beyond_tolerance():
+    market = snapshot([open_order('1', 'buy', 0.0000017, 300)])
+    desired = [{'side': 'buy', 'price': 20, 'amount': 300}]
+    plan = OrderReconciler(price_tolerance=1).reconcile(desired, market.my_orders)
+    assert plan.to_create == desired
+    assert [order['id'] for order in plan.to_cancel] == ['1']
+    assert plan.kept == []
+
+
+def test_tops_up_missing_orders_on_the_matching_side_only():
+    market = snapshot([open_order('1', 'sell', 0.0000025, 300)])
+    desired = [
+        {'side': 'buy', 'price': 25, 'amount': 300, 'purpose': 'top-up'},
+        {'side': 'sell', 'price': 26, 'amount': 150, 'purpose': 'top-up'},
+    ]
+    plan = OrderReconciler(price_tolerance=1, amount_tolerance=Decimal('0.1')).reconcile(desired, market.my_orders)
+    # the sell does not stand in for the buy at the same price, nor for the sell of half its amount
+    assert plan.to_create == desired
+    assert [order['id'] for order in plan.to_cancel] == ['1']
+
+
+def test_matches_the_nearest_open_order():
+    market = snapshot([open_order('1', 'sell', 0.0000027, 200), open_order('2', 'sell', 0.0000026, 200)])
+    desired = [{'side': 'sell', 'price': 26, 'amount': 200}]
+    plan = OrderReconciler(price_tolerance=2).reconcile(desired, market.my_orders)
+    assert [order['id'] for order in plan.kept] == ['2']
+    assert [order['id'] for order in plan.to_cancel] == ['1']
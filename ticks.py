@@ -0,0 +1,40 @@
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+
+class TickScale:
+    """
+    Fixed-point scale: values are kept as integer numbers of <step>,
+    so the orderbook hot path does integer arithmetic only.
+    Values are converted to strings for the exchange only when an order is placed.
+    """
+    def __init__(self, step: Decimal):
+        self.step = Decimal(step)
+        self._step_float = float(self.step)
+
+    def to_ticks(self, value) -> int:
+        """
+        :param value: float, str or Decimal, rounded to the nearest tick
+        """
+        if isinstance(value, float):
+            # float division is exact enough to find the nearest tick and much faster than Decimal(str())
+            return round(value / self._step_float)
+        return int((Decimal(value) / self.step).to_integral_value())
+
+    def to_decimal(self, ticks: int) -> Decimal:
+        # None (e.g. no best bid) passes through for logging
+        if ticks is None:
+            return None
+        return ticks * self.step
+
+    def to_string(self, ticks: int) -> str:
+        return '{:f}'.format(ticks * self.step)
+
+
+def min_cost_ticks(min_cost: Decimal, amount_scale: TickScale, price_scale: TickScale) -> int:
+    """
+    :return: min cost (amount * price) in amount ticks * price ticks, rounded up,
+             so that amount_ticks * price_ticks >= result means the cost is not below min_cost
+    """
+    return math.ceil(Fraction(min_cost) / (Fraction(amount_scale.step) * Fraction(price_scale.step)))